@@ -8,4 +8,222 @@ LLM_MODELS = [
 
 VISION_MODELS = [
     "meta-llama/llama-4-scout-17b-16e-instruct"
-]
\ No newline at end of file
+]
+
+# Nombre maximal de corrections LLM envoyées en parallèle lors de la revue finale
+GRADING_MAX_CONCURRENCY = 8
+
+# Affiche les réponses du tuteur token par token dans le chat
+CHAT_STREAMING = True
+CHAT_PAGE_SIZE = 20  # Messages affichés dans la discussion, puis par clic sur "messages précédents"
+
+# Cache du texte extrait des PDF (clé : empreinte du contenu du fichier)
+PDF_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PDF_CACHE_DIR = None  # Ex: "/tmp/tuteur_ia/pdf_cache" pour conserver le cache entre redémarrages
+PDF_CACHE_MAX_DISK_BYTES = 512 * 1024 * 1024
+
+# Extraction parallèle des pages PDF
+PDF_EXTRACTION_WORKERS = None  # None = un processus par cœur
+PDF_PAGES_PER_TASK = 16  # Minimum par tâche ; un gros document est réparti en un lot par processus
+PDF_PARALLEL_MIN_PAGES = 32  # En dessous, l'extraction reste dans le thread courant
+PDF_MAX_PAGES = None  # Limite de pages lues par document (None = toutes)
+PDF_TIME_BUDGET_S = 60  # Temps maximal d'extraction par document
+
+# Recherche lexicale (BM25) dans le texte des cours
+RETRIEVAL_CHUNK_CHARS = 1200
+RETRIEVAL_TOP_K = 6  # Extraits injectés par question de chat
+RETRIEVAL_QUIZ_TOP_K = 12  # Extraits injectés pour la génération d'un quiz
+RETRIEVAL_FULL_TEXT_MAX_CHARS = 8000  # En dessous, le cours est envoyé en entier
+RETRIEVAL_INDEX_CACHE_SIZE = 32
+
+# Fenêtre de l'historique envoyé à l'API (en tokens estimés, prompt système compris)
+# Doit tenir, avec la réponse, dans la limite de tokens par minute du modèle (MODEL_RATE_LIMITS)
+HISTORY_TOKEN_BUDGETS = {
+    "llama-3.1-8b-instant": 4500,
+    "openai/gpt-oss-120b": 6000,
+    "openai/gpt-oss-20b": 6000,
+    "llama-3.3-70b-versatile": 10000,
+    "moonshotai/kimi-k2-instruct-0905": 8500,
+    "meta-llama/llama-4-scout-17b-16e-instruct": 8000,
+}
+HISTORY_DEFAULT_TOKEN_BUDGET = 4500
+HISTORY_MIN_RECENT_MESSAGES = 4  # Toujours gardés tels quels, même hors budget
+HISTORY_REFILL_RATIO = 0.6  # Remplissage visé après repli, pour espacer les recalculs du résumé
+HISTORY_SUMMARY_MODEL = "llama-3.1-8b-instant"
+HISTORY_SUMMARY_MAX_TOKENS = 400
+
+# Délai minimal entre deux vérifications de la date de modification des prompts de resources/
+PROMPT_RELOAD_CHECK_INTERVAL_S = 1.0
+
+# Prétraitement des images envoyées au modèle de vision
+IMAGE_MAX_EDGE = 1568  # Plus grand côté, en pixels
+IMAGE_JPEG_QUALITY = 85
+IMAGE_MIN_JPEG_QUALITY = 45
+IMAGE_MAX_BYTES = 800 * 1024  # Taille visée par image après recompression
+IMAGE_CACHE_MAX_ENTRIES = 1024  # Empreinte du fichier uploadé -> référence de l'image encodée
+
+# Cache des quiz générés (clé : sujet, nombre de questions, niveau, modèle, contexte, version des prompts)
+QUIZ_CACHE_ENABLED = True
+QUIZ_CACHE_TTL_S = 30 * 60
+QUIZ_CACHE_MAX_ENTRIES = 256
+QUIZ_CACHE_DB_PATH = None  # Ex: "/tmp/tuteur_ia/quiz_cache.sqlite3" pour partager le cache entre processus
+QUIZ_CACHE_MAX_DISK_ENTRIES = 5000
+QUIZ_CACHE_SHUFFLE = True  # Sert une variante mélangée (questions et choix) plutôt que le quiz identique
+
+# Quiz livré au fil de l'eau : l'élève répond aux premières questions pendant que les suivantes arrivent
+QUIZ_STREAMING = True
+QUIZ_MAX_QUESTIONS = 20  # Nombre maximal de questions par quiz (curseur de l'interface et service HTTP)
+QUIZ_WAIT_POLL_S = 0.5
+
+# Génération des grands quiz en plusieurs requêtes parallèles
+QUIZ_SHARDING = True
+QUIZ_SHARD_SIZE = 5  # Questions par requête ; au-delà, le quiz est découpé en lots
+QUIZ_SHARD_MAX_CONCURRENCY = 4
+QUIZ_SHARD_OVERSAMPLE = 1  # Questions demandées en plus par lot pour compenser le dédoublonnage
+QUIZ_DEDUP_SIMILARITY = 0.8  # Similarité (n-grammes de caractères) à partir de laquelle deux énoncés sont des doublons
+
+# Correction locale des questions ouvertes (similarité de n-grammes de caractères, entre 0 et 1)
+LOCAL_GRADER_ENABLED = True
+LOCAL_GRADER_ACCEPT_THRESHOLD = 0.85  # Au-dessus : correct sans appel au LLM
+LOCAL_GRADER_REJECT_THRESHOLD = 0.02  # En dessous (ou réponse vide) : incorrect sans appel au LLM
+
+# Fenêtre de contexte de chaque modèle, en tokens
+MODEL_CONTEXT_WINDOWS = {
+    "llama-3.1-8b-instant": 131072,
+    "openai/gpt-oss-120b": 131072,
+    "openai/gpt-oss-20b": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "moonshotai/kimi-k2-instruct-0905": 262144,
+    "meta-llama/llama-4-scout-17b-16e-instruct": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Correction des questions ouvertes : "parallel" (un appel par question) ou "batch" (un appel pour plusieurs questions)
+GRADING_MODE = "parallel"
+GRADING_BATCH_MAX_ITEMS = 20
+GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM = 250  # Réservés dans la fenêtre de contexte pour chaque feedback
+GRADING_BATCH_CONTEXT_RATIO = 0.5  # Part de la fenêtre de contexte utilisable par une requête groupée
+
+# Client Groq partagé : délais, reprises et requêtes doublées
+GROQ_TIMEOUT_S = 60
+GROQ_MAX_RETRIES = 3  # Sur 429, 5xx, erreurs de connexion et dépassements de délai
+GROQ_BACKOFF_BASE_S = 0.5
+GROQ_BACKOFF_MAX_S = 8
+GROQ_MAX_RETRY_AFTER_S = 30  # Plafond appliqué à l'en-tête retry-after
+GROQ_HEDGE_DELAY_S = 4  # Chat non streamé : délai avant une seconde requête, tant que trop peu de délais ont été observés
+GROQ_HEDGE_PERCENTILE = 0.95  # Ensuite, seconde requête si la première dépasse ce quantile des délais récents du modèle
+GROQ_HEDGE_MIN_SAMPLES = 20
+GROQ_HEDGE_WINDOW = 200  # Derniers délais gardés par modèle
+GROQ_MAX_CONNECTIONS = 100
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Limites de débit par modèle (requêtes et tokens par minute), à ajuster selon l'offre Groq utilisée
+MODEL_RATE_LIMITS = {
+    "llama-3.1-8b-instant": {"rpm": 30, "tpm": 6000},
+    "openai/gpt-oss-120b": {"rpm": 30, "tpm": 8000},
+    "openai/gpt-oss-20b": {"rpm": 30, "tpm": 8000},
+    "llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000},
+    "moonshotai/kimi-k2-instruct-0905": {"rpm": 60, "tpm": 10000},
+    "meta-llama/llama-4-scout-17b-16e-instruct": {"rpm": 30, "tpm": 30000},
+}
+DEFAULT_RATE_LIMITS = {"rpm": 30, "tpm": 6000}
+
+# Ordonnanceur des requêtes : plus la valeur est basse, plus la requête est prioritaire
+SCHEDULER_ENABLED = True
+SCHEDULER_PRIORITIES = {
+    "interactive": 0,  # Chat avec l'élève
+    "generation": 1,  # Génération de quiz (l'élève attend la première question)
+    "grading": 2,  # Correction en fin de quiz
+    "prefetch": 3,  # Travail d'arrière-plan (préchargement, résumés...)
+}
+SCHEDULER_DEFAULT_COMPLETION_TOKENS = 1000  # Réservés quand max_tokens n'est pas précisé
+SCHEDULER_MAX_QUEUE_WAIT_S = 120  # Au-delà, la requête est abandonnée plutôt que d'attendre indéfiniment
+
+# Instrumentation des appels au LLM et des traitements de documents
+TELEMETRY_ENABLED = True
+TELEMETRY_RING_SIZE = 500  # Derniers enregistrements gardés pour le panneau d'administration
+TELEMETRY_JSONL_PATH = None  # Ex. "telemetry.jsonl" pour garder une trace de chaque appel
+TELEMETRY_METRICS_PORT = None  # Ex. 9108 : expose http://127.0.0.1:9108/metrics au format Prometheus
+TELEMETRY_ADMIN_PANEL = False  # Affiche les mesures récentes dans la sidebar
+TELEMETRY_LATENCY_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Routage automatique des modèles (option "auto" des sélecteurs)
+ROUTER_AUTO_OPTION = "auto"
+MODEL_ROUTING_POLICY = {
+    # candidates : par ordre de préférence (qualité) ; light_model : réservé aux messages courts sans contexte
+    "chat": {
+        "candidates": ["openai/gpt-oss-120b", "llama-3.3-70b-versatile", "openai/gpt-oss-20b", "moonshotai/kimi-k2-instruct-0905"],
+        "light_model": "llama-3.1-8b-instant",
+        "light_max_prompt_tokens": 40,
+        "light_max_history_tokens": 1000,  # Au-delà, la conversation est trop engagée pour le modèle léger
+    },
+    "quiz_generation": {
+        "candidates": ["openai/gpt-oss-120b", "moonshotai/kimi-k2-instruct-0905", "llama-3.3-70b-versatile"],
+    },
+    "grading": {
+        "candidates": ["openai/gpt-oss-120b", "openai/gpt-oss-20b", "llama-3.3-70b-versatile"],
+    },
+}
+ROUTER_COMPLETION_RESERVE_TOKENS = 2048  # Marge laissée dans la fenêtre de contexte pour la réponse
+ROUTER_STATS_WINDOW = 50  # Derniers appels pris en compte par modèle
+ROUTER_MIN_SAMPLES = 5  # En dessous, les statistiques d'un modèle sont ignorées
+ROUTER_MAX_ERROR_RATE = 0.3  # Au-delà, le modèle est écarté tant que ses appels récents échouent
+ROUTER_LATENCY_TOLERANCE = 2.0  # Un candidat moins préféré n'est choisi que s'il répond au moins 2x plus vite
+ROUTER_STATS_MAX_AGE_S = 300  # Les appels plus anciens sont oubliés (un modèle écarté peut revenir)
+ROUTER_EXPLORATION_RATE = 0.05  # Part des appels envoyés à un autre candidat, pour garder ses délais à jour
+
+
+# Stockage des sessions (historique de conversation, état du quiz), conservé au redémarrage
+SESSION_STORE_BACKEND = "sqlite"  # "sqlite" ou "memory" (rien n'est conservé)
+SESSION_DB_PATH = "tuteur_sessions.sqlite3"
+SESSION_FLUSH_INTERVAL_S = 0.5  # Les écritures sont regroupées puis enregistrées par lot
+SESSION_FLUSH_BATCH_SIZE = 100  # Enregistrement immédiat au-delà de ce nombre d'écritures en attente
+SESSION_MEMORY_MESSAGES = 40  # Derniers messages gardés en mémoire, les plus anciens sont relus à la demande
+SESSION_PAGE_SIZE = 50
+SESSION_CACHED_PAGES = 4
+
+# Stockage des images par empreinte de contenu : l'historique ne garde qu'une référence "blob:<sha256>"
+BLOB_REF_PREFIX = "blob:"
+BLOB_MEMORY_MAX_BYTES = 64 * 1024 * 1024  # Images récentes gardées en mémoire, les autres sont relues sur disque
+BLOB_DIR = "tuteur_blobs"  # Chaque image y est écrite une seule fois, quel que soit le nombre de messages qui la citent
+
+# Modèle utilisé dès qu'un message est accompagné d'images
+VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+MAX_COURSE_DOCUMENTS = 5
+MAX_CHAT_IMAGES = 5
+
+# Service HTTP sans interface (src/service.py)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_WORKER_THREADS = 32  # Appels au LLM et extractions de documents, hors de la boucle asyncio
+SERVICE_MAX_LIVE_SESSIONS = 1000  # Au-delà, les sessions les moins récentes sont relues depuis le stockage à la demande
+SERVICE_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+# Banque de questions : les questions générées sont gardées pour assembler de futurs quiz sans LLM
+QUESTION_BANK_DB_PATH = "tuteur_questions.sqlite3"
+QUESTION_BANK_CANDIDATE_FACTOR = 3  # Candidats lus par question demandée, avant d'écarter les quasi-doublons
+
+# Estimation locale des tokens : caractères par token, par famille de tokenizer (mesurés sur des cours en français)
+TOKEN_MODEL_FAMILIES = {
+    "llama-3.1-8b-instant": "llama3",
+    "llama-3.3-70b-versatile": "llama3",
+    "openai/gpt-oss-120b": "gpt-oss",
+    "openai/gpt-oss-20b": "gpt-oss",
+    "moonshotai/kimi-k2-instruct-0905": "kimi",
+    "meta-llama/llama-4-scout-17b-16e-instruct": "llama4",
+}
+TOKEN_CHARS_PER_TOKEN = {
+    "llama3": 3.3,
+    "gpt-oss": 3.8,
+    "kimi": 3.5,
+    "llama4": 3.7,
+}
+TOKEN_DEFAULT_CHARS_PER_TOKEN = 3.0  # Modèle inconnu ou non précisé : estimation volontairement haute
+TOKEN_MESSAGE_OVERHEAD = 4  # Balises de rôle et de séparation de chaque message
+TOKEN_IMAGE_COST = 1000
+TOKEN_CALIBRATION_WEIGHT = 0.05  # Poids de chaque réponse de l'API (usage.prompt_tokens) dans la recalibration ; 0 = désactivée
+
+# Budget vérifié avant chaque appel : une requête trop longue est raccourcie ou refusée sans aller-retour réseau
+PREFLIGHT_ENABLED = True
+PREFLIGHT_SAFETY_MARGIN = 0.05  # Part du budget (fenêtre de contexte ou tokens par minute) laissée libre pour les erreurs d'estimation
+QUIZ_COMPLETION_TOKENS_PER_QUESTION = 250  # Réservés pour la réponse lors de la génération d'un quiz
\ No newline at end of file
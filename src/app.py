@@ -1,98 +1,163 @@
 import requests
 import os
 import json
-import copy
-import streamlit as streamlit
-from groq import Groq
+import uuid
 from dotenv import load_dotenv
-from groq.types.chat import ChatCompletionMessageParam
 from quiz_agent import QuizAgent
+from history_manager import HistoryWindow, MessagesOverlay, estimate_message_tokens
+from session_store import get_session_store, SessionHistory, SessionStore
+from blob_store import get_blob_store
+from prompt_registry import prompt_registry, TEACHER_CONTEXT_PATH, QUIZ_CONTEXT_PATH
+from quiz_cache import quiz_cache, shuffle_quiz
+from json_stream import JsonArrayStreamParser
+from text_similarity import dedupe_questions
+from local_grader import local_grader
+from groq_pool import get_shared_client, ResilientClient
+from telemetry import telemetry
+from model_router import model_router
+from token_budget import token_estimator, prompt_budgeter, PromptTooLargeError
+from concurrent.futures import ThreadPoolExecutor
+from resources.config import (
+    HISTORY_SUMMARY_MODEL,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    QUIZ_CACHE_ENABLED,
+    QUIZ_CACHE_SHUFFLE,
+    QUIZ_SHARD_SIZE,
+    QUIZ_SHARD_MAX_CONCURRENCY,
+    QUIZ_SHARD_OVERSAMPLE,
+    QUIZ_DEDUP_SIMILARITY,
+    QUIZ_COMPLETION_TOKENS_PER_QUESTION,
+    LOCAL_GRADER_ENABLED,
+    MODEL_CONTEXT_WINDOWS,
+    DEFAULT_CONTEXT_WINDOW,
+    GRADING_MAX_CONCURRENCY,
+    GRADING_BATCH_MAX_ITEMS,
+    GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM,
+    GRADING_BATCH_CONTEXT_RATIO,
+    ROUTER_AUTO_OPTION,
+)
 
 load_dotenv()
 class ConversationAgent:
     
-    TEACHER_CONTEXT_PATH = os.path.join(os.path.dirname(__file__) + '/../resources/teacher_context.txt')
-    QUIZ_CONTEXT_PATH = os.path.join(os.path.dirname(__file__) + '/../resources/quiz_context.txt')
+    TEACHER_CONTEXT_PATH = TEACHER_CONTEXT_PATH
+    QUIZ_CONTEXT_PATH = QUIZ_CONTEXT_PATH
 
-    def __init__(self, quiz_agent: QuizAgent):
-        api_key = os.environ.get("GROQ_KEY")
-        if not api_key:
-            raise ValueError("GROQ_KEY non trouvée dans les variables d'environnement.")
+    HISTORY_WINDOW_KEY = "history_window"
+
+    def __init__(self, quiz_agent: QuizAgent, client=None, session_id: str | None = None, store: SessionStore | None = None):
+        if client is None:
+            api_key = os.environ.get("GROQ_KEY")
+            if not api_key:
+                raise ValueError("GROQ_KEY non trouvée dans les variables d'environnement.")
+            client = get_shared_client(api_key)
+        elif not isinstance(client, ResilientClient):
+            client = ResilientClient(client)
             
-        self.client = Groq(api_key=api_key)
+        self.client = client
         self.quiz_agent = quiz_agent
+        # Un identifiant déjà connu du stockage reprend la conversation là où elle s'était arrêtée
+        self.session_id = session_id or uuid.uuid4().hex
+        self.store = store if store is not None else get_session_store()
         self.initiate_history()
 
+    def create_completion(self, priority="interactive", **kwargs):
+        """Appel à l'API, rangé dans la file de l'ordonnanceur selon sa priorité et la session, et mesuré (voir telemetry.py)."""
+        return self.client.chat.completions.create(priority=priority, session_id=self.session_id, **kwargs)
+
+    def route_model(self, model, task, *prompt_texts, include_history=False):
+        """Résout l'option "auto" avec le routeur (voir model_router.py) ; un modèle choisi à la main est gardé tel quel."""
+        if model != ROUTER_AUTO_OPTION:
+            return model
+        prompt_tokens = sum(estimate_message_tokens({"content": text}) for text in prompt_texts if text)
+        history_tokens = self.history.estimated_tokens if include_history else 0
+        return model_router.route(task, prompt_tokens, history_tokens)
+
     @staticmethod
     def read_file(file_path):
         with open(file_path, "r", encoding="utf-8") as file:
             return file.read()
 
     def initiate_history(self):
-        try:
-            system_content = self.read_file(self.TEACHER_CONTEXT_PATH)
-        except FileNotFoundError:
-            system_content = "Vous êtes un tuteur IA, sage et pédagogue."
-            
-        self.history: list[ChatCompletionMessageParam] = [
-            {
-                "role": "system",
-                "content": system_content
-            }
-        ]
+        self.history = SessionHistory(self.store, self.session_id)
+        if not len(self.history):
+            system_content = prompt_registry.read("teacher_context")
+            self.history.append({"role": "system", "content": system_content})
+
+        # Les images sont rangées à part dans le stockage : l'historique sert directement de vue "API"
+        self.api_history = self.history
+        self.history_window = HistoryWindow(summarize=self.summarize_history)
+        window_state = self.store.load_values(self.session_id).get(self.HISTORY_WINDOW_KEY)
+        if window_state:
+            self.history_window.summary = window_state["summary"]
+            self.history_window.folded_until = window_state["folded_until"]
+
+    @staticmethod
+    def to_api_message(message_data):
+        content = message_data.get("content")
+        if isinstance(content, list):
+            content = next(
+                (item.get('text', "") for item in content if isinstance(item, dict) and item.get('type') == 'text'),
+                ""
+            )
+        return {"role": message_data["role"], "content": content}
 
     def update_history(self, role, content, image_url=None):
-        message_data = {"role": role, "content": content}
-        if image_url:
-            message_data["image_url"] = image_url 
-        self.history.append(message_data)
+        # image_url : référence du BlobStore ; une data URL en clair y est rangée au passage
+        if image_url and image_url.startswith("data:"):
+            image_url = get_blob_store().put_data_url(image_url)
+        self.history.append(self.to_api_message({"role": role, "content": content}), image_url=image_url)
         
     def get_history(self):
         return self.history
 
     def get_cleaned_api_history(self, include_multimodal_content=False, current_multimodal_content=None):
-        messages_to_send = copy.deepcopy(self.history)
-        
-        for message in messages_to_send:
-            if "image_url" in message:
-                del message["image_url"]
-
-            if isinstance(message.get("content"), list):
-                try:
-                    text_content = next(item['text'] for item in message['content'] if item['type'] == 'text')
-                    message['content'] = text_content
-                except (StopIteration, KeyError):
-                    message['content'] = ""
+        """Retourne une vue de l'historique (sans copie) : les messages sont partagés et ne doivent pas être modifiés."""
+        messages_to_send = MessagesOverlay(self.api_history)
 
         if include_multimodal_content and current_multimodal_content is not None:
             if messages_to_send[-1]["role"] == "user":
-                messages_to_send[-1]["content"] = current_multimodal_content
+                messages_to_send[-1] = {"role": "user", "content": current_multimodal_content}
         
         return messages_to_send
 
-    def ask_llm(self, user_interaction, model, context_text=""):
-        teacher_context = self.read_file(self.TEACHER_CONTEXT_PATH)
+    def summarize_history(self, previous_summary, messages):
+        """Condense les tours sortis de la fenêtre dans le résumé glissant."""
+        transcript = "\n".join(
+            f"{message['role']}: {message['content']}"
+            for message in messages
+            if isinstance(message.get("content"), str)
+        )
+        prompt_summary = prompt_registry.render(
+            "history_summary",
+            previous_summary=previous_summary or "(aucun)",
+            transcript=transcript
+        )
+        try:
+            return self.create_completion(
+                operation="summarize_history",
+                priority="prefetch",
+                messages=[{"role": "user", "content": prompt_summary}],
+                model=HISTORY_SUMMARY_MODEL,
+                trim=True,
+                max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+            ).choices[0].message.content.strip()
+        except Exception as e:
+            print(f"[LOG CONSOLE - HISTORY SUMMARY ERROR] {e}")
+            # Repli sans LLM : on garde la fin des échanges repliés
+            return f"{previous_summary}\n{transcript}".strip()[-token_estimator.chars_for_tokens(HISTORY_SUMMARY_MAX_TOKENS, HISTORY_SUMMARY_MODEL):]
+
+    def build_llm_messages(self, user_interaction, model, context_text=""):
+        teacher_context = prompt_registry.read("teacher_context")
         system_content = f"{teacher_context}\n\n[CONTEXTE DE COURS]: {context_text}" if context_text else teacher_context
         
         self.update_history(role="user", content=user_interaction)
         
         cleaned_messages = self.get_cleaned_api_history(include_multimodal_content=False)
         cleaned_messages[0] = {"role": "system", "content": system_content}
+        return self.apply_history_window(cleaned_messages, model)
 
-        try:
-            response = self.client.chat.completions.create(
-                messages=cleaned_messages,
-                model=model
-            )
-            assistant_content = response.choices[0].message.content
-            self.update_history(role="assistant", content=assistant_content)
-            return assistant_content
-        except Exception as e:
-            error_msg = f"❌ Maître Splinter : Une erreur API est survenue pendant la conversation : {e}"
-            self.update_history(role="assistant", content=error_msg)
-            return error_msg
-
-    def ask_vision_model(self, user_interaction, images_data, model):
+    def build_vision_messages(self, user_interaction, images_data, model):
 
         multimodal_content_api = [{"type": "text", "text": user_interaction}]
 
@@ -100,80 +165,186 @@ class ConversationAgent:
             multimodal_content_api.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:{img['mime']};base64,{img['b64']}",
+                    # La donnée de l'image n'est lue qu'ici, au moment de l'appel
+                    "url": get_blob_store().data_url(img['ref']),
                 },
             })
 
-        first_display_url = images_data[0]['display_url'] if images_data else None
+        # L'historique ne garde que la référence de l'image (voir blob_store.py)
+        first_image_ref = images_data[0]['ref'] if images_data else None
         
         self.update_history(
             role="user", 
             content=user_interaction,
-            image_url=first_display_url 
+            image_url=first_image_ref
         )
         
         messages_to_send = self.get_cleaned_api_history(
             include_multimodal_content=True,
             current_multimodal_content=multimodal_content_api
         )
+        return self.apply_history_window(messages_to_send, model)
+
+    def apply_history_window(self, messages, model):
+        """Applique la fenêtre d'historique et enregistre le résumé glissant quand la coupure avance."""
+        folded_until = self.history_window.folded_until
+        window = self.history_window.apply(messages, model)
+        if self.history_window.folded_until != folded_until:
+            self.store.set_value(self.session_id, self.HISTORY_WINDOW_KEY, {
+                "summary": self.history_window.summary,
+                "folded_until": self.history_window.folded_until,
+            })
+        return window
+
+    def stream_completion(self, messages_to_send, model, error_prefix, operation="stream_llm"):
+        """Génère les fragments de la réponse au fil de l'eau, puis enregistre le message complet dans l'historique."""
+        chunks = []
+        try:
+            stream = self.create_completion(
+                operation=operation,
+                priority="interactive",
+                messages=messages_to_send,
+                model=model,
+                trim=True,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+        except Exception as e:
+            # Requête refusée avant l'envoi (voir token_budget.py) : ce n'est pas une erreur de l'API
+            error_msg = f"❌ Maître Splinter : {e}" if isinstance(e, PromptTooLargeError) else f"{error_prefix}{e}"
+            if chunks:
+                error_msg = f"\n\n{error_msg}"
+            chunks.append(error_msg)
+            yield error_msg
+        finally:
+            # Exécuté aussi si l'appelant interrompt la lecture du flux
+            self.update_history(role="assistant", content="".join(chunks))
+
+    def ask_llm(self, user_interaction, model, context_text=""):
+        model = self.route_model(model, "chat", user_interaction, context_text, include_history=True)
+        cleaned_messages = self.build_llm_messages(user_interaction, model, context_text)
+
+        try:
+            response = self.create_completion(
+                operation="ask_llm",
+                priority="interactive",
+                messages=cleaned_messages,
+                model=model,
+                trim=True,
+                hedge=True
+            )
+            assistant_content = response.choices[0].message.content
+            self.update_history(role="assistant", content=assistant_content)
+            return assistant_content
+        except PromptTooLargeError as e:
+            error_msg = f"❌ Maître Splinter : {e}"
+            self.update_history(role="assistant", content=error_msg)
+            return error_msg
+        except Exception as e:
+            error_msg = f"❌ Maître Splinter : Une erreur API est survenue pendant la conversation : {e}"
+            self.update_history(role="assistant", content=error_msg)
+            return error_msg
+
+    def stream_llm(self, user_interaction, model, context_text=""):
+        model = self.route_model(model, "chat", user_interaction, context_text, include_history=True)
+        cleaned_messages = self.build_llm_messages(user_interaction, model, context_text)
+        return self.stream_completion(
+            cleaned_messages,
+            model,
+            error_prefix="❌ Maître Splinter : Une erreur API est survenue pendant la conversation : "
+        )
+
+    def ask_vision_model(self, user_interaction, images_data, model):
+        messages_to_send = self.build_vision_messages(user_interaction, images_data, model)
         
         try:
-            response = self.client.chat.completions.create(
+            response = self.create_completion(
+                operation="ask_vision_model",
+                priority="interactive",
                 messages=messages_to_send,
                 model=model,
+                trim=True,
             ).choices[0].message.content
             self.update_history(role="assistant", content=response)
             return response
+        except PromptTooLargeError as e:
+            error_msg = f"❌ Maître Splinter : {e}"
+            self.update_history(role="assistant", content=error_msg)
+            return error_msg
         except Exception as e:
             error_msg = f"❌ Maître Splinter : Erreur de vision (API) : {e}"
             self.update_history(role="assistant", content=error_msg)
             return error_msg
 
-    def generate_quiz(self, topic, n_questions, model, difficulty, context_instruction):
-        
-        prompt_quiz = f"""
-            Tu es un professeur expert. Sujet : "{topic}". Niveau : {difficulty}.
-            Objectif : Générer EXACTEMENT {n_questions} questions.
-            {context_instruction}
-            
-            INSTRUCTIONS :
-            Génère {n_questions} questions variées ('open' et 'qcm').
-            Si le texte est court, interroge sur des détails précis.
-            
-            Réponds UNIQUEMENT avec un tableau JSON valide (liste d'objets) respectant le schéma imposé dans le prompt système. 
-            
-            Exemple de format JSON STRICTEMENT requis pour la clé "questions" du tableau :
-            [
-                {{
-                    "type": "qcm",
-                    "question": "L'énoncé ?",
-                    "explanation": "Pourquoi c'est juste",
-                    "correct_identifier": "A",
-                    "choices": ["A. Option 1", "B. Option 2", "C. Option 3", "D. Option 4"]
-                }}
-            ]
-            """
-        
-        try:
-            quiz_context = self.read_file(self.QUIZ_CONTEXT_PATH)
-        except FileNotFoundError:
-            quiz_context = "Vous êtes un expert en formatage JSON strict. Répondez UNIQUEMENT avec le tableau JSON demandé."
+    def stream_vision_model(self, user_interaction, images_data, model):
+        messages_to_send = self.build_vision_messages(user_interaction, images_data, model)
+        return self.stream_completion(
+            messages_to_send,
+            model,
+            error_prefix="❌ Maître Splinter : Erreur de vision (API) : ",
+            operation="stream_vision_model"
+        )
 
-        messages_to_send = [
+    def quiz_cache_key(self, topic, n_questions, model, difficulty, context_instruction):
+        return quiz_cache.make_key(
+            topic, n_questions, difficulty, model, context_instruction,
+            prompt_version=prompt_registry.fingerprint("quiz_generation", "quiz_context")
+        )
+
+    def lookup_cached_quiz(self, cache_key, model):
+        cached_quiz = quiz_cache.get(cache_key)
+        telemetry.record_cache_lookup("quiz_cache", bool(cached_quiz), model=model, session_id=self.session_id)
+        return cached_quiz
+
+    def build_quiz_messages(self, topic, n_questions, difficulty, context_instruction):
+        prompt_quiz = prompt_registry.render(
+            "quiz_generation",
+            topic=topic,
+            difficulty=difficulty,
+            n_questions=n_questions,
+            context_instruction=context_instruction
+        )
+        quiz_context = prompt_registry.read("quiz_context")
+
+        return [
             {"role": "system", "content": quiz_context},
             {"role": "user", "content": prompt_quiz}
         ]
+
+    def generate_quiz(self, topic, n_questions, model, difficulty, context_instruction, use_cache=QUIZ_CACHE_ENABLED, shuffle_cached=QUIZ_CACHE_SHUFFLE):
+        
+        cache_key = None
+        if use_cache:
+            cache_key = self.quiz_cache_key(topic, n_questions, model, difficulty, context_instruction)
+            cached_quiz = self.lookup_cached_quiz(cache_key, model)
+            if cached_quiz:
+                self.quiz_agent.create_quiz(shuffle_quiz(cached_quiz) if shuffle_cached else cached_quiz)
+                return True
+
+        # La clé de cache garde le choix de l'utilisateur ("auto" compris) : le routage se fait après
+        model = self.route_model(model, "quiz_generation", topic, context_instruction)
+
+        messages_to_send = self.build_quiz_messages(topic, n_questions, difficulty, context_instruction)
         
         try:
-                raw_response = self.client.chat.completions.create(
+                raw_response = self.create_completion(
+                    operation="generate_quiz",
+                    priority="generation",
                     messages=messages_to_send,
                     model=model, 
+                    reserve_tokens=n_questions * QUIZ_COMPLETION_TOKENS_PER_QUESTION,
                 ).choices[0].message.content
                 
-                if raw_response.strip().startswith("```json"):
-                    raw_response = raw_response.strip().strip("```json").strip("```").strip()
-
-                quiz_data = json.loads(raw_response)
+                quiz_data = self.parse_quiz_response(raw_response)
+                
+                if cache_key and isinstance(quiz_data, list) and quiz_data:
+                    quiz_cache.put(cache_key, quiz_data)
                 
                 self.quiz_agent.create_quiz(quiz_data) 
                 
@@ -184,16 +355,179 @@ class ConversationAgent:
             print(f"[LOG CONSOLE - QUIZ GENERATION ERROR] {error_message}")
             return error_message
         
+        except PromptTooLargeError as e:
+            if n_questions > 1:
+                # Les réponses réservées pour tout le quiz dépassent le budget d'une requête : génération par lots
+                return self.create_sharded_quiz(topic, n_questions, model, difficulty, context_instruction, cache_key)
+            error_message = f"Erreur de taille: {e}"
+            print(f"[LOG CONSOLE - QUIZ GENERATION ERROR] {error_message}")
+            return error_message
+        
         except Exception as e:
             error_message = f"Erreur API/Réseau: Échec de la connexion à Groq ou erreur interne. Détails: {e}"
             print(f"[LOG CONSOLE - QUIZ GENERATION ERROR] {error_message}")
             return error_message
 
+    @staticmethod
+    def parse_quiz_response(raw_response):
+        if raw_response.strip().startswith("```json"):
+            raw_response = raw_response.strip().strip("```json").strip("```").strip()
+        return json.loads(raw_response)
+
+    def request_quiz_questions(self, topic, n_questions, model, difficulty, context_instruction):
+        """Un seul appel au modèle ; retourne les questions valides (lève une exception en cas d'échec)."""
+        messages_to_send = self.build_quiz_messages(topic, n_questions, difficulty, context_instruction)
+        raw_response = self.create_completion(
+            operation="request_quiz_questions",
+            priority="generation",
+            messages=messages_to_send,
+            model=model,
+            reserve_tokens=n_questions * QUIZ_COMPLETION_TOKENS_PER_QUESTION,
+        ).choices[0].message.content
+        quiz_data = self.parse_quiz_response(raw_response)
+        if not isinstance(quiz_data, list):
+            raise ValueError("Le LLM n'a pas retourné un tableau JSON.")
+        return [question for question in quiz_data if QuizAgent.is_valid_question(question)]
+
+    @staticmethod
+    def split_into_shards(n_questions, shard_size=QUIZ_SHARD_SIZE):
+        shard_count = -(-n_questions // shard_size)
+        base, extra = divmod(n_questions, shard_count)
+        return [base + (1 if index < extra else 0) for index in range(shard_count)]
+
+    def collect_sharded_questions(
+            self, topic, n_questions, model, difficulty, context_instruction,
+            shard_size=QUIZ_SHARD_SIZE, max_workers=QUIZ_SHARD_MAX_CONCURRENCY
+        ):
+        """Répartit la génération en plusieurs requêtes parallèles, puis fusionne, dédoublonne et coupe à n_questions."""
+        shard_sizes = self.split_into_shards(n_questions, shard_size)
+
+        def run_shard(index, size):
+            # Chaque lot reçoit une consigne différente pour limiter les doublons entre lots
+            shard_instruction = (
+                f"{context_instruction}\n"
+                f"(Lot {index + 1}/{len(shard_sizes)} : couvre des notions différentes des autres lots.)"
+            )
+            try:
+                return self.request_quiz_questions(topic, size + QUIZ_SHARD_OVERSAMPLE, model, difficulty, shard_instruction)
+            except Exception as e:
+                print(f"[LOG CONSOLE - QUIZ SHARD ERROR] Lot {index + 1} : {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(shard_sizes)))) as executor:
+            shard_results = list(executor.map(run_shard, range(len(shard_sizes)), shard_sizes))
+
+        questions = dedupe_questions(
+            [question for shard in shard_results for question in shard],
+            threshold=QUIZ_DEDUP_SIMILARITY
+        )
+
+        missing = n_questions - len(questions)
+        if 0 < missing < n_questions:
+            # Un seul complément, pour les questions perdues au dédoublonnage ou sur un lot en échec
+            try:
+                top_up = self.request_quiz_questions(topic, missing + QUIZ_SHARD_OVERSAMPLE, model, difficulty, context_instruction)
+                questions += dedupe_questions(top_up, QUIZ_DEDUP_SIMILARITY, known_questions=questions)
+            except Exception as e:
+                print(f"[LOG CONSOLE - QUIZ SHARD ERROR] Complément : {e}")
+
+        return questions[:n_questions]
+
+    def generate_quiz_sharded(self, topic, n_questions, model, difficulty, context_instruction, use_cache=QUIZ_CACHE_ENABLED, shuffle_cached=QUIZ_CACHE_SHUFFLE):
+        if n_questions <= QUIZ_SHARD_SIZE:
+            return self.generate_quiz(topic, n_questions, model, difficulty, context_instruction, use_cache, shuffle_cached)
+
+        cache_key = None
+        if use_cache:
+            cache_key = self.quiz_cache_key(topic, n_questions, model, difficulty, context_instruction)
+            cached_quiz = self.lookup_cached_quiz(cache_key, model)
+            if cached_quiz:
+                self.quiz_agent.create_quiz(shuffle_quiz(cached_quiz) if shuffle_cached else cached_quiz)
+                return True
+
+        model = self.route_model(model, "quiz_generation", topic, context_instruction)
+        return self.create_sharded_quiz(topic, n_questions, model, difficulty, context_instruction, cache_key)
+
+    def quiz_shard_size(self, topic, model, difficulty, context_instruction, shard_size=QUIZ_SHARD_SIZE):
+        """Questions par lot : shard_size, réduit si les réponses réservées ne tiennent pas dans le budget du modèle."""
+        prompt_tokens = token_estimator.messages_tokens(
+            self.build_quiz_messages(topic, shard_size, difficulty, context_instruction), model
+        )
+        fitting = (prompt_budgeter.prompt_limit(model, 0) - prompt_tokens) // QUIZ_COMPLETION_TOKENS_PER_QUESTION - QUIZ_SHARD_OVERSAMPLE
+        return max(1, min(shard_size, fitting))
+
+    def create_sharded_quiz(self, topic, n_questions, model, difficulty, context_instruction, cache_key=None):
+        """Génère le quiz par lots avec un modèle déjà routé, puis le met en cache sous cache_key."""
+        shard_size = self.quiz_shard_size(topic, model, difficulty, context_instruction)
+        questions = self.collect_sharded_questions(topic, n_questions, model, difficulty, context_instruction, shard_size=shard_size)
+        if not questions:
+            error_message = "Erreur de génération: aucun lot n'a retourné de question valide."
+            print(f"[LOG CONSOLE - QUIZ GENERATION ERROR] {error_message}")
+            return error_message
+
+        if cache_key:
+            quiz_cache.put(cache_key, questions)
+        self.quiz_agent.create_quiz(questions)
+        return True
+
+    def stream_quiz(self, topic, n_questions, model, difficulty, context_instruction, use_cache=QUIZ_CACHE_ENABLED, shuffle_cached=QUIZ_CACHE_SHUFFLE):
+        """Génère les questions une par une, dès que chaque objet du tableau JSON est complet dans le flux."""
+        cache_key = None
+        if use_cache:
+            cache_key = self.quiz_cache_key(topic, n_questions, model, difficulty, context_instruction)
+            cached_quiz = self.lookup_cached_quiz(cache_key, model)
+            if cached_quiz:
+                yield from (shuffle_quiz(cached_quiz) if shuffle_cached else cached_quiz)
+                return
+
+        model = self.route_model(model, "quiz_generation", topic, context_instruction)
+
+        messages_to_send = self.build_quiz_messages(topic, n_questions, difficulty, context_instruction)
+        parser = JsonArrayStreamParser()
+        questions = []
+
+        stream = self.create_completion(
+            operation="stream_quiz",
+            priority="generation",
+            messages=messages_to_send,
+            model=model,
+            reserve_tokens=n_questions * QUIZ_COMPLETION_TOKENS_PER_QUESTION,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                for question in parser.feed(chunk.choices[0].delta.content):
+                    if len(questions) < n_questions and self.quiz_agent.is_valid_question(question):
+                        questions.append(question)
+                        yield question
+                if parser.finished or len(questions) >= n_questions:
+                    break
+        finally:
+            # Libère la connexion si le quiz est abandonné avant la fin du flux
+            close_stream = getattr(stream, "close", None)
+            if close_stream:
+                close_stream()
+
+        # Un flux interrompu ou amputé de questions invalides ne doit pas être servi à la place du quiz complet
+        if cache_key and len(questions) == n_questions:
+            quiz_cache.put(cache_key, questions)
+
+    def generate_quiz_streamed(self, topic, n_questions, model, difficulty, context_instruction):
+        """Lance la génération en arrière-plan : l'élève peut répondre dès que la première question est arrivée."""
+        self.quiz_agent.start_quiz_stream(
+            self.stream_quiz(topic, n_questions, model, difficulty, context_instruction),
+            expected_length=n_questions
+        )
+        return True
+
     def get_correction_for_final_review(
             self, 
             question_data: dict, 
             user_answer: str, 
-            model="openai/gpt-oss-120b"
+            model=ROUTER_AUTO_OPTION,
+            use_local_grader=LOCAL_GRADER_ENABLED
         ):
         
         q_type = question_data['type']
@@ -207,8 +541,6 @@ class ConversationAgent:
                 "error_details": question_data
             }
         
-        teacher_context = self.read_file(self.TEACHER_CONTEXT_PATH)
-        
         if q_type == 'qcm':
             # --- LOGIQUE AMÉLIORÉE : Récupération du texte complet ---
             choices = question_data.get('choices', [])
@@ -233,24 +565,22 @@ class ConversationAgent:
             return {"score": score, "feedback": feedback}
         
         else:
-            # Pour les questions ouvertes, on garde la logique LLM mais on force un format direct
-            prompt_correction = f"""
-            TACHE : Corrige cette réponse d'étudiant de manière DIRECTE et CONCISE.
-            
-            Question : {question_data.get('question')}
-            Réponse attendue : '{correct_identifier}'
-            Réponse de l'étudiant : '{user_answer}'
-            Explication contextuelle : {explanation}
+            # Les réponses évidentes (quasi exactes ou vides) sont tranchées sans appel réseau
+            if use_local_grader:
+                local_correction = local_grader.grade(question_data, user_answer)
+                if local_correction:
+                    return local_correction
             
-            RÈGLES :
-            1. Si la réponse est juste (sens globalement identique), mets score 1. Sinon 0.
-            2. Ton feedback doit commencer directement par "Correct" ou "Incorrect".
-            3. Donne ensuite la bonne réponse CLAIREMENT sans fioritures.
-            4. Finis par une explication simple.
-            
-            FORMAT DE SORTIE OBLIGATOIRE (JSON pur) :
-            {{"score": (int, 0 ou 1), "feedback": (string)}}
-            """
+            # Pour les questions ouvertes, on garde la logique LLM mais on force un format direct
+            prompt_correction = prompt_registry.render(
+                "open_correction",
+                question=question_data.get('question'),
+                correct_identifier=correct_identifier,
+                user_answer=user_answer,
+                explanation=explanation
+            )
+            teacher_context = prompt_registry.read("teacher_context")
+            model = self.route_model(model, "grading", teacher_context, prompt_correction)
 
             messages_to_send = [
                 {"role": "system", "content": teacher_context},
@@ -258,7 +588,9 @@ class ConversationAgent:
             ]
 
             try:
-                raw_response = self.client.chat.completions.create(
+                raw_response = self.create_completion(
+                    operation="get_correction",
+                    priority="grading",
                     messages=messages_to_send,
                     model=model,
                 ).choices[0].message.content
@@ -271,4 +603,138 @@ class ConversationAgent:
             except json.JSONDecodeError as e:
                 return {"score": 0, "feedback": f"❌ Erreur de formatage de la correction. (Détails: {raw_response[:50]}...)"}
             except Exception as e:
-                return {"score": 0, "feedback": f"❌ Erreur API pendant la correction. Détails: {e}"}
\ No newline at end of file
+                return {"score": 0, "feedback": f"❌ Erreur API pendant la correction. Détails: {e}"}
+
+    def split_correction_batches(self, items, model):
+        """Regroupe les éléments à corriger pour que chaque requête, feedbacks compris, tienne dans le budget du modèle.
+
+        Le budget est celui du contrôle avant envoi (voir token_budget.py) : fenêtre de contexte et limite de tokens
+        par minute. Un lot trop gros y serait refusé ou, pire, coupé au milieu de son JSON.
+        """
+        max_batch_tokens = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) * GRADING_BATCH_CONTEXT_RATIO
+        base_tokens = token_estimator.messages_tokens([
+            {"content": prompt_registry.read("teacher_context")},
+            {"content": prompt_registry.render("batch_correction", items_json="")},
+        ], model)
+
+        batches = []
+        current_batch = []
+        current_tokens = base_tokens
+        for item in items:
+            # Sérialisé comme dans le lot (indentation comprise), crochets en plus : l'estimation reste par excès
+            item_tokens = token_estimator.text_tokens(json.dumps([item], ensure_ascii=False, indent=1), model)
+            reserve_tokens = (len(current_batch) + 1) * GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM
+            fits = (
+                current_tokens + item_tokens + reserve_tokens <= max_batch_tokens
+                and current_tokens + item_tokens <= prompt_budgeter.prompt_limit(model, reserve_tokens)
+            )
+            if current_batch and (not fits or len(current_batch) >= GRADING_BATCH_MAX_ITEMS):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = base_tokens
+            current_batch.append(item)
+            current_tokens += item_tokens
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    def request_batch_corrections(self, batch, model):
+        """Un seul appel au modèle pour tout le lot ; retourne {id: correction} pour les éléments correctement notés.
+
+        Seuls les identifiants envoyés dans ce lot sont retenus ; un identifiant inconnu est ignoré, un identifiant
+        présent plusieurs fois est écarté (l'élément est alors recorrigé individuellement).
+        """
+        prompt_correction = prompt_registry.render(
+            "batch_correction",
+            items_json=json.dumps(batch, ensure_ascii=False, indent=1)
+        )
+        messages_to_send = [
+            {"role": "system", "content": prompt_registry.read("teacher_context")},
+            {"role": "user", "content": prompt_correction}
+        ]
+        raw_response = self.create_completion(
+            operation="request_batch_corrections",
+            priority="grading",
+            messages=messages_to_send,
+            model=model,
+            reserve_tokens=len(batch) * GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM,
+        ).choices[0].message.content
+
+        batch_ids = {item['id'] for item in batch}
+        corrections = {}
+        duplicated_ids = set()
+        for entry in self.parse_quiz_response(raw_response):
+            if not isinstance(entry, dict) or 'id' not in entry or 'feedback' not in entry:
+                continue
+            try:
+                item_id = int(entry['id'])
+                correction = {"score": 1 if int(entry.get('score', 0)) == 1 else 0, "feedback": entry['feedback']}
+            except (TypeError, ValueError):
+                continue
+            if item_id not in batch_ids:
+                continue
+            if item_id in corrections:
+                duplicated_ids.add(item_id)
+            corrections[item_id] = correction
+        for item_id in duplicated_ids:
+            del corrections[item_id]
+        return corrections
+
+    def get_batch_corrections(self, answers, model=ROUTER_AUTO_OPTION, max_workers=GRADING_MAX_CONCURRENCY):
+        """Corrige une liste de (question_data, user_answer) avec le moins d'appels possible.
+
+        Les QCM et les réponses évidentes sont corrigés localement ; les autres questions ouvertes
+        partent par lots dans une même requête. Un élément absent ou illisible dans la réponse
+        d'un lot est recorrigé individuellement.
+        """
+        corrections = [None] * len(answers)
+        items = []
+        for index, (question_data, user_answer) in enumerate(answers):
+            if question_data.get('type') == 'qcm' or not question_data.get('correct_identifier'):
+                corrections[index] = self.get_correction_for_final_review(question_data, user_answer, model=model)
+                continue
+
+            if LOCAL_GRADER_ENABLED:
+                corrections[index] = local_grader.grade(question_data, user_answer)
+                if corrections[index]:
+                    continue
+
+            items.append({
+                "id": index,
+                "question": question_data.get('question'),
+                "reponse_attendue": question_data['correct_identifier'],
+                "reponse_etudiant": user_answer,
+                "explication": question_data.get('explanation', ''),
+            })
+
+        # Un seul routage pour toute la correction : les lots et les recorrections utilisent le même modèle
+        if items:
+            model = self.route_model(model, "grading", prompt_registry.read("teacher_context"), json.dumps(items[:GRADING_BATCH_MAX_ITEMS], ensure_ascii=False))
+
+        def run_batch(batch):
+            try:
+                return self.request_batch_corrections(batch, model)
+            except Exception as e:
+                print(f"[LOG CONSOLE - BATCH CORRECTION ERROR] {e}")
+                return {}
+
+        batches = self.split_correction_batches(items, model)
+        if batches:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+                for batch_corrections in executor.map(run_batch, batches):
+                    for index, correction in batch_corrections.items():
+                        if 0 <= index < len(corrections) and corrections[index] is None:
+                            corrections[index] = correction
+
+        missing_indexes = [index for index, correction in enumerate(corrections) if correction is None]
+        if missing_indexes:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing_indexes)))) as executor:
+                fallback_corrections = executor.map(
+                    lambda index: self.get_correction_for_final_review(
+                        answers[index][0], answers[index][1], model=model, use_local_grader=False
+                    ),
+                    missing_indexes
+                )
+                for index, correction in zip(missing_indexes, fallback_corrections):
+                    corrections[index] = correction
+        return corrections
\ No newline at end of file
@@ -0,0 +1,364 @@
+"""Benchmarks et test de charge hors ligne du tuteur (aucune clé Groq nécessaire).
+
+Les appels au LLM partent vers un faux serveur local (stub_backend.py) dont la latence,
+le débit de tokens et le taux d'erreur se règlent en ligne de commande.
+
+Usage :
+    python src/benchmark.py history|sharding|scheduler|pdf|quiz|grading|chat
+    python src/benchmark.py load --students 20 --latency 0.5 --tokens-per-s 250 --error-rate 0.02
+"""
+import sys
+import os
+import io
+import copy
+import time
+import uuid
+import random
+import inspect
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app import ConversationAgent
+from quiz_agent import QuizAgent
+from utils import DocumentProcessor
+from groq_pool import ResilientClient
+from scheduler import RequestScheduler
+from stub_backend import StubClient
+from session_store import MemorySessionStore
+
+
+def legacy_cleaned_api_history(history):
+    """Ancienne implémentation (copie profonde + nettoyage complet), gardée comme point de comparaison."""
+    messages_to_send = copy.deepcopy(history)
+    for message in messages_to_send:
+        if "image_url" in message:
+            del message["image_url"]
+        if isinstance(message.get("content"), list):
+            try:
+                message['content'] = next(item['text'] for item in message['content'] if item['type'] == 'text')
+            except (StopIteration, KeyError):
+                message['content'] = ""
+    return messages_to_send
+
+
+def time_per_call(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_history(sizes=(10, 100, 300, 1000), repeat=200):
+    """Coût par tour de get_cleaned_api_history en fonction de la taille de l'historique."""
+    agent = ConversationAgent(QuizAgent(state={}), client=object(), store=MemorySessionStore())
+    fake_image_url = "data:image/png;base64," + "A" * 200_000
+    multimodal_content = [{"type": "text", "text": "Que montre ce schéma ?"}]
+
+    print(f"{'messages':>10} {'vue API (µs)':>14} {'deepcopy (µs)':>15}")
+    for size in sizes:
+        while len(agent.history) < size:
+            turn = len(agent.history)
+            if turn % 2:
+                image_url = fake_image_url if turn % 20 == 1 else None
+                agent.update_history("user", f"Question {turn} " + "x" * 200, image_url=image_url)
+            else:
+                agent.update_history("assistant", f"Réponse {turn} " + "y" * 800)
+
+        incremental = time_per_call(
+            lambda: agent.get_cleaned_api_history(True, multimodal_content), repeat
+        )
+        legacy = time_per_call(lambda: legacy_cleaned_api_history(list(agent.history)), max(1, repeat // 20))
+        print(f"{len(agent.history):>10} {incremental * 1e6:>14.1f} {legacy * 1e6:>15.1f}")
+
+
+BENCH_MODEL = "openai/gpt-oss-120b"
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def print_latency_table(latencies: dict, errors: dict | None = None):
+    errors = errors or {}
+    print(f"{'opération':>24} {'n':>5} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'erreurs':>8}")
+    for operation, samples in latencies.items():
+        if not samples:
+            continue
+        print(
+            f"{operation:>24} {len(samples):>5} {percentile(samples, 50):>8.2f} "
+            f"{percentile(samples, 95):>8.2f} {percentile(samples, 99):>8.2f} {errors.get(operation, 0):>8}"
+        )
+
+
+def make_client(scheduler=None, **stub_options) -> ResilientClient:
+    """Client résilient branché sur le faux serveur ; sans ordonnanceur par défaut pour mesurer l'application seule."""
+    return ResilientClient(StubClient(**stub_options), scheduler=scheduler)
+
+
+def make_agents(client) -> tuple[ConversationAgent, QuizAgent]:
+    quiz_agent = QuizAgent(state={})
+    return ConversationAgent(quiz_agent, client=client, store=MemorySessionStore()), quiz_agent
+
+
+def make_sample_pdf(n_pages: int, lines_per_page: int = 45) -> bytes:
+    """PDF texte minimal (police standard Helvetica), pour mesurer l'extraction sans fichier d'exemple."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(n_pages):
+        lines = [
+            f"Page {page + 1}, ligne {line + 1} : la notion {page * lines_per_page + line} est definie ici avec un exemple."
+            for line in range(lines_per_page)
+        ]
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({text}) Tj T*" for text in lines) + " ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream.encode("latin-1")))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (len(objects))
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode()
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref_offset = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+def sample_answer(question: dict, rng: random.Random) -> str:
+    """Réponses variées : justes, vides ou reformulées (ces dernières partent vers le LLM)."""
+    if question['type'] == 'qcm':
+        return rng.choice("AABCD")
+    return rng.choice([
+        question['correct_identifier'],
+        "je sais pas",
+        "Il faut donner la définition et illustrer par un cas concret.",
+    ])
+
+
+def bench_sharding(sizes=(5, 10, 20), latency=0.3, tokens_per_s=250, error_rate=0.0):
+    """Temps de génération d'un quiz en un appel ou en lots parallèles, contre le faux serveur."""
+    # Sans ordonnanceur : on mesure le parallélisme, pas les limites de débit
+    agent, _ = make_agents(make_client(latency=latency, tokens_per_s=tokens_per_s, error_rate=error_rate))
+
+    print(f"{'questions':>10} {'un appel (s)':>13} {'en lots (s)':>12} {'obtenues':>9}")
+    for size in sizes:
+        start = time.perf_counter()
+        agent.request_quiz_questions("sujet", size, BENCH_MODEL, "Moyen", "")
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        questions = agent.collect_sharded_questions("sujet", size, BENCH_MODEL, "Moyen", "")
+        sharded = time.perf_counter() - start
+        print(f"{size:>10} {single:>13.2f} {sharded:>12.2f} {len(questions):>9}")
+
+
+def bench_scheduler(rpm=20, period=2.0, grading_sessions=3, requests_per_grading_session=15, grading_concurrency=4, chat_messages=6):
+    """Des sessions en correction saturent le modèle pendant qu'une session discute : temps d'attente par priorité.
+
+    La "minute" des limites est ramenée à period secondes pour que la simulation reste courte.
+    """
+    scheduler = RequestScheduler(limits={BENCH_MODEL: {"rpm": rpm, "tpm": 10 ** 9}}, period=period)
+    client = make_client(scheduler=scheduler, latency=0.05, tokens_per_s=10 ** 6, rpm=rpm, period=period)
+    backend = client.raw_client.chat.completions
+    waits = {"interactive": [], "grading": []}
+
+    def send(priority, session_id):
+        start = time.perf_counter()
+        client.chat.completions.create(
+            messages=[{"role": "user", "content": "x" * 400}], model=BENCH_MODEL,
+            priority=priority, session_id=session_id,
+        )
+        waits[priority].append(time.perf_counter() - start)
+
+    def run_grading_session():
+        # Comme finalize_quiz_results : plusieurs corrections en parallèle par session
+        session_id = uuid.uuid4().hex
+        with ThreadPoolExecutor(max_workers=grading_concurrency) as executor:
+            list(executor.map(lambda _: send("grading", session_id), range(requests_per_grading_session)))
+
+    def run_chat_session():
+        session_id = uuid.uuid4().hex
+        for _ in range(chat_messages):
+            send("interactive", session_id)
+            time.sleep(0.3)
+
+    threads = [threading.Thread(target=run_grading_session) for _ in range(grading_sessions)]
+    threads.append(threading.Thread(target=run_chat_session))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"durée totale : {time.perf_counter() - start:.1f} s, 429 renvoyés par le serveur : {backend.errors}")
+    print(f"{'priorité':>12} {'requêtes':>9} {'attente médiane (s)':>20} {'attente max (s)':>16}")
+    for priority, samples in waits.items():
+        print(f"{priority:>12} {len(samples):>9} {statistics.median(samples):>20.2f} {max(samples):>16.2f}")
+
+
+def bench_pdf(page_counts=(5, 50, 200)):
+    """Extraction de texte de documents générés : première lecture, puis relecture servie par le cache."""
+    print(f"{'pages':>6} {'extraction (s)':>15} {'cache (s)':>10} {'caractères':>11}")
+    for n_pages in page_counts:
+        pdf_bytes = make_sample_pdf(n_pages) + uuid.uuid4().hex.encode()  # Contenu unique : pas de cache au premier passage
+        start = time.perf_counter()
+        text = DocumentProcessor.extract_text_from_pdf_cached(io.BytesIO(pdf_bytes))
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        DocumentProcessor.extract_text_from_pdf_cached(io.BytesIO(pdf_bytes))
+        cached = time.perf_counter() - start
+        print(f"{n_pages:>6} {first:>15.3f} {cached:>10.4f} {len(text):>11}")
+
+
+def bench_quiz(sizes=(3, 10, 20), repeat=3, latency=0.3, tokens_per_s=250, error_rate=0.0):
+    """generate_quiz (un appel), generate_quiz_sharded et premier élément du flux, par taille de quiz."""
+    client = make_client(latency=latency, tokens_per_s=tokens_per_s, error_rate=error_rate)
+    latencies = {}
+    for size in sizes:
+        for _ in range(repeat):
+            agent, quiz_agent = make_agents(client)
+            topic = f"sujet {uuid.uuid4().hex}"
+            start = time.perf_counter()
+            agent.generate_quiz(topic, size, BENCH_MODEL, "Moyen", "", use_cache=False)
+            latencies.setdefault(f"generate_quiz ({size})", []).append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            agent.generate_quiz_sharded(topic, size, BENCH_MODEL, "Moyen", "", use_cache=False)
+            latencies.setdefault(f"sharded ({size})", []).append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            questions = agent.stream_quiz(topic, size, BENCH_MODEL, "Moyen", "", use_cache=False)
+            next(questions)
+            latencies.setdefault(f"1re question flux ({size})", []).append(time.perf_counter() - start)
+            questions.close()
+    print_latency_table(latencies)
+
+
+def bench_grading(n_questions=10, repeat=3, latency=0.3, tokens_per_s=250, error_rate=0.0, seed=0):
+    """finalize_quiz_results sur un quiz rempli de réponses variées, en mode parallèle puis groupé."""
+    client = make_client(latency=latency, tokens_per_s=tokens_per_s, error_rate=error_rate)
+    rng = random.Random(seed)
+    latencies = {"parallel": [], "batch": []}
+    calls_before = client.raw_client.chat.completions.calls
+    for mode in latencies:
+        for _ in range(repeat):
+            agent, quiz_agent = make_agents(client)
+            quiz_agent.create_quiz([client.raw_client.chat.completions.make_question(index) for index in range(n_questions)])
+            while quiz_agent.read_state() == 'questioning':
+                quiz_agent.record_answer_and_advance(sample_answer(quiz_agent.read_current_question(), rng))
+            start = time.perf_counter()
+            quiz_agent.finalize_quiz_results(agent, model=BENCH_MODEL, mode=mode)
+            latencies[mode].append(time.perf_counter() - start)
+    print_latency_table(latencies)
+    print(f"appels au faux serveur : {client.raw_client.chat.completions.calls - calls_before}")
+
+
+def bench_chat(turns=10, latency=0.3, tokens_per_s=250, error_rate=0.0):
+    """ask_llm sur une conversation de plusieurs tours (l'historique grandit à chaque tour)."""
+    agent, _ = make_agents(make_client(latency=latency, tokens_per_s=tokens_per_s, error_rate=error_rate))
+    latencies = {"ask_llm": []}
+    errors = {"ask_llm": 0}
+    for turn in range(turns):
+        start = time.perf_counter()
+        answer = agent.ask_llm(f"Peux-tu m'expliquer la notion {turn} du cours ?", BENCH_MODEL)
+        latencies["ask_llm"].append(time.perf_counter() - start)
+        errors["ask_llm"] += answer.startswith("❌")
+    print_latency_table(latencies, errors)
+
+
+def bench_load(students=10, chat_turns=3, n_questions=10, latency=0.3, tokens_per_s=250, error_rate=0.0, scheduler=False, seed=0):
+    """N élèves simultanés : discussion, génération d'un quiz, réponses puis correction finale.
+
+    Retourne les mesures (latences et erreurs par opération, appels au faux serveur) pour les tests.
+    """
+    request_scheduler = RequestScheduler() if scheduler else None
+    client = make_client(scheduler=request_scheduler, latency=latency, tokens_per_s=tokens_per_s, error_rate=error_rate)
+    latencies = {"ask_llm": [], "generate_quiz": [], "finalize_quiz_results": [], "session": []}
+    errors = {operation: 0 for operation in latencies}
+    lock = threading.Lock()
+
+    def timed(operation, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        with lock:
+            latencies[operation].append(time.perf_counter() - start)
+        return result
+
+    def run_student(index):
+        rng = random.Random(seed + index)
+        session_start = time.perf_counter()
+        agent, quiz_agent = make_agents(client)
+        for turn in range(chat_turns):
+            answer = timed("ask_llm", agent.ask_llm, f"Explique-moi la notion {turn} du chapitre {index}.", BENCH_MODEL)
+            with lock:
+                errors["ask_llm"] += answer.startswith("❌")
+
+        success = timed("generate_quiz", agent.generate_quiz, f"chapitre {index}", n_questions, BENCH_MODEL, "Moyen", "", use_cache=False)
+        if success is not True:
+            with lock:
+                errors["generate_quiz"] += 1
+            return
+        while quiz_agent.read_state() == 'questioning':
+            quiz_agent.record_answer_and_advance(sample_answer(quiz_agent.read_current_question(), rng))
+        timed("finalize_quiz_results", quiz_agent.finalize_quiz_results, agent, model=BENCH_MODEL)
+        with lock:
+            latencies["session"].append(time.perf_counter() - session_start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=students) as executor:
+        for future in [executor.submit(run_student, index) for index in range(students)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    backend = client.raw_client.chat.completions
+    print(f"{students} élèves en {elapsed:.1f} s : {len(latencies['session']) / elapsed * 60:.1f} sessions/min, "
+          f"{backend.calls / elapsed:.1f} appels/s au faux serveur ({backend.errors} erreurs injectées)")
+    print_latency_table(latencies, errors)
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors, "calls": backend.calls}
+
+
+BENCHMARKS = {
+    "history": bench_history,
+    "sharding": bench_sharding,
+    "scheduler": bench_scheduler,
+    "pdf": bench_pdf,
+    "quiz": bench_quiz,
+    "grading": bench_grading,
+    "chat": bench_chat,
+    "load": bench_load,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), nargs="?", default="history")
+    parser.add_argument("--students", type=int, help="load : nombre d'élèves simultanés")
+    parser.add_argument("--latency", type=float, help="faux serveur : délai avant le premier token (s)")
+    parser.add_argument("--tokens-per-s", type=float, help="faux serveur : vitesse de génération")
+    parser.add_argument("--error-rate", type=float, help="faux serveur : part des requêtes en erreur 503")
+    parser.add_argument("--scheduler", action="store_true", default=None, help="load : applique les limites de MODEL_RATE_LIMITS")
+    args = parser.parse_args()
+
+    benchmark = BENCHMARKS[args.benchmark]
+    accepted = inspect.signature(benchmark).parameters
+    options = {name: value for name, value in vars(args).items() if value is not None and name in accepted}
+    benchmark(**options)
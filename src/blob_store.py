@@ -0,0 +1,116 @@
+import os
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from paths import data_path
+from resources.config import BLOB_REF_PREFIX, BLOB_MEMORY_MAX_BYTES, BLOB_DIR
+
+
+class BlobStore:
+    """Contenus binaires (images) adressés par leur empreinte SHA-256.
+
+    Un contenu n'est stocké qu'une fois, quel que soit le nombre de messages qui le citent :
+    il est écrit sur disque à son premier ajout, et les plus récents restent en mémoire
+    (LRU bornée à memory_max_bytes). Les références "blob:<sha256>" se résolvent à la demande.
+    """
+
+    def __init__(self, directory: str | None = BLOB_DIR, memory_max_bytes: int = BLOB_MEMORY_MAX_BYTES):
+        self.directory = data_path(directory)
+        self.memory_max_bytes = memory_max_bytes
+        self.hits = 0
+        self.disk_reads = 0
+        self._memory: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def is_ref(value) -> bool:
+        return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def put(self, data: bytes, mime: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if self.directory and not os.path.exists(self._path(digest)):
+            # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+            temporary_path = f"{self._path(digest)}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(mime.encode("utf-8") + b"\n" + data)
+            os.replace(temporary_path, self._path(digest))
+        self._remember(digest, data, mime)
+        return BLOB_REF_PREFIX + digest
+
+    def put_data_url(self, data_url: str) -> str:
+        """Range le contenu d'une data URL ("data:<mime>;base64,...") et retourne sa référence."""
+        header, _, b64 = data_url.partition(",")
+        mime = header[len("data:"):].split(";")[0] or "application/octet-stream"
+        return self.put(base64.b64decode(b64), mime)
+
+    def _remember(self, digest: str, data: bytes, mime: str):
+        if len(data) > self.memory_max_bytes:
+            return
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return
+            self._memory[digest] = (data, mime)
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, ref: str) -> tuple[bytes, str] | None:
+        """Retourne (contenu, type MIME), ou None si la référence est inconnue."""
+        digest = ref[len(BLOB_REF_PREFIX):] if self.is_ref(ref) else ref
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+                return self._memory[digest]
+
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(digest), "rb") as file:
+                mime, _, data = file.read().partition(b"\n")
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.disk_reads += 1
+        self._remember(digest, data, mime.decode("utf-8"))
+        return data, mime.decode("utf-8")
+
+    def b64(self, ref: str) -> str | None:
+        blob = self.get(ref)
+        return base64.b64encode(blob[0]).decode("utf-8") if blob else None
+
+    def data_url(self, ref: str) -> str | None:
+        blob = self.get(ref)
+        if blob is None:
+            return None
+        return f"data:{blob[1]};base64,{base64.b64encode(blob[0]).decode('utf-8')}"
+
+    def resolve(self, value: str | None) -> str | None:
+        """Référence -> data URL ; toute autre valeur (URL déjà en clair, None) est rendue telle quelle."""
+        return self.data_url(value) if self.is_ref(value) else value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "disk_reads": self.disk_reads, "entries": len(self._memory), "bytes": self._memory_bytes}
+
+
+_blob_store: BlobStore | None = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """BlobStore partagé par le processus, créé au premier usage (et non à l'import)."""
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore()
+        return _blob_store
@@ -0,0 +1,131 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from resources.config import PDF_CACHE_MAX_BYTES, PDF_CACHE_DIR, PDF_CACHE_MAX_DISK_BYTES
+
+
+class ExtractionCache:
+    """Cache du texte extrait des PDF, indexé par l'empreinte SHA-256 du contenu du fichier."""
+
+    def __init__(self, max_bytes: int, disk_dir: str | None = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_content(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def _size_of(text: str) -> int:
+        return len(text.encode("utf-8"))
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.txt")
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        text = self._read_from_disk(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store_in_memory(key, text)
+            return text
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._store_in_memory(key, text)
+        self._write_to_disk(key, text)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def _store_in_memory(self, key: str, text: str):
+        size = self._size_of(text)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._current_bytes -= self._size_of(self._entries.pop(key))
+        self._entries[key] = text
+        self._current_bytes += size
+        while self._current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= self._size_of(evicted)
+
+    def _read_from_disk(self, key: str) -> str | None:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+            os.utime(path)  # Rafraîchit l'ordre LRU sur disque
+            return text
+        except OSError:
+            return None
+
+    def _write_to_disk(self, key: str, text: str):
+        if not self.disk_dir:
+            return
+        try:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        if self.max_disk_bytes <= 0:
+            return
+        entries = []
+        total = 0
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".txt"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+extraction_cache = ExtractionCache(
+    max_bytes=PDF_CACHE_MAX_BYTES,
+    disk_dir=PDF_CACHE_DIR,
+    max_disk_bytes=PDF_CACHE_MAX_DISK_BYTES,
+)
@@ -1,10 +1,8 @@
 import sys
 import os
-import base64
+import time
+import uuid
 import streamlit as streamlit
-from app import ConversationAgent
-from quiz_agent import QuizAgent
-from utils import DocumentProcessor
 
 current_dir = os.path.dirname(__file__)
 project_root = os.path.abspath(os.path.join(current_dir, '..'))
@@ -12,35 +10,53 @@ project_root = os.path.abspath(os.path.join(current_dir, '..'))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from resources.config import LLM_MODELS
+from resources.config import LLM_MODELS, CHAT_STREAMING, QUIZ_WAIT_POLL_S, TELEMETRY_ADMIN_PANEL, ROUTER_AUTO_OPTION, QUIZ_MAX_QUESTIONS, MAX_COURSE_DOCUMENTS, MAX_CHAT_IMAGES, CHAT_PAGE_SIZE
+from app import ConversationAgent
+from quiz_agent import QuizAgent
+from utils import DocumentProcessor
+from scheduler import request_scheduler
+from telemetry import telemetry, start_metrics_server
+from local_grader import local_grader
+from tutor_session import TutorSession
+from question_bank import get_question_bank
+
+# Les avertissements de lecture des documents s'affichent dans la page
+DocumentProcessor.notifier = streamlit
 
 if "uploader_key" not in streamlit.session_state:
     streamlit.session_state.uploader_key = 0
 
 if "selected_model" not in streamlit.session_state:
-    streamlit.session_state.selected_model = LLM_MODELS[0]
-VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+    streamlit.session_state.selected_model = ROUTER_AUTO_OPTION
+# "auto" : le modèle est choisi à chaque appel selon la tâche, la taille du prompt et les latences récentes
+MODEL_OPTIONS = [ROUTER_AUTO_OPTION] + LLM_MODELS
+
+def format_model_option(model: str) -> str:
+    return "Automatique" if model == ROUTER_AUTO_OPTION else model
 
 def initialize_session():
     
-    if "quiz_manager" not in streamlit.session_state:
-        streamlit.session_state.quiz_manager = QuizAgent()
+    # L'identifiant de session est porté par l'URL (?session=...) : recharger la page ou
+    # redémarrer le serveur reprend la conversation et le quiz depuis le stockage
+    if "session_id" not in streamlit.session_state:
+        streamlit.session_state.session_id = streamlit.query_params.get("session") or uuid.uuid4().hex
+        streamlit.query_params["session"] = streamlit.session_state.session_id
     
-    if "conversation_agent" not in streamlit.session_state:
-        streamlit.session_state.conversation_agent = ConversationAgent(
-            quiz_agent=streamlit.session_state.quiz_manager
-        )
+    # Toute la logique (conversation, quiz, cours) est dans TutorSession, partagée avec service.py
+    if "tutor" not in streamlit.session_state:
+        tutor = TutorSession(streamlit.session_state.session_id)
+        streamlit.session_state.tutor = tutor
+        streamlit.session_state.quiz_manager = tutor.quiz_agent
+        streamlit.session_state.conversation_agent = tutor.conversation_agent
     
-    if "course_text_content" not in streamlit.session_state:
-        streamlit.session_state.course_text_content = ""
-    if "image_base64_url" not in streamlit.session_state:
-        streamlit.session_state.image_base64_url = None
+    if "image_refs" not in streamlit.session_state:
+        streamlit.session_state.image_refs = []
 
 def render_start_interface(conversation_agent: ConversationAgent, quiz_manager: QuizAgent):
     
     streamlit.header("Démarrez un cycle de révision.")
     
-    default_topic = "le cours ci-joint" if streamlit.session_state.course_text_content else "un sujet libre"
+    default_topic = "le cours ci-joint" if streamlit.session_state.tutor.course_documents else "un sujet libre"
     
     streamlit.markdown("### Configuration du Quiz")
     
@@ -49,23 +65,35 @@ def render_start_interface(conversation_agent: ConversationAgent, quiz_manager:
         topic = streamlit.text_input("Sujet de l'évaluation", value=default_topic, 
                             placeholder="Ex: La Révolution Française")
     with c2:
-        num_questions = streamlit.slider("Nb Questions", 1, 20, 3)
+        num_questions = streamlit.slider("Nb Questions", 1, QUIZ_MAX_QUESTIONS, 3)
     with c3:
         streamlit.session_state.selected_model = streamlit.selectbox(
             "Modèle", 
-            options=LLM_MODELS,
-            index=2,
+            options=MODEL_OPTIONS,
+            index=0,
+            format_func=format_model_option,
             key='llm_select_quiz'
         )
     with c4:
         difficulty = streamlit.selectbox("Niveau", ["Débutant", "Moyen", "Expert"])
     
+    banked_questions = get_question_bank().count(topic, difficulty, streamlit.session_state.tutor.document_hashes)
+    from_bank = streamlit.checkbox(
+        "♻️ Réviser avec les questions déjà posées",
+        value=banked_questions >= num_questions,
+        disabled=not banked_questions,
+        help="Le quiz est assemblé sans attendre le modèle, qui ne complète que les questions manquantes."
+    )
+    streamlit.caption(f"{banked_questions} question(s) en banque pour ce cours et ce niveau.")
+    
     if streamlit.button("🚀 Générer l'évaluation") and topic:
         
         streamlit.session_state['topic'] = topic
         streamlit.session_state['num_questions'] = num_questions
         streamlit.session_state['difficulty'] = difficulty
+        streamlit.session_state['from_bank'] = from_bank
         
+        # La discussion est désactivée pendant le quiz : toute la page est relancée
         quiz_manager.set_state('generating')
         streamlit.rerun()
 
@@ -76,7 +104,7 @@ def render_questioning_interface(conversation_agent: ConversationAgent, quiz_man
     q_data = quiz_manager.read_current_question()
     q_index = quiz_manager.read_quiz_length() - (quiz_manager.read_quiz_length() - quiz_manager.read_current_question_index())
     
-    streamlit.header(f"Question {q_index + 1}/{quiz_manager.read_quiz_length()}")
+    streamlit.header(f"Question {q_index + 1}/{quiz_manager.read_expected_quiz_length()}")
     streamlit.subheader(q_data['question'])
     
     user_answer = ""
@@ -103,8 +131,29 @@ def render_questioning_interface(conversation_agent: ConversationAgent, quiz_man
                 streamlit.warning("Veuillez saisir ou choisir une réponse, Sensei n'aime pas le vide.")
                 return 
 
-            quiz_manager.record_answer_and_advance(user_answer)
-            streamlit.rerun()
+            streamlit.session_state.tutor.answer(user_answer)
+            streamlit.rerun(scope="fragment")
+
+def render_waiting_interface(conversation_agent: ConversationAgent, quiz_manager: QuizAgent):
+    """Attend la question suivante lorsque l'élève a rattrapé la génération du quiz."""
+    
+    error_message = quiz_manager.refresh_waiting_state()
+    
+    if error_message:
+        streamlit.error(f"❌ Échec de la génération du quiz. {error_message}")
+        return
+    
+    if quiz_manager.read_state() == 'waiting_question':
+        q_index = quiz_manager.read_current_question_index()
+        streamlit.header(f"Question {q_index + 1}/{quiz_manager.read_expected_quiz_length()}")
+        queue_position = request_scheduler.queue_position(conversation_agent.session_id)
+        if queue_position is not None:
+            estimated_wait = request_scheduler.estimated_wait(conversation_agent.session_id) or 0
+            streamlit.caption(f"File d'attente du modèle : position {queue_position + 1}, environ {estimated_wait:.0f} s.")
+        with streamlit.spinner("Le Maître prépare la question suivante..."):
+            time.sleep(QUIZ_WAIT_POLL_S)
+    
+    streamlit.rerun(scope="fragment")
 
 def render_final_review_interface(conversation_agent: ConversationAgent, quiz_manager: QuizAgent):
     """Déclenche la correction finale par le LLM et passe à l'affichage des résultats."""
@@ -115,9 +164,9 @@ def render_final_review_interface(conversation_agent: ConversationAgent, quiz_ma
     streamlit.info("Maître Splinter évalue la qualité de votre pratique. Cela peut prendre quelques instants pour les questions ouvertes.")
     
     with streamlit.spinner("Évaluation finale par le tuteur IA..."):
-        quiz_manager.finalize_quiz_results(conversation_agent, model=model_id)
+        streamlit.session_state.tutor.finalize(model=model_id)
         
-    streamlit.rerun()
+    streamlit.rerun(scope="fragment")
 
 def render_finished_interface(quiz_manager: QuizAgent):
     
@@ -163,12 +212,24 @@ def render_finished_interface(quiz_manager: QuizAgent):
             # Note : On a retiré le streamlit.caption qui faisait doublon
 
     if streamlit.button("🥋 Recommencer l'Entraînement"):
-        quiz_manager.delete_quiz()
+        # Passe par la session : les questions du quiz sont rangées dans la banque avant l'effacement
+        streamlit.session_state.tutor.reset_quiz()
         streamlit.rerun()
 
 def render_chat_history(conversation_agent: ConversationAgent):
+    """Affiche les CHAT_PAGE_SIZE derniers messages ; les plus anciens sont dépliés page par page, à la demande."""
+    
+    history = conversation_agent.history
+    visible_messages = streamlit.session_state.setdefault('chat_visible_messages', CHAT_PAGE_SIZE)
+    first_visible = max(1, len(history) - visible_messages)
+    
+    if first_visible > 1:
+        if streamlit.button(f"⬆️ Afficher les messages précédents ({first_visible - 1})", key='load_older_messages'):
+            streamlit.session_state.chat_visible_messages += CHAT_PAGE_SIZE
+            streamlit.rerun(scope="fragment")
     
-    for message in conversation_agent.history:
+    # Seule la fin de l'historique est lue (voir SessionHistory) : le coût ne dépend pas de la longueur de la conversation
+    for message in history[first_visible:]:
         if message["role"] != "system":
             with streamlit.chat_message(message["role"]):
                 streamlit.markdown(message["content"])
@@ -176,63 +237,149 @@ def render_chat_history(conversation_agent: ConversationAgent):
                 # Le bloc d'affichage d'image a été supprimé ici pour alléger le chat.
                 # L'image reste visible dans la sidebar lors de l'upload.
 
-def render_chat_input(conversation_agent: ConversationAgent):
+def render_chat_input(tutor: TutorSession):
     """Gère l'entrée utilisateur pour le mode conversationnel/vision."""
     
-    # Récupère la LISTE des fichiers (grâce à accept_multiple_files=True)
-    uploaded_images_list = streamlit.session_state.get('img_uploader')
-    
     if user_input := streamlit.chat_input("Pose ta question ou demande un résumé à Splinter..."):
         
-        context_text = streamlit.session_state.course_text_content
         model_id = streamlit.session_state.selected_model
+        # Images de la sidebar (mêmes références que l'aperçu) ; sans image, le modèle choisi répond
+        image_refs = streamlit.session_state.image_refs
+            
+        if CHAT_STREAMING:
+            
+            with streamlit.chat_message("user"):
+                streamlit.markdown(user_input)
+            
+            with streamlit.chat_message("assistant"):
+                # Les tokens s'affichent dès leur arrivée, l'historique est complété en fin de flux
+                streamlit.write_stream(tutor.chat(user_input, model_id, image_refs=image_refs, stream=True))
         
-        # Préparation des données images
-        images_data = []
+        else:
+            
+            with streamlit.spinner("Splinter réfléchit..."):
+                tutor.chat(user_input, model_id, image_refs=image_refs)
         
-        if uploaded_images_list:
-            # On boucle sur chaque fichier de la liste
-            for img_file in uploaded_images_list:
-                img_file.seek(0)
-                image_b64_raw = base64.b64encode(img_file.read()).decode('utf-8')
-                mime_type = img_file.type
-                
-                images_data.append({
-                    'b64': image_b64_raw,
-                    'mime': mime_type,
-                    'display_url': f"data:{mime_type};base64,{image_b64_raw}"
-                })
+        if image_refs:
+            # Les images jointes vident l'uploader de la sidebar : toute la page est relancée
+            if 'img_uploader' in streamlit.session_state:
+                del streamlit.session_state['img_uploader']
+            streamlit.rerun()
             
-        with streamlit.spinner("Splinter réfléchit..."):
+        streamlit.rerun(scope="fragment")
+
+@streamlit.fragment
+def render_chat_panel(tutor: TutorSession):
+    """Onglet de discussion : un message ou le dépliage de l'historique ne réexécute que cette zone."""
+    
+    streamlit.header("Discours & Sagesse du Maître")
+    
+    streamlit.session_state.selected_model = streamlit.selectbox(
+        "Modèle de Conversation", 
+        options=MODEL_OPTIONS,
+        index=0,
+        format_func=format_model_option,
+        key='llm_select_chat'
+    )
+    
+    render_chat_history(tutor.conversation_agent)
+    
+    if tutor.quiz_agent.read_state() == 'start':
+        render_chat_input(tutor)
+    else:
+        streamlit.warning("Veuillez compléter ou annuler le quiz avant de commencer une nouvelle discussion.")
+
+@streamlit.fragment
+def render_quiz_panel(tutor: TutorSession):
+    """Onglet du quiz : réponses, attente des questions et correction ne réexécutent que cette zone.
+
+    Seuls le lancement et l'abandon d'un quiz relancent toute la page, car ils (dés)activent la discussion.
+    """
+    
+    agent = tutor.conversation_agent
+    quiz_manager = tutor.quiz_agent
+    current_state = quiz_manager.read_state()
+    
+    if current_state == 'start':
+        render_start_interface(agent, quiz_manager)
+
+    elif current_state == 'generating':
+        with streamlit.spinner("Création du questionnaire par le Maître..."):
+            model_id = streamlit.session_state.selected_model
+            topic_input = streamlit.session_state.get('topic', 'sujet libre')
+            num_questions = streamlit.session_state.get('num_questions', 3)
+            difficulty = streamlit.session_state.get('difficulty', 'Moyen')
+            from_bank = streamlit.session_state.get('from_bank', False)
+            success = tutor.start_quiz(topic_input, num_questions, difficulty, model_id, from_bank=from_bank)
             
-            if images_data:
-                # On appelle la nouvelle version de la fonction qui accepte une liste
-                response = conversation_agent.ask_vision_model(
-                    user_interaction=user_input,
-                    images_data=images_data, # On passe la liste complète
-                    model=VISION_MODEL
-                )
-            else:
-                response = conversation_agent.ask_llm(
-                    user_interaction=user_input,
-                    model=model_id,
-                    context_text=context_text
-                )
+            if not success:
+                streamlit.error("❌ Échec de la génération du quiz. Vérifiez le sujet ou le format JSON.")
+                streamlit.rerun()
+                
+            streamlit.rerun(scope="fragment")
+
+    elif current_state == 'waiting_question':
+        render_waiting_interface(agent, quiz_manager)
+
+    elif current_state == 'questioning':
+        render_questioning_interface(agent, quiz_manager)
+
+    elif current_state == 'final_review':
+        render_final_review_interface(agent, quiz_manager)
+
+    elif current_state == 'finished':
+        render_finished_interface(quiz_manager)
+
+def render_admin_panel():
+    """Panneau d'administration : mesures récentes des appels au LLM et des traitements de documents."""
+    
+    records = telemetry.recent()
+    
+    with streamlit.expander("📊 Instrumentation (admin)", expanded=False):
+        if not records:
+            streamlit.caption("Aucune mesure pour l'instant.")
+            return
         
-        if 'img_uploader' in streamlit.session_state:
-            del streamlit.session_state['img_uploader']
-            
-        streamlit.rerun()
+        summary = {}
+        for record in records:
+            key = (record['kind'], record['operation'], record.get('model') or "")
+            entry = summary.setdefault(key, {"latencies": [], "errors": 0, "tokens": 0})
+            if record.get('latency_s') is not None:
+                entry["latencies"].append(record['latency_s'])
+            if record.get('error'):
+                entry["errors"] += 1
+            entry["tokens"] += (record.get('prompt_tokens') or 0) + (record.get('completion_tokens') or 0)
+        
+        rows = []
+        for (kind, operation, model), entry in sorted(summary.items()):
+            latencies = sorted(entry["latencies"])
+            rows.append({
+                "type": kind,
+                "opération": operation,
+                "modèle": model,
+                "appels": len(latencies),
+                "latence p50 (s)": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "latence max (s)": round(latencies[-1], 3) if latencies else None,
+                "erreurs": entry["errors"],
+                "tokens": entry["tokens"],
+            })
+        streamlit.dataframe(rows, hide_index=True)
+        
+        grader_stats = local_grader.stats()
+        streamlit.caption(
+            f"File d'attente : {request_scheduler.queue_lengths() or 'vide'} — "
+            f"appels évités par la correction locale : {grader_stats['llm_calls_avoided']}"
+        )
+        streamlit.dataframe(records[-20:][::-1], hide_index=True)
 
 def run_app():
     """Point d'entrée principal de l'application Streamlit."""
     
     streamlit.set_page_config(page_title="Splinter - Tuteur IA", page_icon="🐭", layout="wide")
     initialize_session()
+    start_metrics_server()
     
-    agent = streamlit.session_state.conversation_agent
-    quiz_manager = streamlit.session_state.quiz_manager
-    current_state = quiz_manager.read_state()
+    tutor = streamlit.session_state.tutor
     
     with streamlit.sidebar:
         streamlit.title("📚 Outils d'Entraînement")
@@ -244,31 +391,33 @@ def run_app():
             accept_multiple_files=True,
         )
         
-        if uploaded_pdf_list:
-            
-            uploaded_pdf_list = uploaded_pdf_list[:5]
-            
-            streamlit.session_state.course_text_content = ""
-            
-            with streamlit.spinner(f"Analyse de {len(uploaded_pdf_list)} documents..."):
-                
-                all_text_with_names = []
-                total_chars = 0
-                
-                for pdf_file in uploaded_pdf_list:
-                    text = DocumentProcessor.extract_text_from_pdf(pdf_file)
-                    
-                    separator_and_text = f"\n--- Fichier : {pdf_file.name} ---\n{text}"
-                    all_text_with_names.append(separator_and_text)
-                    total_chars += len(text)
-                
-                streamlit.session_state.course_text_content = "\n".join(all_text_with_names)
-                
-                streamlit.success(f"{len(uploaded_pdf_list)} PDF(s) chargés en mémoire !")
-                streamlit.caption(f"Total : {total_chars} caractères.")
+        uploaded_pdf_list = (uploaded_pdf_list or [])[:MAX_COURSE_DOCUMENTS]
+        # Le cours n'est relu que si les fichiers changent ; au premier passage (session reprise
+        # depuis l'URL, uploader vide), le cours déjà enregistré est conservé
+        pdf_signature = [(pdf_file.name, pdf_file.size) for pdf_file in uploaded_pdf_list]
+        previous_signature = streamlit.session_state.get('pdf_signature')
+        if pdf_signature != previous_signature and (uploaded_pdf_list or previous_signature):
+            if uploaded_pdf_list:
+                with streamlit.spinner(f"Analyse de {len(uploaded_pdf_list)} documents..."):
+                    progress_slot = streamlit.empty()
+                    tutor.set_course_documents(
+                        uploaded_pdf_list,
+                        progress_callback=lambda name, done, total: progress_slot.progress(
+                            done / total, text=f"{name} : page {done}/{total}"
+                        )
+                    )
+                    progress_slot.empty()
+            else:
+                tutor.clear_course()
+        streamlit.session_state.pdf_signature = pdf_signature
         
-        elif 'course_text_content' in streamlit.session_state:
-            streamlit.session_state.course_text_content = ""
+        if tutor.course_documents:
+            total_chars = sum(len(document['text']) for document in tutor.course_documents)
+            streamlit.success(f"{len(tutor.course_documents)} PDF(s) chargés en mémoire !")
+            streamlit.caption(f"Total : {total_chars} caractères.")
+            
+            cache_stats = DocumentProcessor.get_extraction_cache_stats()
+            streamlit.caption(f"Cache d'extraction : {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es).")
         
         streamlit.divider()
 
@@ -279,84 +428,37 @@ def run_app():
             accept_multiple_files=True,
         )
         
-        streamlit.session_state.image_base64_url = []
+        # Seules les références des images restent dans la session (voir blob_store.py)
+        streamlit.session_state.image_refs = []
         if uploaded_image_list:
             
-            if len(uploaded_image_list) > 5:
-                streamlit.warning("Seuls les 5 premières images seront traitées.")
-                uploaded_image_list = uploaded_image_list[:5]
+            if len(uploaded_image_list) > MAX_CHAT_IMAGES:
+                streamlit.warning(f"Seules les {MAX_CHAT_IMAGES} premières images seront traitées.")
+                uploaded_image_list = uploaded_image_list[:MAX_CHAT_IMAGES]
                 
             for img_file in uploaded_image_list:
-                base64_url = DocumentProcessor.convert_image_to_base64(img_file)
-                if base64_url:
-                    streamlit.session_state.image_base64_url.append(base64_url)
+                prepared_image = DocumentProcessor.prepare_image(img_file)
+                if prepared_image:
+                    streamlit.session_state.image_refs.append(prepared_image['ref'])
                     streamlit.image(img_file, width=150) # Affichage de l'aperçu dans la sidebar
             
-            if streamlit.session_state.image_base64_url:
-                streamlit.success(f"{len(streamlit.session_state.image_base64_url)} image(s) prête(s) !")
+            if streamlit.session_state.image_refs:
+                streamlit.success(f"{len(streamlit.session_state.image_refs)} image(s) prête(s) !")
+        
+        if TELEMETRY_ADMIN_PANEL:
+            streamlit.divider()
+            render_admin_panel()
 
     
     streamlit.title("🐭 Maître Splinter - Tuteur IA")
     
-    if current_state in ['start', 'questioning', 'final_review', 'finished']:
-        tab_chat, tab_quiz = streamlit.tabs(["💬 Discussion & Vision", "📝 Quiz Dynamique"])
-    else:
-        tab_chat, tab_quiz = streamlit.tabs(["💬 Discussion & Vision", "📝 Quiz Dynamique"])
-        
+    tab_chat, tab_quiz = streamlit.tabs(["💬 Discussion & Vision", "📝 Quiz Dynamique"])
     
     with tab_chat:
-        streamlit.header("Discours & Sagesse du Maître")
-        
-        streamlit.session_state.selected_model = streamlit.selectbox(
-            "Modèle de Conversation", 
-            options=LLM_MODELS,
-            index=2,
-            key='llm_select_chat'
-        )
-        
-        render_chat_history(agent)
-        
-        if current_state == 'start':
-            render_chat_input(agent)
-        elif current_state != 'start':
-            streamlit.warning("Veuillez compléter ou annuler le quiz avant de commencer une nouvelle discussion.")
-
+        render_chat_panel(tutor)
 
     with tab_quiz:
-        
-        if current_state == 'start':
-            render_start_interface(agent, quiz_manager)
-
-        elif current_state == 'generating':
-            with streamlit.spinner("Création du questionnaire par le Maître..."):
-                model_id = streamlit.session_state.selected_model
-                topic_input = streamlit.session_state.get('topic', 'sujet libre')
-                num_questions = streamlit.session_state.get('num_questions', 3)
-                context_text = streamlit.session_state.course_text_content
-                difficulty = streamlit.session_state.get('difficulty', 'Moyen')
-                success = streamlit.session_state.conversation_agent.generate_quiz(
-                    topic=topic_input, 
-                    n_questions=num_questions, 
-                    model=model_id,
-                    context_instruction=context_text,
-                    difficulty=difficulty
-                )
-                
-                if not success:
-                    streamlit.error("❌ Échec de la génération du quiz. Vérifiez le sujet ou le format JSON.")
-                    quiz_manager.set_state('start')
-                    
-                streamlit.rerun()
-
-        elif current_state == 'questioning':
-            render_questioning_interface(agent, quiz_manager)
-
-        elif current_state == 'final_review':
-            render_final_review_interface(agent, quiz_manager)
-
-        elif current_state == 'finished':
-            render_finished_interface(quiz_manager)
-
+        render_quiz_panel(tutor)
 
 if __name__ == "__main__":
     run_app()
\ No newline at end of file
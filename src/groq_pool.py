@@ -0,0 +1,279 @@
+import os
+import time
+import random
+import threading
+import email.utils
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
+from groq import Groq, APIConnectionError
+from resources.config import (
+    GROQ_TIMEOUT_S,
+    GROQ_MAX_RETRIES,
+    GROQ_BACKOFF_BASE_S,
+    GROQ_BACKOFF_MAX_S,
+    GROQ_MAX_RETRY_AFTER_S,
+    GROQ_HEDGE_DELAY_S,
+    GROQ_HEDGE_PERCENTILE,
+    GROQ_HEDGE_MIN_SAMPLES,
+    GROQ_HEDGE_WINDOW,
+    GROQ_MAX_CONNECTIONS,
+    GROQ_MAX_KEEPALIVE_CONNECTIONS,
+    SCHEDULER_ENABLED,
+    SCHEDULER_MAX_QUEUE_WAIT_S,
+    SCHEDULER_DEFAULT_COMPLETION_TOKENS,
+    PREFLIGHT_ENABLED,
+)
+from scheduler import request_scheduler
+from telemetry import telemetry, InstrumentedStream
+from token_budget import token_estimator, prompt_budgeter, PromptTooLargeError
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="groq-hedge")
+
+
+def status_code_of(error: Exception) -> int | None:
+    return getattr(error, "status_code", None)
+
+
+def retry_after_of(error: Exception) -> float | None:
+    """Délai demandé par le serveur (en-têtes retry-after-ms ou retry-after), en secondes."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            retry_date = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, retry_date.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIConnectionError):  # Inclut les dépassements de délai
+        return True
+    return status_code_of(error) in RETRYABLE_STATUS_CODES
+
+
+class ResilientCompletions:
+    """Même interface que client.chat.completions, avec délais, reprises et requêtes doublées (hedging)."""
+
+    def __init__(
+            self,
+            raw_client,
+            timeout: float = GROQ_TIMEOUT_S,
+            max_retries: int = GROQ_MAX_RETRIES,
+            backoff_base: float = GROQ_BACKOFF_BASE_S,
+            backoff_max: float = GROQ_BACKOFF_MAX_S,
+            hedge_delay: float = GROQ_HEDGE_DELAY_S,
+            hedge_percentile: float = GROQ_HEDGE_PERCENTILE,
+            hedge_min_samples: int = GROQ_HEDGE_MIN_SAMPLES,
+            scheduler=request_scheduler if SCHEDULER_ENABLED else None,
+            budgeter=prompt_budgeter if PREFLIGHT_ENABLED else None,
+            sleep=time.sleep
+        ):
+        self.raw_client = raw_client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.scheduler = scheduler
+        self.budgeter = budgeter
+        self.sleep = sleep
+        self._latencies: dict[str, deque] = {}
+        self._latencies_lock = threading.Lock()
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_of(error)
+        if retry_after is not None:
+            return min(retry_after, GROQ_MAX_RETRY_AFTER_S)
+        # "Full jitter" : évite que toutes les sessions reviennent au même instant
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def record_latency(self, model: str, latency_s: float):
+        with self._latencies_lock:
+            self._latencies.setdefault(model, deque(maxlen=GROQ_HEDGE_WINDOW)).append(latency_s)
+
+    def hedge_delay_for(self, model: str) -> float:
+        """Quantile hedge_percentile des délais récents du modèle ; hedge_delay tant qu'ils sont trop peu nombreux."""
+        with self._latencies_lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.hedge_min_samples:
+            return self.hedge_delay
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile))]
+
+    def send(self, priority: str, session_id, operation: str, attempt: int = 0, reserve_tokens: int | None = None, **kwargs):
+        """Un envoi unique, après passage par l'ordonnanceur (chaque reprise refait la queue)."""
+        model = kwargs.get("model")
+        prompt_tokens = token_estimator.messages_tokens(kwargs.get("messages"), model)
+        measurement = telemetry.start(
+            "llm", operation, model=model, priority=priority, session_id=session_id, attempt=attempt,
+            estimated_prompt_tokens=prompt_tokens
+        )
+        estimated_tokens = prompt_tokens + (reserve_tokens or kwargs.get("max_tokens") or SCHEDULER_DEFAULT_COMPLETION_TOKENS)
+        try:
+            queue_s = 0.0
+            if self.scheduler is not None:
+                queue_s = self.scheduler.acquire(model, estimated_tokens, priority=priority, session_id=session_id, timeout=SCHEDULER_MAX_QUEUE_WAIT_S)
+            measurement.set(queue_s=queue_s)
+            sent_at = time.monotonic()
+            response = self.raw_client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if self.scheduler is not None and status_code_of(e) == 429:
+                self.scheduler.penalize(model, min(retry_after_of(e) or self.backoff_base, GROQ_MAX_RETRY_AFTER_S))
+            measurement.finish(error=e)
+            raise
+
+        if kwargs.get("stream"):
+            return InstrumentedStream(response, measurement)
+
+        # Délai du serveur seul, sans l'attente dans la file : sert au déclenchement des requêtes doublées
+        self.record_latency(model, time.monotonic() - sent_at)
+        usage = getattr(response, "usage", None)
+        measurement.first_token()
+        measurement.set_usage(usage)
+        measurement.finish()
+        token_estimator.observe(model, kwargs.get("messages"), getattr(usage, "prompt_tokens", None))
+        if self.scheduler is not None and getattr(usage, "total_tokens", None):
+            self.scheduler.adjust_tokens(model, usage.total_tokens - estimated_tokens)
+        return response
+
+    def create_with_retry(self, priority: str = "interactive", session_id=None, operation: str = "chat", **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.send(priority, session_id, operation, attempt, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.sleep(self.backoff_delay(attempt, e))
+
+    def can_hedge(self, model: str, messages, reserve_tokens: int | None) -> bool:
+        """La copie ne doit pas prendre le budget d'une autre requête : elle ne part que si l'ordonnanceur a de la marge."""
+        if self.scheduler is None:
+            return True
+        estimated_tokens = token_estimator.messages_tokens(messages, model) + (reserve_tokens or SCHEDULER_DEFAULT_COMPLETION_TOKENS)
+        return self.scheduler.has_spare_capacity(model, estimated_tokens)
+
+    def create_hedged(self, **kwargs):
+        """Lance une seconde requête identique si la première tarde plus que d'habitude (voir hedge_delay_for) ; garde la plus rapide."""
+        model = kwargs.get("model")
+        pending = {_hedge_executor.submit(self.create_with_retry, **kwargs)}
+        done, pending = wait(pending, timeout=self.hedge_delay_for(model))
+        if not done and self.can_hedge(model, kwargs.get("messages"), kwargs.get("reserve_tokens") or kwargs.get("max_tokens")):
+            pending.add(_hedge_executor.submit(self.create_with_retry, **kwargs))
+
+        last_error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+            if not pending:
+                raise last_error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def create(
+            self,
+            hedge: bool = False,
+            timeout: float | None = None,
+            priority: str = "interactive",
+            session_id=None,
+            operation: str = "chat",
+            reserve_tokens: int | None = None,
+            trim: bool = False,
+            **kwargs
+        ):
+        """priority (clé de SCHEDULER_PRIORITIES) et session_id servent à l'ordonnanceur, operation à l'instrumentation,
+        reserve_tokens (place gardée pour la réponse, max_tokens par défaut) et trim au budget vérifié avant l'envoi.
+
+        Aucun de ces paramètres n'est transmis à l'API. Une requête qui ne tient pas dans le budget du
+        modèle est refusée (PromptTooLargeError) sans appel réseau ; avec trim=True (texte libre
+        seulement : conversation, historique), elle est d'abord raccourcie.
+        """
+        if reserve_tokens is None:
+            reserve_tokens = kwargs.get("max_tokens")
+        if self.budgeter is not None and kwargs.get("messages"):
+            try:
+                kwargs["messages"], prompt_tokens, trimmed_tokens = self.budgeter.preflight(
+                    kwargs["messages"], kwargs.get("model"), reserve_tokens, trim
+                )
+                if trimmed_tokens:
+                    telemetry.record_prompt_trim(
+                        operation, trimmed_tokens, model=kwargs.get("model"), session_id=session_id,
+                        estimated_prompt_tokens=prompt_tokens
+                    )
+            except PromptTooLargeError as e:
+                telemetry.start(
+                    "llm", operation, model=kwargs.get("model"), priority=priority, session_id=session_id, attempt=0
+                ).finish(error=e)
+                raise
+        kwargs["timeout"] = timeout if timeout is not None else self.timeout
+        kwargs["priority"] = priority
+        kwargs["session_id"] = session_id
+        kwargs["operation"] = operation
+        kwargs["reserve_tokens"] = reserve_tokens
+        # Un flux ne peut pas être doublé : seule l'ouverture de la connexion est reprise en cas d'échec
+        if hedge and not kwargs.get("stream"):
+            return self.create_hedged(**kwargs)
+        return self.create_with_retry(**kwargs)
+
+
+class ResilientChat:
+    def __init__(self, completions: ResilientCompletions):
+        self.completions = completions
+
+
+class ResilientClient:
+    """Enveloppe d'un client Groq : client.chat.completions.create(...) reste utilisable tel quel."""
+
+    def __init__(self, raw_client, **completion_options):
+        self.raw_client = raw_client
+        self.chat = ResilientChat(ResilientCompletions(raw_client, **completion_options))
+
+
+_shared_clients: dict[tuple, ResilientClient] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_client(api_key: str, base_url: str | None = None) -> ResilientClient:
+    """Client partagé par toutes les sessions du processus, pour réutiliser les connexions keep-alive.
+
+    GROQ_BASE_URL permet de pointer vers un faux serveur local pour les tests.
+    """
+    base_url = base_url or os.environ.get("GROQ_BASE_URL")
+    key = (api_key, base_url)
+    with _shared_clients_lock:
+        if key not in _shared_clients:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=GROQ_MAX_CONNECTIONS,
+                    max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=GROQ_TIMEOUT_S
+            )
+            raw_client = Groq(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,  # Les reprises sont gérées par ResilientCompletions
+                http_client=http_client
+            )
+            _shared_clients[key] = ResilientClient(raw_client)
+        return _shared_clients[key]
@@ -0,0 +1,116 @@
+from resources.config import (
+    HISTORY_TOKEN_BUDGETS,
+    HISTORY_DEFAULT_TOKEN_BUDGET,
+    HISTORY_MIN_RECENT_MESSAGES,
+    HISTORY_REFILL_RATIO,
+    HISTORY_SUMMARY_MAX_TOKENS,
+)
+from token_budget import token_estimator
+
+SUMMARY_PREFIX = "[RÉSUMÉ DE LA CONVERSATION PRÉCÉDENTE] "
+
+
+def estimate_message_tokens(message: dict, model: str | None = None) -> int:
+    return token_estimator.message_tokens(message, model)
+
+
+class HistoryWindow:
+    """Fenêtre de l'historique envoyé à l'API, bornée par un budget de tokens propre à chaque modèle.
+
+    Le prompt système et les tours récents sont gardés tels quels ; les tours plus anciens
+    sont repliés dans un résumé glissant, recalculé uniquement quand la coupure avance.
+    """
+
+    def __init__(self, summarize, budgets: dict = HISTORY_TOKEN_BUDGETS, default_budget: int = HISTORY_DEFAULT_TOKEN_BUDGET):
+        # summarize(resume_precedent, messages_a_replier) -> nouveau résumé
+        self.summarize = summarize
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.summary = ""
+        self.folded_until = 1  # Index du premier message non replié (0 est le prompt système)
+
+    def budget_for(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+
+    def _summary_message(self) -> dict | None:
+        if not self.summary:
+            return None
+        return {"role": "system", "content": SUMMARY_PREFIX + self.summary}
+
+    def _window_tokens(self, messages: list, cut: int, model: str) -> int:
+        tokens = estimate_message_tokens(messages[0], model) + sum(estimate_message_tokens(m, model) for m in messages[cut:])
+        if self.summary:
+            tokens += HISTORY_SUMMARY_MAX_TOKENS
+        return tokens
+
+    def _choose_cut(self, messages: list, target_tokens: int, model: str) -> int:
+        available = target_tokens - estimate_message_tokens(messages[0], model) - HISTORY_SUMMARY_MAX_TOKENS
+        cut = len(messages)
+        used = 0
+        while cut > self.folded_until:
+            message_tokens = estimate_message_tokens(messages[cut - 1], model)
+            kept = len(messages) - cut
+            if kept >= HISTORY_MIN_RECENT_MESSAGES and used + message_tokens > available:
+                break
+            used += message_tokens
+            cut -= 1
+
+        # La fenêtre commence toujours par une question de l'élève
+        while cut < len(messages) - 1 and messages[cut].get("role") != "user":
+            cut += 1
+        return max(cut, self.folded_until)
+
+    def apply(self, messages: list, model: str) -> list:
+        """Retourne les messages à envoyer : système, résumé éventuel, puis tours récents."""
+        if self.folded_until > len(messages):
+            # L'historique a été réinitialisé depuis le dernier appel
+            self.summary = ""
+            self.folded_until = 1
+
+        budget = self.budget_for(model)
+        if self._window_tokens(messages, self.folded_until, model) > budget:
+            # On replie plus que le strict nécessaire pour ne pas recalculer le résumé à chaque tour
+            cut = self._choose_cut(messages, int(budget * HISTORY_REFILL_RATIO), model)
+            if cut > self.folded_until:
+                self.summary = self.summarize(self.summary, messages[self.folded_until:cut])
+                self.folded_until = cut
+
+        window = [messages[0]]
+        summary_message = self._summary_message()
+        if summary_message:
+            window.append(summary_message)
+        window.extend(messages[self.folded_until:])
+        return window
+
+
+class MessagesOverlay:
+    """Vue d'une séquence de messages dont quelques-uns sont remplacés, sans copier la séquence.
+
+    Suffit à HistoryWindow.apply (index, tranches, len) : seuls les messages de la fenêtre
+    sont lus, ce qui évite de charger tout un historique stocké hors mémoire.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.overrides: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def _position(self, index: int) -> int:
+        return index + len(self.messages) if index < 0 else index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self.messages)))]
+        position = self._position(index)
+        if position in self.overrides:
+            return self.overrides[position]
+        return self.messages[position]
+
+    def __setitem__(self, index: int, message: dict):
+        self.overrides[self._position(index)] = message
+
+    def __iter__(self):
+        for position in range(len(self.messages)):
+            yield self[position]
@@ -0,0 +1,130 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from blob_store import get_blob_store, BlobStore
+from resources.config import (
+    IMAGE_MAX_EDGE,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MIN_JPEG_QUALITY,
+    IMAGE_MAX_BYTES,
+    IMAGE_CACHE_MAX_ENTRIES,
+)
+
+
+class ImagePipeline:
+    """Décode, redimensionne et réencode une image une seule fois, puis range le résultat dans le BlobStore.
+
+    La clé du cache est l'empreinte du contenu du fichier : l'aperçu de la sidebar, l'appel
+    au modèle de vision et l'historique réutilisent la même image encodée, via sa référence.
+    """
+
+    def __init__(
+            self,
+            max_edge: int = IMAGE_MAX_EDGE,
+            quality: int = IMAGE_JPEG_QUALITY,
+            min_quality: int = IMAGE_MIN_JPEG_QUALITY,
+            max_bytes: int = IMAGE_MAX_BYTES,
+            cache_max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+            blobs: BlobStore | None = None
+        ):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.min_quality = min_quality
+        self.max_bytes = max_bytes
+        self.cache_max_entries = cache_max_entries
+        self._blobs = blobs
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def blobs(self) -> BlobStore:
+        return self._blobs if self._blobs is not None else get_blob_store()
+
+    def process(self, image_file) -> dict:
+        """Retourne {'hash', 'mime', 'ref'} pour un fichier image uploadé ('ref' : référence dans le BlobStore)."""
+        image_file.seek(0)
+        data = image_file.read()
+        image_file.seek(0)
+        return self.process_bytes(data, getattr(image_file, "type", None))
+
+    def process_bytes(self, data: bytes, mime: str | None = None) -> dict:
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+        # L'image encodée peut avoir disparu du disque entre-temps : on la réencode alors
+        if cached is not None and self.blobs.get(cached["ref"]) is not None:
+            with self._lock:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        encoded_bytes, encoded_mime = self._encode(data, mime)
+        result = {
+            "hash": key,
+            "mime": encoded_mime,
+            "ref": self.blobs.put(encoded_bytes, encoded_mime),
+        }
+        self._store(key, result)
+        return result
+
+    def _encode(self, data: bytes, mime: str | None) -> tuple[bytes, str]:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+
+        # Une image déjà petite est envoyée telle quelle, sans perte de recompression
+        if len(data) <= self.max_bytes and max(image.size) <= self.max_edge and mime:
+            return data, mime
+
+        if max(image.size) > self.max_edge:
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+
+        if self._has_transparency(image):
+            return self._encode_png(image), "image/png"
+        return self._encode_jpeg(image.convert("RGB")), "image/jpeg"
+
+    @staticmethod
+    def _has_transparency(image: Image.Image) -> bool:
+        return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+    def _encode_png(self, image: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    def _encode_jpeg(self, image: Image.Image) -> bytes:
+        quality = self.quality
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True)
+            encoded = buffer.getvalue()
+            if len(encoded) <= self.max_bytes:
+                return encoded
+            if quality > self.min_quality:
+                quality = max(self.min_quality, quality - 10)
+            elif min(image.size) > 64:
+                # Qualité plancher atteinte : on réduit encore la définition
+                image = image.resize((int(image.width * 0.75), int(image.height * 0.75)), Image.LANCZOS)
+            else:
+                return encoded
+
+    def _store(self, key: str, result: dict):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)} | {
+                f"blob_{name}": value for name, value in self.blobs.stats().items()
+            }
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,58 @@
+import json
+
+
+class JsonArrayStreamParser:
+    """Extrait les objets d'un tableau JSON reçu par morceaux, dès que chacun est complet.
+
+    Tout ce qui précède le premier '[' (balise ```json, texte parasite) est ignoré.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.finished = False
+
+    def feed(self, text: str) -> list:
+        completed = []
+        for char in text:
+            if self.finished:
+                break
+
+            if not self._in_array:
+                if char == '[':
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # Entre deux éléments du tableau : seuls '{' et ']' nous intéressent
+                if char == '{':
+                    self._depth = 1
+                    self._buffer = [char]
+                elif char == ']':
+                    self.finished = True
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(json.loads("".join(self._buffer)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._buffer = []
+        return completed
@@ -0,0 +1,90 @@
+import threading
+from retrieval import FRENCH_STOP_WORDS
+from text_similarity import normalize_text, ngram_similarity
+from resources.config import LOCAL_GRADER_ACCEPT_THRESHOLD, LOCAL_GRADER_REJECT_THRESHOLD
+
+NO_ANSWER_PATTERNS = frozenset({
+    "", "je sais pas", "sais pas", "aucune idee", "pas idee", "idk", "rien", "non", "passe",
+})
+
+# Mots vides qui inversent le sens d'une réponse : gardés pour la correction
+NEGATION_WORDS = frozenset({"ne", "n", "pas", "sans", "aucun", "aucune", "jamais", "ni", "non", "rien", "plus"})
+GRADING_STOP_WORDS = FRENCH_STOP_WORDS - NEGATION_WORDS
+
+
+def normalize_answer(text: str) -> str:
+    """Comme normalize_text, mais sans retirer les négations ("ne ... pas", "sans"...)."""
+    words = normalize_text(text, remove_stop_words=False).split()
+    return " ".join(word for word in words if word not in GRADING_STOP_WORDS)
+
+
+def negations(text: str) -> set[str]:
+    return set(normalize_text(text, remove_stop_words=False).split()) & NEGATION_WORDS
+
+
+class LocalGrader:
+    """Correction locale des questions ouvertes, avant tout recours au LLM.
+
+    Les réponses quasi identiques à la réponse attendue (ou clairement hors sujet)
+    sont tranchées ici ; seules les réponses ambiguës partent vers le LLM.
+    """
+
+    def __init__(self, accept_threshold: float = LOCAL_GRADER_ACCEPT_THRESHOLD, reject_threshold: float = LOCAL_GRADER_REJECT_THRESHOLD):
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+        self.accepted = 0
+        self.rejected = 0
+        self.deferred = 0
+        self._lock = threading.Lock()
+
+    @property
+    def llm_calls_avoided(self) -> int:
+        return self.accepted + self.rejected
+
+    def similarity(self, expected_answer: str, user_answer: str) -> float:
+        return ngram_similarity(normalize_answer(expected_answer), normalize_answer(user_answer))
+
+    def grade(self, question_data: dict, user_answer: str) -> dict | None:
+        """Retourne une correction {'score', 'feedback'} si la décision est sûre, None sinon."""
+        correct_identifier = question_data['correct_identifier']
+        explanation = question_data.get('explanation', '')
+
+        normalized_answer = normalize_text(user_answer, remove_stop_words=False)
+        normalized_expected = normalize_text(correct_identifier, remove_stop_words=False)
+        if normalized_answer == normalized_expected:
+            # Couvre les réponses attendues courtes comme "non" ou "rien"
+            similarity = 1.0
+        elif normalized_answer in NO_ANSWER_PATTERNS:
+            similarity = 0.0
+        else:
+            similarity = self.similarity(correct_identifier, user_answer)
+
+        # Une négation en plus ou en moins peut inverser le sens malgré des mots presque identiques : le LLM tranche
+        same_polarity = negations(correct_identifier) == negations(user_answer)
+        if similarity >= self.accept_threshold and same_polarity:
+            with self._lock:
+                self.accepted += 1
+            feedback = f"✅ **Correct !**\n\nVotre réponse correspond à la réponse attendue : **{correct_identifier}**.\n\n💡 *{explanation}*"
+            return {"score": 1, "feedback": feedback, "graded_locally": True}
+
+        if similarity <= self.reject_threshold:
+            with self._lock:
+                self.rejected += 1
+            feedback = f"❌ **Incorrect.**\n\nLa bonne réponse est : **{correct_identifier}**.\n\n💡 **Explication :** {explanation}"
+            return {"score": 0, "feedback": feedback, "graded_locally": True}
+
+        with self._lock:
+            self.deferred += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "deferred": self.deferred,
+                "llm_calls_avoided": self.accepted + self.rejected,
+            }
+
+
+local_grader = LocalGrader()
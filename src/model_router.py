@@ -0,0 +1,147 @@
+import time
+import random
+import threading
+import statistics
+from collections import deque
+from telemetry import telemetry
+from token_budget import prompt_budgeter
+from resources.config import (
+    LLM_MODELS,
+    MODEL_ROUTING_POLICY,
+    ROUTER_COMPLETION_RESERVE_TOKENS,
+    ROUTER_STATS_WINDOW,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_LATENCY_TOLERANCE,
+    ROUTER_STATS_MAX_AGE_S,
+    ROUTER_EXPLORATION_RATE,
+)
+
+# Opérations instrumentées (voir ConversationAgent) regroupées par type de tâche
+OPERATION_TASKS = {
+    "ask_llm": "chat",
+    "stream_llm": "chat",
+    "generate_quiz": "quiz_generation",
+    "request_quiz_questions": "quiz_generation",
+    "stream_quiz": "quiz_generation",
+    "get_correction": "grading",
+    "request_batch_corrections": "grading",
+}
+
+
+class ModelStats:
+    """Sink de télémétrie : délai de réponse par (modèle, tâche) et taux d'erreur par modèle, sur les appels récents."""
+
+    def __init__(self, window: int = ROUTER_STATS_WINDOW, max_age: float = ROUTER_STATS_MAX_AGE_S, clock=time.monotonic):
+        self.window = window
+        self.max_age = max_age
+        self.clock = clock
+        self._latencies: dict[tuple, deque] = {}
+        self._outcomes: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        if record.get("kind") != "llm" or not record.get("model"):
+            return
+        now = self.clock()
+        model = record["model"]
+        with self._lock:
+            self._outcomes.setdefault(model, deque(maxlen=self.window)).append((now, bool(record.get("error"))))
+            task = OPERATION_TASKS.get(record.get("operation"))
+            if task and not record.get("error") and record.get("ttft_s") is not None:
+                # Délai du serveur seul : l'attente dans la file de l'ordonnanceur n'est pas imputable au modèle
+                server_delay = record["ttft_s"] - (record.get("queue_s") or 0)
+                self._latencies.setdefault((model, task), deque(maxlen=self.window)).append((now, server_delay))
+
+    def _recent(self, samples) -> list:
+        oldest = self.clock() - self.max_age
+        return [value for timestamp, value in samples or () if timestamp >= oldest]
+
+    def median_latency(self, model: str, task: str) -> float | None:
+        with self._lock:
+            values = self._recent(self._latencies.get((model, task)))
+        return statistics.median(values) if len(values) >= ROUTER_MIN_SAMPLES else None
+
+    def error_rate(self, model: str) -> float | None:
+        with self._lock:
+            values = self._recent(self._outcomes.get(model))
+        return sum(values) / len(values) if len(values) >= ROUTER_MIN_SAMPLES else None
+
+
+class ModelRouter:
+    """Choisit un modèle de LLM_MODELS pour une tâche, selon MODEL_ROUTING_POLICY.
+
+    1. Un message court, sans contexte de cours ni longue conversation, part vers le modèle léger.
+    2. Les candidats dont le budget par requête est trop petit (fenêtre de contexte ou tokens par minute,
+       comme au contrôle avant envoi), ou qui échouent souvent, sont écartés.
+    3. Le candidat préféré est gardé, sauf si un suivant répond nettement plus vite en ce moment.
+    4. Une petite part des appels (exploration_rate) part vers un autre candidat, en priorité un modèle
+       sans mesures récentes : sans cela, seuls les délais du modèle préféré seraient connus.
+    """
+
+    def __init__(
+            self,
+            policy: dict = MODEL_ROUTING_POLICY,
+            stats: ModelStats | None = None,
+            available_models=LLM_MODELS,
+            budgeter=prompt_budgeter,
+            exploration_rate: float = ROUTER_EXPLORATION_RATE,
+            rng: random.Random | None = None
+        ):
+        self.policy = policy
+        self.stats = stats if stats is not None else ModelStats()
+        self.available_models = available_models
+        self.budgeter = budgeter
+        self.exploration_rate = exploration_rate
+        self.random = rng or random.Random()
+
+    def prompt_limit(self, model: str) -> int:
+        return self.budgeter.prompt_limit(model, ROUTER_COMPLETION_RESERVE_TOKENS)
+
+    def route(self, task: str, prompt_tokens: int, history_tokens: int = 0) -> str:
+        model, reason = self.choose(task, prompt_tokens, history_tokens)
+        telemetry.emit({"timestamp": time.time(), "kind": "router", "operation": task, "model": model, "reason": reason, "prompt_tokens": prompt_tokens})
+        return model
+
+    def choose(self, task: str, prompt_tokens: int, history_tokens: int = 0) -> tuple[str, str]:
+        """Retourne (modèle, raison du choix)."""
+        policy = self.policy[task]
+        light_model = policy.get("light_model")
+        if (
+            light_model in self.available_models
+            and prompt_tokens <= policy.get("light_max_prompt_tokens", 0)
+            and history_tokens <= policy.get("light_max_history_tokens", 0)
+            and self.is_healthy(light_model)
+        ):
+            return light_model, "message court"
+
+        required_tokens = prompt_tokens + history_tokens
+        candidates = [model for model in policy["candidates"] if model in self.available_models]
+        fitting = [model for model in candidates if self.prompt_limit(model) >= required_tokens]
+        if not fitting:
+            return max(candidates, key=self.prompt_limit), "plus grand budget par requête"
+
+        healthy = [model for model in fitting if self.is_healthy(model)] or fitting
+        chosen = healthy[0]
+        chosen_latency = self.stats.median_latency(chosen, task)
+        reason = "préféré"
+        for model in healthy[1:]:
+            latency = self.stats.median_latency(model, task)
+            if chosen_latency is not None and latency is not None and latency * ROUTER_LATENCY_TOLERANCE < chosen_latency:
+                chosen, chosen_latency, reason = model, latency, "plus rapide"
+        if healthy[0] != fitting[0] and reason == "préféré":
+            reason = "erreurs récentes sur les modèles préférés"
+
+        others = [model for model in healthy if model != chosen]
+        if others and self.random.random() < self.exploration_rate:
+            unmeasured = [model for model in others if self.stats.median_latency(model, task) is None]
+            return self.random.choice(unmeasured or others), "exploration"
+        return chosen, reason
+
+    def is_healthy(self, model: str) -> bool:
+        error_rate = self.stats.error_rate(model)
+        return error_rate is None or error_rate <= ROUTER_MAX_ERROR_RATE
+
+
+model_router = ModelRouter()
+telemetry.add_sink(model_router.stats)
@@ -0,0 +1,10 @@
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def data_path(path: str | None) -> str | None:
+    """Chemin de resources/config.py : un chemin relatif part de la racine du projet, pas du répertoire courant."""
+    if not path or path == ":memory:" or os.path.isabs(path):
+        return path
+    return os.path.join(PROJECT_ROOT, path)
@@ -0,0 +1,177 @@
+import os
+import time
+import hashlib
+import string
+import threading
+from resources.config import PROMPT_RELOAD_CHECK_INTERVAL_S
+
+RESOURCES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'resources'))
+TEACHER_CONTEXT_PATH = os.path.join(RESOURCES_DIR, 'teacher_context.txt')
+QUIZ_CONTEXT_PATH = os.path.join(RESOURCES_DIR, 'quiz_context.txt')
+
+QUIZ_GENERATION_TEMPLATE = """
+            Tu es un professeur expert. Sujet : "{topic}". Niveau : {difficulty}.
+            Objectif : Générer EXACTEMENT {n_questions} questions.
+            {context_instruction}
+
+            INSTRUCTIONS :
+            Génère {n_questions} questions variées ('open' et 'qcm').
+            Si le texte est court, interroge sur des détails précis.
+
+            Réponds UNIQUEMENT avec un tableau JSON valide (liste d'objets) respectant le schéma imposé dans le prompt système.
+
+            Exemple de format JSON STRICTEMENT requis pour la clé "questions" du tableau :
+            [
+                {{
+                    "type": "qcm",
+                    "question": "L'énoncé ?",
+                    "explanation": "Pourquoi c'est juste",
+                    "correct_identifier": "A",
+                    "choices": ["A. Option 1", "B. Option 2", "C. Option 3", "D. Option 4"]
+                }}
+            ]
+            """
+
+OPEN_CORRECTION_TEMPLATE = """
+            TACHE : Corrige cette réponse d'étudiant de manière DIRECTE et CONCISE.
+
+            Question : {question}
+            Réponse attendue : '{correct_identifier}'
+            Réponse de l'étudiant : '{user_answer}'
+            Explication contextuelle : {explanation}
+
+            RÈGLES :
+            1. Si la réponse est juste (sens globalement identique), mets score 1. Sinon 0.
+            2. Ton feedback doit commencer directement par "Correct" ou "Incorrect".
+            3. Donne ensuite la bonne réponse CLAIREMENT sans fioritures.
+            4. Finis par une explication simple.
+
+            FORMAT DE SORTIE OBLIGATOIRE (JSON pur) :
+            {{"score": (int, 0 ou 1), "feedback": (string)}}
+            """
+
+BATCH_CORRECTION_TEMPLATE = """
+            TACHE : Corrige chacune des réponses d'étudiant ci-dessous de manière DIRECTE et CONCISE.
+
+            Réponses à corriger (tableau JSON, champs : id, question, reponse_attendue, reponse_etudiant, explication) :
+            {items_json}
+
+            RÈGLES (pour chaque élément) :
+            1. Si la réponse est juste (sens globalement identique), mets score 1. Sinon 0.
+            2. Ton feedback doit commencer directement par "Correct" ou "Incorrect".
+            3. Donne ensuite la bonne réponse CLAIREMENT sans fioritures.
+            4. Finis par une explication simple.
+
+            FORMAT DE SORTIE OBLIGATOIRE (tableau JSON pur, un objet par élément, avec le même "id") :
+            [{{"id": (int), "score": (int, 0 ou 1), "feedback": (string)}}]
+            """
+
+HISTORY_SUMMARY_TEMPLATE = """
+            Résume en quelques phrases, en français, cette conversation entre un élève et son tuteur.
+            Conserve les notions étudiées, les questions de l'élève et les erreurs corrigées.
+
+            Résumé précédent : {previous_summary}
+
+            Nouveaux échanges :
+            {transcript}
+            """
+
+
+class PromptTemplate:
+    """Gabarit analysé une seule fois : seuls les champs variables sont assemblés à chaque appel."""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.parts = [
+            (literal, field_name)
+            for literal, field_name, _, _ in string.Formatter().parse(template)
+        ]
+        self.field_names = {field_name for _, field_name in self.parts if field_name}
+
+    def render(self, **fields) -> str:
+        missing = self.field_names - fields.keys()
+        if missing:
+            raise KeyError(f"Champs manquants pour le gabarit : {', '.join(sorted(missing))}")
+        return "".join(
+            literal + (str(fields[field_name]) if field_name else "")
+            for literal, field_name in self.parts
+        )
+
+
+class PromptRegistry:
+    """Prompts partagés par toutes les sessions du processus.
+
+    Les fichiers de resources/ sont relus uniquement quand leur date de modification change,
+    vérifiée au plus une fois toutes les check_interval secondes.
+    """
+
+    def __init__(self, check_interval: float = PROMPT_RELOAD_CHECK_INTERVAL_S):
+        self.check_interval = check_interval
+        self._files: dict[str, dict] = {}
+        self._templates: dict[str, PromptTemplate] = {}
+        self._lock = threading.Lock()
+
+    def register_file(self, name: str, path: str, fallback: str | None = None):
+        with self._lock:
+            self._files[name] = {
+                "path": path,
+                "fallback": fallback,
+                "mtime": None,
+                "content": None,
+                "checked_at": 0.0,
+            }
+
+    def register_template(self, name: str, template: str):
+        with self._lock:
+            self._templates[name] = PromptTemplate(template)
+
+    def read(self, name: str) -> str:
+        with self._lock:
+            entry = self._files[name]
+            now = time.monotonic()
+            if entry["content"] is not None and now - entry["checked_at"] < self.check_interval:
+                return entry["content"]
+
+            entry["checked_at"] = now
+            try:
+                mtime = os.stat(entry["path"]).st_mtime_ns
+                if mtime != entry["mtime"]:
+                    with open(entry["path"], "r", encoding="utf-8") as file:
+                        entry["content"] = file.read()
+                    entry["mtime"] = mtime
+            except FileNotFoundError:
+                if entry["fallback"] is None:
+                    raise
+                entry["content"] = entry["fallback"]
+                entry["mtime"] = None
+            return entry["content"]
+
+    def render(self, name: str, **fields) -> str:
+        return self._templates[name].render(**fields)
+
+    def fingerprint(self, *names: str) -> str:
+        """Empreinte courte des prompts cités : elle change dès qu'un fichier ou un gabarit est modifié."""
+        digest = hashlib.sha256()
+        for name in names:
+            if name in self._templates:
+                digest.update(self._templates[name].template.encode("utf-8"))
+            else:
+                digest.update(self.read(name).encode("utf-8"))
+        return digest.hexdigest()[:12]
+
+
+prompt_registry = PromptRegistry()
+prompt_registry.register_file(
+    "teacher_context",
+    TEACHER_CONTEXT_PATH,
+    fallback="Vous êtes un tuteur IA, sage et pédagogue."
+)
+prompt_registry.register_file(
+    "quiz_context",
+    QUIZ_CONTEXT_PATH,
+    fallback="Vous êtes un expert en formatage JSON strict. Répondez UNIQUEMENT avec le tableau JSON demandé."
+)
+prompt_registry.register_template("quiz_generation", QUIZ_GENERATION_TEMPLATE)
+prompt_registry.register_template("open_correction", OPEN_CORRECTION_TEMPLATE)
+prompt_registry.register_template("batch_correction", BATCH_CORRECTION_TEMPLATE)
+prompt_registry.register_template("history_summary", HISTORY_SUMMARY_TEMPLATE)
@@ -0,0 +1,167 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from paths import data_path
+from quiz_agent import QuizAgent
+from retrieval import tokenize
+from text_similarity import normalize_text, ngram_similarity
+from resources.config import (
+    QUESTION_BANK_DB_PATH,
+    QUESTION_BANK_CANDIDATE_FACTOR,
+    QUIZ_DEDUP_SIMILARITY,
+)
+
+
+def document_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class QuestionBank:
+    """Banque persistante des questions générées, pour assembler un quiz sans appel au LLM.
+
+    Chaque question est indexée par les empreintes des documents du cours dont elle est issue,
+    ses mots-clés (sujet et énoncé) et sa difficulté. Une question quasi identique
+    à une question déjà en banque pour le même cours n'est pas ajoutée.
+    """
+
+    def __init__(self, db_path: str = QUESTION_BANK_DB_PATH, similarity: float = QUIZ_DEDUP_SIMILARITY):
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(data_path(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bank_questions ("
+            "id INTEGER PRIMARY KEY, difficulty TEXT, type TEXT, topic TEXT, normalized TEXT, "
+            "question_json TEXT, created_at REAL, served_count INTEGER DEFAULT 0)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS bank_documents (question_id INTEGER, document_hash TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS bank_keywords (question_id INTEGER, keyword TEXT)")
+        # Aucune requête ne filtre sur le type : l'ancien index (difficulty, type) est remplacé
+        self._db.execute("DROP INDEX IF EXISTS bank_questions_filter")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bank_questions_difficulty ON bank_questions (difficulty)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bank_documents_hash ON bank_documents (document_hash, question_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bank_documents_question ON bank_documents (question_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bank_keywords_keyword ON bank_keywords (keyword, question_id)")
+        self._db.commit()
+
+    @staticmethod
+    def _placeholders(values) -> str:
+        return ", ".join("?" for _ in values)
+
+    def _scope(self, document_hashes: list[str], keywords: list[str]) -> tuple[str, list]:
+        """Condition SQL sur q.id : questions du cours (documents tous présents), ou sujet libre de mêmes mots-clés."""
+        if document_hashes:
+            return (
+                f"q.id IN (SELECT question_id FROM bank_documents WHERE document_hash IN ({self._placeholders(document_hashes)})) "
+                f"AND NOT EXISTS (SELECT 1 FROM bank_documents d WHERE d.question_id = q.id "
+                f"AND d.document_hash NOT IN ({self._placeholders(document_hashes)}))",
+                list(document_hashes) * 2
+            )
+        # Sans cours, seul le sujet rapproche les questions : au moins un mot-clé en commun
+        return (
+            f"q.id IN (SELECT question_id FROM bank_keywords WHERE keyword IN ({self._placeholders(keywords) or 'NULL'})) "
+            f"AND NOT EXISTS (SELECT 1 FROM bank_documents d WHERE d.question_id = q.id)",
+            list(keywords)
+        )
+
+    def add(self, questions: list, topic: str, difficulty: str, document_hashes: list[str]) -> int:
+        """Range les questions valides et nouvelles ; retourne le nombre de questions ajoutées."""
+        added = 0
+        with self._lock:
+            for question in questions:
+                if not QuizAgent.is_valid_question(question):
+                    continue
+                normalized = normalize_text(question['question'])
+                keywords = sorted(set(tokenize(f"{topic} {question['question']}")))
+                condition, parameters = self._scope(document_hashes, keywords)
+                known = self._db.execute(
+                    f"SELECT q.normalized FROM bank_questions q WHERE {condition}", parameters
+                ).fetchall()
+                if any(ngram_similarity(normalized, other) >= self.similarity for (other,) in known):
+                    continue
+
+                with self._db:
+                    question_id = self._db.execute(
+                        "INSERT INTO bank_questions (difficulty, type, topic, normalized, question_json, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (difficulty, question['type'], topic, normalized, json.dumps(question, ensure_ascii=False), time.time())
+                    ).lastrowid
+                    self._db.executemany(
+                        "INSERT INTO bank_documents (question_id, document_hash) VALUES (?, ?)",
+                        [(question_id, document) for document in sorted(set(document_hashes))]
+                    )
+                    self._db.executemany(
+                        "INSERT INTO bank_keywords (question_id, keyword) VALUES (?, ?)",
+                        [(question_id, keyword) for keyword in keywords]
+                    )
+                added += 1
+        return added
+
+    def assemble(self, topic: str, n_questions: int, difficulty: str, document_hashes: list[str]) -> list:
+        """Jusqu'à n_questions questions de la banque, les plus proches du sujet et les moins servies d'abord."""
+        keywords = sorted(set(tokenize(topic)))
+        condition, parameters = self._scope(document_hashes, keywords)
+        keyword_filter = self._placeholders(keywords) or "NULL"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT q.id, q.normalized, q.question_json, "
+                f"(SELECT COUNT(*) FROM bank_keywords k WHERE k.question_id = q.id AND k.keyword IN ({keyword_filter})) AS matches "
+                f"FROM bank_questions q WHERE q.difficulty = ? AND {condition} "
+                f"ORDER BY matches DESC, q.served_count ASC, RANDOM() LIMIT ?",
+                keywords + [difficulty] + parameters + [n_questions * QUESTION_BANK_CANDIDATE_FACTOR]
+            ).fetchall()
+
+            selected_ids, selected_texts, questions = [], [], []
+            for question_id, normalized, question_json, _ in rows:
+                if len(questions) >= n_questions:
+                    break
+                # Deux questions de cours différents peuvent se ressembler : une seule par quiz
+                if any(ngram_similarity(normalized, other) >= self.similarity for other in selected_texts):
+                    continue
+                selected_ids.append(question_id)
+                selected_texts.append(normalized)
+                questions.append(json.loads(question_json))
+
+            if selected_ids:
+                # Rotation : les prochaines révisions du même cours verront d'autres questions
+                with self._db:
+                    self._db.execute(
+                        f"UPDATE bank_questions SET served_count = served_count + 1 WHERE id IN ({self._placeholders(selected_ids)})",
+                        selected_ids
+                    )
+            if len(questions) >= n_questions:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return questions
+
+    def count(self, topic: str, difficulty: str, document_hashes: list[str]) -> int:
+        condition, parameters = self._scope(document_hashes, sorted(set(tokenize(topic))))
+        with self._lock:
+            (total,) = self._db.execute(
+                f"SELECT COUNT(*) FROM bank_questions q WHERE q.difficulty = ? AND {condition}",
+                [difficulty] + parameters
+            ).fetchone()
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            (total,) = self._db.execute("SELECT COUNT(*) FROM bank_questions").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "questions": total}
+
+
+_question_bank: QuestionBank | None = None
+_question_bank_lock = threading.Lock()
+
+
+def get_question_bank() -> QuestionBank:
+    """Banque de questions partagée par le processus, créée au premier usage (et non à l'import)."""
+    global _question_bank
+    with _question_bank_lock:
+        if _question_bank is None:
+            _question_bank = QuestionBank()
+        return _question_bank
@@ -1,5 +1,37 @@
-import streamlit as streamlit
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from resources.config import GRADING_MAX_CONCURRENCY, GRADING_MODE
+
+class QuizStream:
+    """Questions reçues en arrière-plan pendant que l'élève répond déjà aux premières.
+
+    Le thread de génération ne touche jamais à streamlit.session_state : il ajoute
+    simplement les questions à la liste partagée `questions`.
+    """
+
+    def __init__(self, expected_length: int):
+        self.questions = []
+        self.expected_length = expected_length
+        self.done = threading.Event()
+        self.cancelled = False
+        self.error = None
+
+    def consume(self, question_source):
+        try:
+            for question in question_source:
+                if self.cancelled:
+                    question_source.close()
+                    break
+                self.questions.append(question)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.done.set()
+
+    def start(self, question_source):
+        threading.Thread(target=self.consume, args=(question_source,), daemon=True).start()
+
 
 class QuizAgent:
     
@@ -8,53 +40,116 @@ class QuizAgent:
     score_key = 'score'
     result_key = 'results'
     quiz_state_key = 'quiz_state'
+    quiz_stream_key = 'quiz_stream'
 
-    def __init__(self):
+    def __init__(self, state=None):
+        # state : n'importe quel dictionnaire (st.session_state par défaut), pour piloter l'agent sans Streamlit,
+        # ou un SessionState (voir session_store.py) pour conserver le quiz au redémarrage
+        if state is None:
+            import streamlit
+            state = streamlit.session_state
+        self.state = state
         
-        if self.quiz_state_key not in streamlit.session_state:
-            streamlit.session_state[self.quiz_state_key] = 'start' 
+        if self.quiz_state_key not in self.state:
+            self.state[self.quiz_state_key] = 'start' 
             
-        if self.quiz_data_key not in streamlit.session_state:
-            streamlit.session_state[self.quiz_data_key] = []
-        if self.current_step_key not in streamlit.session_state:
-            streamlit.session_state[self.current_step_key] = 0
-        if self.score_key not in streamlit.session_state:
-            streamlit.session_state[self.score_key] = 0
-        if self.result_key not in streamlit.session_state:
-            streamlit.session_state[self.result_key] = []
+        if self.quiz_data_key not in self.state:
+            self.state[self.quiz_data_key] = []
+        if self.current_step_key not in self.state:
+            self.state[self.current_step_key] = 0
+        if self.score_key not in self.state:
+            self.state[self.score_key] = 0
+        if self.result_key not in self.state:
+            self.state[self.result_key] = []
+
+    @staticmethod
+    def is_valid_question(question) -> bool:
+        if not isinstance(question, dict) or not question.get('question') or not question.get('correct_identifier'):
+            return False
+        if question.get('type') == 'qcm':
+            return isinstance(question.get('choices'), list) and len(question['choices']) >= 2
+        return question.get('type') == 'open'
 
     def create_quiz(self, quiz_data: list):
-        streamlit.session_state[self.quiz_data_key] = quiz_data
-        streamlit.session_state[self.quiz_state_key] = 'questioning'
-        streamlit.session_state[self.current_step_key] = 0
-        streamlit.session_state[self.score_key] = 0
-        streamlit.session_state[self.result_key] = []
+        self.cancel_quiz_stream()
+        self.state[self.quiz_data_key] = quiz_data
+        self.state[self.quiz_state_key] = 'questioning'
+        self.state[self.current_step_key] = 0
+        self.state[self.score_key] = 0
+        self.state[self.result_key] = []
+
+    def start_quiz_stream(self, question_source, expected_length: int):
+        """Démarre un quiz dont les questions arrivent au fil de l'eau depuis question_source (un générateur)."""
+        self.cancel_quiz_stream()
+        quiz_stream = QuizStream(expected_length)
+        self.state[self.quiz_stream_key] = quiz_stream
+        self.state[self.quiz_data_key] = quiz_stream.questions
+        self.state[self.quiz_state_key] = 'waiting_question'
+        self.state[self.current_step_key] = 0
+        self.state[self.score_key] = 0
+        self.state[self.result_key] = []
+        quiz_stream.start(question_source)
+
+    def cancel_quiz_stream(self):
+        quiz_stream = self.state.get(self.quiz_stream_key)
+        if quiz_stream is not None:
+            quiz_stream.cancelled = True
+        self.state[self.quiz_stream_key] = None
+
+    def is_quiz_complete(self) -> bool:
+        quiz_stream = self.state.get(self.quiz_stream_key)
+        return quiz_stream is None or quiz_stream.done.is_set()
+
+    def read_expected_quiz_length(self) -> int:
+        quiz_stream = self.state.get(self.quiz_stream_key)
+        if quiz_stream is None or quiz_stream.done.is_set():
+            return self.read_quiz_length()
+        return max(quiz_stream.expected_length, self.read_quiz_length())
+
+    def refresh_waiting_state(self) -> str | None:
+        """En état 'waiting_question', reprend dès que la question attendue est arrivée.
+
+        Retourne un message d'erreur si la génération a échoué avant de produire une seule question.
+        """
+        step = self.state[self.current_step_key]
+        if step < self.read_quiz_length():
+            self.set_state('questioning')
+        elif self.is_quiz_complete():
+            quiz_stream = self.state.get(self.quiz_stream_key)
+            error = quiz_stream.error if quiz_stream else None
+            if self.read_quiz_length() == 0:
+                self.delete_quiz()
+                return error or "Aucune question valide n'a été générée."
+            self.state[self.quiz_data_key] = self.state[self.quiz_data_key]
+            self.state[self.current_step_key] = self.read_quiz_length() - 1
+            self.set_state('final_review')
+        return None
 
     def read_current_question(self) -> dict:
-        step = streamlit.session_state.get(self.current_step_key, 0)
-        quiz_data = streamlit.session_state.get(self.quiz_data_key, [])
+        step = self.state.get(self.current_step_key, 0)
+        quiz_data = self.state.get(self.quiz_data_key, [])
         
         if 0 <= step < len(quiz_data):
             return quiz_data[step]
         return {}
     
     def read_current_question_index(self) -> int:
-        return streamlit.session_state.get(self.current_step_key, 0)
+        return self.state.get(self.current_step_key, 0)
     
     def read_state(self) -> str:
-        return streamlit.session_state[self.quiz_state_key]
+        return self.state[self.quiz_state_key]
     
     def read_score(self) -> int:
-        return streamlit.session_state[self.score_key]
+        return self.state[self.score_key]
     
     def read_results(self) -> list:
-        return streamlit.session_state[self.result_key]
+        return self.state[self.result_key]
     
     def read_quiz_length(self) -> int:
-        return len(streamlit.session_state[self.quiz_data_key])
+        return len(self.state[self.quiz_data_key])
     
     def set_state(self, new_state: str):
-        streamlit.session_state[self.quiz_state_key] = new_state
+        self.state[self.quiz_state_key] = new_state
 
     def record_answer_and_advance(self, user_answer):
         current_q_data = self.read_current_question()
@@ -65,43 +160,87 @@ class QuizAgent:
             'correction': None
         }
         
-        streamlit.session_state[self.result_key].append(result_log)
+        results = self.state[self.result_key]
+        results.append(result_log)
+        # Réaffectations explicites : un état persistant n'enregistre pas les listes modifiées en place
+        # (dont les questions ajoutées par un QuizStream en arrière-plan)
+        self.state[self.result_key] = results
+        self.state[self.quiz_data_key] = self.state[self.quiz_data_key]
         
         self.update_next_step()
 
     def update_next_step(self):
-        if streamlit.session_state[self.current_step_key] < self.read_quiz_length() - 1:
-            streamlit.session_state[self.current_step_key] += 1
+        if self.state[self.current_step_key] < self.read_quiz_length() - 1:
+            self.state[self.current_step_key] += 1
             self.set_state('questioning')
+        elif not self.is_quiz_complete():
+            # L'élève a rattrapé la génération : on attend la question suivante
+            self.state[self.current_step_key] += 1
+            self.set_state('waiting_question')
         else:
             self.set_state('final_review') 
 
-    def finalize_quiz_results(self, conversation_agent: 'ConversationAgent', model: str):
+    def finalize_quiz_results(self, conversation_agent: 'ConversationAgent', model: str, max_workers: int = GRADING_MAX_CONCURRENCY, mode: str = GRADING_MODE):
+        
+        results = self.state[self.result_key]
+        
+        if mode == 'batch':
+            corrections = conversation_agent.get_batch_corrections(
+                [(result['question_data'], result['user_answer']) for result in results],
+                model=model,
+                max_workers=max_workers
+            )
+            self.apply_corrections(results, corrections)
+            return
+        
+        corrections = [None] * len(results)
+        open_indexes = []
         
-        streamlit.session_state[self.score_key] = 0
+        # Les QCM sont corrigés localement tout de suite, sans appel réseau
+        for index, result in enumerate(results):
+            if result['question_data'].get('type') == 'qcm':
+                corrections[index] = conversation_agent.get_correction_for_final_review(
+                    question_data=result['question_data'], 
+                    user_answer=result['user_answer'], 
+                    model=model
+                )
+            else:
+                open_indexes.append(index)
         
+        # Les questions ouvertes partent en parallèle, dans la limite de max_workers
+        if open_indexes:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(open_indexes)))) as executor:
+                futures = {
+                    executor.submit(
+                        conversation_agent.get_correction_for_final_review,
+                        question_data=results[index]['question_data'],
+                        user_answer=results[index]['user_answer'],
+                        model=model
+                    ): index
+                    for index in open_indexes
+                }
+                for future in as_completed(futures):
+                    corrections[futures[future]] = future.result()
+        
+        self.apply_corrections(results, corrections)
+
+    def apply_corrections(self, results: list, corrections: list):
         final_results = []
+        score = 0
         
-        for result in streamlit.session_state[self.result_key]:
-            q_data = result['question_data']
-            user_answer = result['user_answer']
-            
-            correction = conversation_agent.get_correction_for_final_review(
-                question_data=q_data, 
-                user_answer=user_answer, 
-                model=model
-            )
-            
-            streamlit.session_state[self.score_key] += correction['score']
+        for result, correction in zip(results, corrections):
+            score += correction['score']
             result['correction'] = correction
             final_results.append(result)
             
-        streamlit.session_state[self.result_key] = final_results
+        self.state[self.score_key] = score
+        self.state[self.result_key] = final_results
         self.set_state('finished')
 
     def delete_quiz(self):
-        streamlit.session_state[self.quiz_data_key] = []
-        streamlit.session_state[self.current_step_key] = 0
-        streamlit.session_state[self.score_key] = 0
-        streamlit.session_state[self.result_key] = []
-        streamlit.session_state[self.quiz_state_key] = 'start'
\ No newline at end of file
+        self.cancel_quiz_stream()
+        self.state[self.quiz_data_key] = []
+        self.state[self.current_step_key] = 0
+        self.state[self.score_key] = 0
+        self.state[self.result_key] = []
+        self.state[self.quiz_state_key] = 'start'
\ No newline at end of file
@@ -0,0 +1,160 @@
+import re
+import copy
+import json
+import time
+import random
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from resources.config import (
+    QUIZ_CACHE_TTL_S,
+    QUIZ_CACHE_MAX_ENTRIES,
+    QUIZ_CACHE_DB_PATH,
+    QUIZ_CACHE_MAX_DISK_ENTRIES,
+)
+
+CHOICE_LABEL_PATTERN = re.compile(r"^\s*([A-Z])\s*[\.\)]\s*")
+
+
+def shuffle_quiz(quiz_data: list, rng: random.Random | None = None) -> list:
+    """Variante d'un quiz : ordre des questions et des choix de QCM mélangés, lettres réattribuées."""
+    rng = rng or random.Random()
+    shuffled = copy.deepcopy(quiz_data)
+    rng.shuffle(shuffled)
+
+    for question in shuffled:
+        choices = question.get('choices') or []
+        labels = [CHOICE_LABEL_PATTERN.match(choice) for choice in choices]
+        if question.get('type') != 'qcm' or not choices or not all(labels):
+            continue
+
+        correct_letter = str(question.get('correct_identifier', '')).strip().upper()[:1]
+        bodies = [(label.group(1), choice[label.end():]) for label, choice in zip(labels, choices)]
+        rng.shuffle(bodies)
+
+        new_choices = []
+        for position, (old_letter, body) in enumerate(bodies):
+            new_letter = chr(ord('A') + position)
+            new_choices.append(f"{new_letter}. {body}")
+            if old_letter == correct_letter:
+                question['correct_identifier'] = new_letter
+        question['choices'] = new_choices
+
+    return shuffled
+
+
+class QuizCache:
+    """Cache des quiz générés, partagé entre sessions, avec expiration (TTL) et éviction LRU.
+
+    Une base SQLite optionnelle prolonge le cache mémoire entre redémarrages et entre processus.
+    """
+
+    def __init__(
+            self,
+            ttl_s: float = QUIZ_CACHE_TTL_S,
+            max_entries: int = QUIZ_CACHE_MAX_ENTRIES,
+            db_path: str | None = QUIZ_CACHE_DB_PATH,
+            max_disk_entries: int = QUIZ_CACHE_MAX_DISK_ENTRIES
+        ):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, list]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_cache ("
+                "key TEXT PRIMARY KEY, created_at REAL, last_access REAL, quiz_json TEXT)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(topic, n_questions, difficulty, model, context, prompt_version) -> str:
+        context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+        raw_key = json.dumps(
+            [topic.strip().lower(), n_questions, difficulty, model, context_hash, prompt_version],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def _is_fresh(self, created_at: float) -> bool:
+        return time.time() - created_at < self.ttl_s
+
+    def get(self, key: str) -> list | None:
+        """Retourne une copie du quiz en cache (que l'appelant peut modifier), ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._is_fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry:
+                del self._entries[key]
+
+            row = self._read_from_db(key)
+            if row is None:
+                self.misses += 1
+                return None
+
+            created_at, quiz_data = row
+            self._store_in_memory(key, created_at, quiz_data)
+            self.hits += 1
+            return copy.deepcopy(quiz_data)
+
+    def put(self, key: str, quiz_data: list):
+        created_at = time.time()
+        quiz_data = copy.deepcopy(quiz_data)
+        with self._lock:
+            self._store_in_memory(key, created_at, quiz_data)
+            self._write_to_db(key, created_at, quiz_data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _store_in_memory(self, key: str, created_at: float, quiz_data: list):
+        self._entries[key] = (created_at, quiz_data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_from_db(self, key: str):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT created_at, quiz_json FROM quiz_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if not self._is_fresh(row[0]):
+            self._db.execute("DELETE FROM quiz_cache WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE quiz_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return row[0], json.loads(row[1])
+
+    def _write_to_db(self, key: str, created_at: float, quiz_data: list):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO quiz_cache (key, created_at, last_access, quiz_json) VALUES (?, ?, ?, ?)",
+            (key, created_at, created_at, json.dumps(quiz_data, ensure_ascii=False))
+        )
+        self._db.execute("DELETE FROM quiz_cache WHERE created_at < ?", (time.time() - self.ttl_s,))
+        self._db.execute(
+            "DELETE FROM quiz_cache WHERE key NOT IN "
+            "(SELECT key FROM quiz_cache ORDER BY last_access DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+        self._db.commit()
+
+
+quiz_cache = QuizCache()
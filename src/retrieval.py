@@ -0,0 +1,171 @@
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+import numpy as np
+from resources.config import (
+    RETRIEVAL_CHUNK_CHARS,
+    RETRIEVAL_TOP_K,
+    RETRIEVAL_FULL_TEXT_MAX_CHARS,
+    RETRIEVAL_INDEX_CACHE_SIZE,
+)
+
+FILE_MARKER_PATTERN = re.compile(r"^--- Fichier : (.+?) ---$", re.MULTILINE)
+WORD_PATTERN = re.compile(r"\w+")
+
+FRENCH_STOP_WORDS = frozenset("""
+    a au aux avec ce ces c ca cela cet cette d dans de des du elle elles en est et etre eu il ils
+    je j l la le les leur leurs lui m ma mais me meme mes moi mon n ne nos notre nous on ou par pas
+    pour qu que quel quelle quels quelles qui s sa sans se ses si son sont sur t ta te tes toi ton tu
+    un une vos votre vous y ete etait sont ont avoir fait plus comme tout tous toute toutes
+""".split())
+
+
+def strip_accents(text: str) -> str:
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", text)
+        if not unicodedata.combining(char)
+    )
+
+
+def tokenize(text: str) -> list[str]:
+    """Minuscules, sans accents, sans mots vides : utilisé pour l'index et pour les requêtes."""
+    words = WORD_PATTERN.findall(strip_accents(text.lower()))
+    return [word for word in words if len(word) > 1 and word not in FRENCH_STOP_WORDS]
+
+
+class CourseIndex:
+    """Index lexical BM25 sur les extraits du texte de cours, conservant le fichier d'origine de chaque extrait."""
+
+    def __init__(self, course_text: str, chunk_chars: int = RETRIEVAL_CHUNK_CHARS, k1: float = 1.5, b: float = 0.75):
+        self.course_text = course_text
+        self.k1 = k1
+        self.b = b
+        self.chunks = self._split_into_chunks(course_text, chunk_chars)
+        self._build_index()
+
+    @staticmethod
+    def _split_sections(course_text: str) -> list[tuple[str | None, str]]:
+        markers = list(FILE_MARKER_PATTERN.finditer(course_text))
+        if not markers:
+            return [(None, course_text)]
+
+        sections = []
+        for position, marker in enumerate(markers):
+            end = markers[position + 1].start() if position + 1 < len(markers) else len(course_text)
+            sections.append((marker.group(1), course_text[marker.end():end]))
+        return sections
+
+    @staticmethod
+    def _split_into_chunks(course_text: str, chunk_chars: int) -> list[dict]:
+        chunks = []
+        for file_name, section_text in CourseIndex._split_sections(course_text):
+            current_lines = []
+            current_size = 0
+            for line in section_text.splitlines():
+                if current_size + len(line) > chunk_chars and current_lines:
+                    chunks.append({"file": file_name, "text": "\n".join(current_lines).strip()})
+                    current_lines = []
+                    current_size = 0
+                current_lines.append(line)
+                current_size += len(line) + 1
+            if current_lines and "".join(current_lines).strip():
+                chunks.append({"file": file_name, "text": "\n".join(current_lines).strip()})
+        return [chunk for chunk in chunks if chunk["text"]]
+
+    def _build_index(self):
+        self.vocabulary: dict[str, int] = {}
+        term_ids, doc_ids, frequencies = [], [], []
+        doc_lengths = []
+
+        for doc_id, chunk in enumerate(self.chunks):
+            tokens = tokenize(chunk["text"])
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                frequencies.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        self._posting_docs = np.asarray(doc_ids, dtype=np.int64)[order]
+        self._posting_tf = np.asarray(frequencies, dtype=np.float64)[order]
+        self._posting_offsets = np.searchsorted(term_ids[order], np.arange(len(self.vocabulary) + 1))
+
+        n_docs = len(self.chunks)
+        document_frequency = np.diff(self._posting_offsets)
+        self._idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+        self._doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+        self._avg_doc_length = self._doc_lengths.mean() if n_docs else 0.0
+
+    def score(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        if not self.chunks or self._avg_doc_length == 0:
+            return scores
+
+        length_norm = self.k1 * (1 - self.b + self.b * self._doc_lengths / self._avg_doc_length)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, stop = self._posting_offsets[term_id], self._posting_offsets[term_id + 1]
+            docs = self._posting_docs[start:stop]
+            tf = self._posting_tf[start:stop]
+            scores[docs] += self._idf[term_id] * tf * (self.k1 + 1) / (tf + length_norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> list[int]:
+        """Indices des k extraits les plus pertinents, dans l'ordre du cours.
+
+        Sans aucun terme en commun avec la requête (ex: "le cours ci-joint"), on retourne
+        des extraits répartis uniformément sur tout le cours.
+        """
+        n_docs = len(self.chunks)
+        if n_docs <= k:
+            return list(range(n_docs))
+
+        scores = self.score(query)
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) == 0:
+            return sorted({int(round(i * (n_docs - 1) / max(1, k - 1))) for i in range(k)})
+
+        if len(matching) > k:
+            matching = matching[np.argpartition(-scores[matching], k - 1)[:k]]
+        return sorted(int(i) for i in matching)
+
+    def build_context(self, query: str, k: int = RETRIEVAL_TOP_K, full_text_max_chars: int = RETRIEVAL_FULL_TEXT_MAX_CHARS) -> str:
+        """Texte à injecter dans le prompt : le cours entier s'il est court, sinon les extraits pertinents."""
+        if len(self.course_text) <= full_text_max_chars:
+            return self.course_text
+
+        parts = []
+        previous_file = object()
+        for index in self.search(query, k):
+            chunk = self.chunks[index]
+            # Le marqueur de fichier est répété pour que le modèle puisse citer sa source
+            if chunk["file"] is not None and chunk["file"] != previous_file:
+                parts.append(f"\n--- Fichier : {chunk['file']} ---")
+            previous_file = chunk["file"]
+            parts.append(chunk["text"])
+        return "\n".join(parts)
+
+
+_index_cache: OrderedDict[str, CourseIndex] = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_course_index(course_text: str) -> CourseIndex:
+    """Index partagé entre sessions : le même cours n'est indexé qu'une fois par processus."""
+    key = hashlib.sha256(course_text.encode("utf-8")).hexdigest()
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    index = CourseIndex(course_text)
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > RETRIEVAL_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,211 @@
+import time
+import heapq
+import itertools
+import threading
+from resources.config import (
+    MODEL_RATE_LIMITS,
+    DEFAULT_RATE_LIMITS,
+    SCHEDULER_PRIORITIES,
+)
+
+
+class SchedulerTimeout(Exception):
+    pass
+
+
+class SchedulerRequestTooLarge(Exception):
+    """La requête dépasse à elle seule le budget de tokens par minute du modèle : elle ne partirait jamais."""
+
+
+class TokenBucket:
+    """Seau à jetons : capacity jetons au maximum, remplis à raison de capacity par période (une minute)."""
+
+    def __init__(self, capacity: float, clock, period: float = 60):
+        self.capacity = capacity
+        self.refill_per_s = capacity / period
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.blocked_until = 0.0
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_s)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        self.refill()
+        wait_for_tokens = max(0.0, (amount - self.tokens) / self.refill_per_s)
+        return max(wait_for_tokens, self.blocked_until - self.clock())
+
+    def consume(self, amount: float):
+        self.refill()
+        self.tokens -= amount
+
+
+class Ticket:
+    def __init__(self, sort_key, session_id, model, tokens, enqueued_at):
+        self.sort_key = sort_key
+        self.session_id = session_id
+        self.model = model
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+
+class RequestScheduler:
+    """File d'attente commune à toutes les sessions, devant chaque appel à l'API.
+
+    - budgets par modèle : requêtes/minute et tokens/minute (seaux à jetons) ;
+    - classes de priorité : le chat interactif passe avant la correction et le préchargement ;
+    - équité entre sessions : à priorité égale, les requêtes des sessions alternent
+      au lieu de laisser une session monopoliser le modèle.
+
+    period raccourcit la minute des limites pour les simulations (voir benchmark.py).
+    """
+
+    def __init__(self, limits: dict = MODEL_RATE_LIMITS, default_limits: dict = DEFAULT_RATE_LIMITS, clock=time.monotonic, period: float = 60):
+        self.limits = limits
+        self.default_limits = default_limits
+        self.clock = clock
+        self.period = period
+        self._condition = threading.Condition()
+        self._queues: dict[str, list[Ticket]] = {}
+        self._buckets: dict[str, tuple[TokenBucket, TokenBucket]] = {}
+        self._virtual_time: dict[str, int] = {}
+        self._session_rounds: dict[tuple, int] = {}
+        self._sequence = itertools.count()
+
+    def _model_buckets(self, model: str) -> tuple[TokenBucket, TokenBucket]:
+        if model not in self._buckets:
+            limits = self.limits.get(model, self.default_limits)
+            self._buckets[model] = (
+                TokenBucket(limits["rpm"], self.clock, self.period),
+                TokenBucket(limits["tpm"], self.clock, self.period),
+            )
+        return self._buckets[model]
+
+    def _time_until_ready(self, ticket: Ticket) -> float:
+        requests_bucket, tokens_bucket = self._model_buckets(ticket.model)
+        return max(requests_bucket.time_until(1), tokens_bucket.time_until(ticket.tokens))
+
+    def acquire(self, model: str, estimated_tokens: int, priority: str = "interactive", session_id=None, timeout: float | None = None) -> float:
+        """Bloque jusqu'à ce que la requête puisse partir ; retourne le temps passé dans la file (en secondes)."""
+        rank = SCHEDULER_PRIORITIES.get(priority, max(SCHEDULER_PRIORITIES.values()))
+        with self._condition:
+            tokens_capacity = self._model_buckets(model)[1].capacity
+            if estimated_tokens > tokens_capacity:
+                # Groq la refuserait de toute façon (429) : l'appelant doit la raccourcir ou la découper
+                raise SchedulerRequestTooLarge(
+                    f"Requête d'environ {estimated_tokens} tokens, au-delà de la limite de {tokens_capacity:g} tokens/minute du modèle {model}."
+                )
+
+            # Mise en file équitable : chaque session avance d'un "tour" par requête en attente
+            virtual_time = self._virtual_time.get(model, 0)
+            round_number = max(virtual_time, self._session_rounds.get((model, session_id), 0)) + 1
+            self._session_rounds[(model, session_id)] = round_number
+
+            enqueued_at = self.clock()
+            ticket = Ticket((rank, round_number, next(self._sequence)), session_id, model, estimated_tokens, enqueued_at)
+            queue = self._queues.setdefault(model, [])
+            heapq.heappush(queue, ticket)
+            deadline = enqueued_at + timeout if timeout is not None else None
+
+            try:
+                while True:
+                    wait_s = None
+                    if queue[0] is ticket:
+                        wait_s = self._time_until_ready(ticket)
+                        if wait_s <= 0:
+                            heapq.heappop(queue)
+                            requests_bucket, tokens_bucket = self._model_buckets(model)
+                            requests_bucket.consume(1)
+                            tokens_bucket.consume(ticket.tokens)
+                            # Relu ici : d'autres requêtes ont pu faire avancer le temps virtuel pendant l'attente
+                            virtual_time = max(self._virtual_time.get(model, 0), ticket.sort_key[1])
+                            self._virtual_time[model] = virtual_time
+                            self._forget_idle_sessions(model, virtual_time)
+                            self._condition.notify_all()
+                            return self.clock() - enqueued_at
+
+                    if deadline is not None:
+                        remaining = deadline - self.clock()
+                        if remaining <= 0:
+                            raise SchedulerTimeout(f"Délai d'attente dépassé pour le modèle {model}.")
+                        wait_s = remaining if wait_s is None else min(wait_s, remaining)
+                    self._condition.wait(wait_s)
+            except BaseException:
+                if ticket in queue:
+                    queue.remove(ticket)
+                    heapq.heapify(queue)
+                    self._condition.notify_all()
+                raise
+
+    def _forget_idle_sessions(self, model: str, virtual_time: int):
+        """Un tour de session déjà dépassé par le temps virtuel ne change plus rien à la mise en file : on l'oublie."""
+        stale = [key for key, round_number in self._session_rounds.items() if key[0] == model and round_number <= virtual_time]
+        for key in stale:
+            del self._session_rounds[key]
+
+    def has_spare_capacity(self, model: str, estimated_tokens: int) -> bool:
+        """Vrai si une requête de plus partirait tout de suite, sans retarder aucune requête en attente."""
+        with self._condition:
+            if self._queues.get(model):
+                return False
+            requests_bucket, tokens_bucket = self._model_buckets(model)
+            return requests_bucket.time_until(1) <= 0 and tokens_bucket.time_until(estimated_tokens) <= 0
+
+    def adjust_tokens(self, model: str, delta: int):
+        """Corrige le budget de tokens une fois la consommation réelle connue (delta > 0 : plus que prévu)."""
+        with self._condition:
+            _, tokens_bucket = self._model_buckets(model)
+            tokens_bucket.refill()
+            tokens_bucket.tokens = min(tokens_bucket.capacity, tokens_bucket.tokens - delta)
+            self._condition.notify_all()
+
+    def penalize(self, model: str, retry_after: float):
+        """Suspend les envois vers ce modèle après un 429 du serveur."""
+        with self._condition:
+            requests_bucket, tokens_bucket = self._model_buckets(model)
+            blocked_until = self.clock() + retry_after
+            requests_bucket.blocked_until = max(requests_bucket.blocked_until, blocked_until)
+            tokens_bucket.blocked_until = max(tokens_bucket.blocked_until, blocked_until)
+
+    def queue_position(self, session_id) -> int | None:
+        """Position (0 = prochaine requête à partir) de la première requête en attente de cette session."""
+        with self._condition:
+            positions = [
+                position
+                for queue in self._queues.values()
+                for position, ticket in enumerate(sorted(queue))
+                if ticket.session_id == session_id
+            ]
+            return min(positions) if positions else None
+
+    def estimated_wait(self, session_id) -> float | None:
+        """Estimation du temps restant avant le départ de la première requête en attente de cette session."""
+        with self._condition:
+            estimates = []
+            for model, queue in self._queues.items():
+                ordered = sorted(queue)
+                for position, ticket in enumerate(ordered):
+                    if ticket.session_id != session_id:
+                        continue
+                    limits = self.limits.get(model, self.default_limits)
+                    tokens_ahead = sum(other.tokens for other in ordered[:position + 1])
+                    estimates.append(max(
+                        self._time_until_ready(ordered[0]),
+                        position * self.period / limits["rpm"],
+                        (tokens_ahead - self._model_buckets(model)[1].tokens) * self.period / limits["tpm"],
+                    ))
+                    break
+            return max(0.0, min(estimates)) if estimates else None
+
+    def queue_lengths(self) -> dict:
+        with self._condition:
+            return {model: len(queue) for model, queue in self._queues.items() if queue}
+
+
+request_scheduler = RequestScheduler()
@@ -0,0 +1,305 @@
+"""Service HTTP du tuteur, sans interface : les mêmes sessions que l'application Streamlit, pilotées en JSON.
+
+    python src/service.py [--host 127.0.0.1] [--port 8080]
+
+    POST   /sessions                          -> {"session_id": ...}
+    GET    /sessions/{id}/messages?limit=20
+    POST   /sessions/{id}/chat                {"message", "model"?} -> {"response"}
+    POST   /sessions/{id}/chat/stream         idem, en Server-Sent Events ({"delta": ...} ou {"error": ...}, puis [DONE])
+    POST   /sessions/{id}/documents           multipart : PDF ajoutés au cours, images jointes au prochain message
+    DELETE /sessions/{id}/documents
+    POST   /sessions/{id}/quiz                {"topic", "n_questions"? (1 à QUIZ_MAX_QUESTIONS), "difficulty"?, "model"?, "from_bank"?}
+    GET    /sessions/{id}/quiz
+    POST   /sessions/{id}/quiz/answer         {"answer"}
+    POST   /sessions/{id}/quiz/finalize       {"model"?}
+    DELETE /sessions/{id}/quiz
+    GET    /metrics                           (format texte Prometheus)
+
+La boucle asyncio ne fait que router les requêtes : les appels au LLM et les extractions
+passent par un pool de threads, ce qui garde l'ordonnanceur, les reprises sur erreur et la
+télémétrie communs à toutes les sessions du processus. L'état des sessions est dans le
+stockage de session ; avec plusieurs processus derrière un répartiteur de charge, une
+session doit rester attachée au même processus (affinité sur l'identifiant de session).
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from tutor_session import TutorSession
+from telemetry import telemetry, PrometheusSink
+from resources.config import (
+    ROUTER_AUTO_OPTION,
+    QUIZ_MAX_QUESTIONS,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_WORKER_THREADS,
+    SERVICE_MAX_LIVE_SESSIONS,
+    SERVICE_MAX_UPLOAD_BYTES,
+)
+
+STREAM_DONE = object()
+
+
+class SessionRegistry:
+    """Sessions vivantes du processus ; les moins récentes sont oubliées puis relues depuis le stockage."""
+
+    def __init__(self, client=None, store=None, max_live_sessions: int = SERVICE_MAX_LIVE_SESSIONS):
+        self.client = client
+        self.store = store
+        self.max_live_sessions = max_live_sessions
+        self._sessions: OrderedDict[str, TutorSession] = OrderedDict()
+        # Appelé depuis le pool de threads : deux requêtes ne doivent jamais charger deux fois la même session
+        self._lock = threading.Lock()
+
+    def create(self) -> TutorSession:
+        session = TutorSession(client=self.client, store=self.store)
+        with self._lock:
+            self._remember(session)
+        return session
+
+    def get(self, session_id: str) -> TutorSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = TutorSession(session_id, client=self.client, store=self.store)
+                self._remember(session)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _remember(self, session: TutorSession):
+        """À appeler sous self._lock."""
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > self.max_live_sessions:
+            self._sessions.popitem(last=False)
+
+
+class TutorService:
+
+    def __init__(self, client=None, store=None, worker_threads: int = SERVICE_WORKER_THREADS):
+        self.sessions = SessionRegistry(client=client, store=store)
+        self.executor = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="tutor-service")
+
+    async def run_locked(self, session: TutorSession, function, *args, **kwargs):
+        """Exécute un appel bloquant dans le pool, une opération à la fois par session."""
+        def call():
+            with session.lock:
+                return function(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def session_from(self, request: web.Request) -> TutorSession:
+        # La création d'une session relit le stockage : hors de la boucle asyncio
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.sessions.get, request.match_info["session_id"]
+        )
+
+    @staticmethod
+    async def read_json(request: web.Request) -> dict:
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(reason="Corps JSON invalide.")
+        if not isinstance(payload, dict):
+            raise web.HTTPBadRequest(reason="Un objet JSON est attendu.")
+        return payload
+
+    # --- Sessions et conversation ---
+
+    async def create_session(self, request):
+        session = await asyncio.get_running_loop().run_in_executor(self.executor, self.sessions.create)
+        return web.json_response({"session_id": session.session_id}, status=201)
+
+    async def list_messages(self, request):
+        session = await self.session_from(request)
+        limit = request.query.get("limit")
+        messages = await self.run_locked(session, session.messages, int(limit) if limit else None)
+        return web.json_response({"messages": messages})
+
+    async def chat(self, request):
+        session = await self.session_from(request)
+        payload = await self.read_json(request)
+        if not payload.get("message"):
+            raise web.HTTPBadRequest(reason="Le champ 'message' est requis.")
+        response = await self.run_locked(session, session.chat, payload["message"], payload.get("model", ROUTER_AUTO_OPTION))
+        return web.json_response({"response": response})
+
+    async def chat_stream(self, request):
+        session = await self.session_from(request)
+        payload = await self.read_json(request)
+        if not payload.get("message"):
+            raise web.HTTPBadRequest(reason="Le champ 'message' est requis.")
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        disconnected = threading.Event()
+
+        def produce():
+            # Le flux est lu dans le pool ; chaque fragment est remis à la boucle asyncio
+            stream = None
+            try:
+                stream = session.chat(payload["message"], payload.get("model", ROUTER_AUTO_OPTION), stream=True)
+                for chunk in stream:
+                    if disconnected.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, {"delta": chunk})
+            except Exception as e:
+                # La réponse est déjà commencée : l'erreur ne peut plus être un statut HTTP
+                loop.call_soon_threadsafe(queue.put_nowait, {"error": str(e)})
+            finally:
+                # Fermer le générateur enregistre la réponse partielle et libère la connexion à l'API
+                close_stream = getattr(stream, "close", None)
+                if close_stream:
+                    close_stream()
+                loop.call_soon_threadsafe(queue.put_nowait, STREAM_DONE)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        producer_task = asyncio.ensure_future(self.run_locked(session, produce))
+        try:
+            while (event := await queue.get()) is not STREAM_DONE:
+                await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            pass
+        finally:
+            # Client parti (ou requête annulée) : le producteur s'arrête au prochain fragment et libère le verrou de la session
+            disconnected.set()
+            try:
+                # shield : l'annulation de la requête n'interrompt pas l'attente du thread producteur
+                await asyncio.shield(producer_task)
+            except Exception as e:
+                print(f"[LOG CONSOLE - SERVICE ERROR] Flux de chat : {e}")
+        return response
+
+    # --- Documents ---
+
+    async def upload_documents(self, request):
+        session = await self.session_from(request)
+        if request.content_length and request.content_length > SERVICE_MAX_UPLOAD_BYTES:
+            raise web.HTTPRequestEntityTooLarge(max_size=SERVICE_MAX_UPLOAD_BYTES, actual_size=request.content_length)
+
+        added = []
+        reader = await request.multipart()
+        async for part in reader:
+            if not part.filename:
+                continue
+            data = await part.read()
+            try:
+                added.append(await self.run_locked(
+                    session, session.add_document, part.filename, data, part.headers.get("Content-Type")
+                ))
+            except ValueError as e:
+                raise web.HTTPBadRequest(reason=str(e))
+        return web.json_response({"documents": added}, status=201)
+
+    async def clear_documents(self, request):
+        session = await self.session_from(request)
+        await self.run_locked(session, session.clear_course)
+        return web.json_response({"documents": []})
+
+    # --- Quiz ---
+
+    async def quiz_response(self, session: TutorSession, status: int = 200):
+        return web.json_response(await self.run_locked(session, session.quiz_snapshot), status=status)
+
+    async def start_quiz(self, request):
+        session = await self.session_from(request)
+        payload = await self.read_json(request)
+        if not payload.get("topic"):
+            raise web.HTTPBadRequest(reason="Le champ 'topic' est requis.")
+        try:
+            n_questions = int(payload.get("n_questions", 3))
+        except (TypeError, ValueError):
+            raise web.HTTPBadRequest(reason="Le champ 'n_questions' doit être un entier.")
+        success = await self.run_locked(
+            session,
+            session.start_quiz,
+            payload["topic"],
+            min(max(n_questions, 1), QUIZ_MAX_QUESTIONS),
+            payload.get("difficulty", "Moyen"),
+            payload.get("model", ROUTER_AUTO_OPTION),
+            bool(payload.get("from_bank", False))
+        )
+        if not success:
+            raise web.HTTPBadGateway(reason="Échec de la génération du quiz.")
+        return await self.quiz_response(session, status=201)
+
+    async def read_quiz(self, request):
+        return await self.quiz_response(await self.session_from(request))
+
+    async def answer_quiz(self, request):
+        session = await self.session_from(request)
+        payload = await self.read_json(request)
+        try:
+            await self.run_locked(session, session.answer, payload.get("answer"))
+        except ValueError as e:
+            raise web.HTTPConflict(reason=str(e))
+        return await self.quiz_response(session)
+
+    async def finalize_quiz(self, request):
+        session = await self.session_from(request)
+        payload = await self.read_json(request) if request.can_read_body else {}
+        try:
+            await self.run_locked(session, session.finalize, payload.get("model", ROUTER_AUTO_OPTION))
+        except ValueError as e:
+            raise web.HTTPConflict(reason=str(e))
+        return await self.quiz_response(session)
+
+    async def reset_quiz(self, request):
+        session = await self.session_from(request)
+        await self.run_locked(session, session.reset_quiz)
+        return await self.quiz_response(session)
+
+    async def metrics(self, request):
+        prometheus = telemetry.sink_of_type(PrometheusSink)
+        if prometheus is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=prometheus.render(), content_type="text/plain")
+
+    async def shutdown(self, app):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(client=None, store=None) -> web.Application:
+    service = TutorService(client=client, store=store)
+    app = web.Application(client_max_size=SERVICE_MAX_UPLOAD_BYTES)
+    app.add_routes([
+        web.post("/sessions", service.create_session),
+        web.get("/sessions/{session_id}/messages", service.list_messages),
+        web.post("/sessions/{session_id}/chat", service.chat),
+        web.post("/sessions/{session_id}/chat/stream", service.chat_stream),
+        web.post("/sessions/{session_id}/documents", service.upload_documents),
+        web.delete("/sessions/{session_id}/documents", service.clear_documents),
+        web.post("/sessions/{session_id}/quiz", service.start_quiz),
+        web.get("/sessions/{session_id}/quiz", service.read_quiz),
+        web.post("/sessions/{session_id}/quiz/answer", service.answer_quiz),
+        web.post("/sessions/{session_id}/quiz/finalize", service.finalize_quiz),
+        web.delete("/sessions/{session_id}/quiz", service.reset_quiz),
+        web.get("/metrics", service.metrics),
+    ])
+    app.on_shutdown.append(service.shutdown)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP du tuteur.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    arguments = parser.parse_args()
+    web.run_app(create_app(), host=arguments.host, port=arguments.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from paths import data_path
+from blob_store import get_blob_store
+from token_budget import token_estimator
+from resources.config import (
+    SESSION_STORE_BACKEND,
+    SESSION_DB_PATH,
+    SESSION_FLUSH_INTERVAL_S,
+    SESSION_FLUSH_BATCH_SIZE,
+    SESSION_MEMORY_MESSAGES,
+    SESSION_PAGE_SIZE,
+    SESSION_CACHED_PAGES,
+    TOKEN_MESSAGE_OVERHEAD,
+)
+
+
+class SessionStore(ABC):
+    """Interface des stockages de session : messages de la conversation (images à part) et valeurs (état du quiz)."""
+
+    @abstractmethod
+    def append_message(self, session_id: str, seq: int, message: dict, image_url: str | None = None):
+        """Enregistre le message à la position seq ; les messages suivants éventuels sont supprimés."""
+
+    @abstractmethod
+    def load_messages(self, session_id: str, start: int, stop: int) -> list[dict]:
+        ...
+
+    @abstractmethod
+    def message_stats(self, session_id: str) -> tuple[int, int]:
+        """(nombre de messages, nombre total de caractères de leur contenu)."""
+
+    @abstractmethod
+    def load_image(self, session_id: str, seq: int) -> str | None:
+        ...
+
+    @abstractmethod
+    def set_value(self, session_id: str, key: str, value):
+        ...
+
+    @abstractmethod
+    def delete_value(self, session_id: str, key: str):
+        ...
+
+    @abstractmethod
+    def load_values(self, session_id: str) -> dict:
+        ...
+
+    def flush(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Tout en mémoire, rien n'est conservé au redémarrage (benchmarks, développement)."""
+
+    def __init__(self):
+        self._messages: dict[str, list] = {}
+        self._values: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def append_message(self, session_id, seq, message, image_url=None):
+        with self._lock:
+            messages = self._messages.setdefault(session_id, [])
+            del messages[seq:]
+            messages.append((json.dumps(message["content"], ensure_ascii=False), message["role"], image_url))
+
+    def load_messages(self, session_id, start, stop):
+        with self._lock:
+            rows = self._messages.get(session_id, [])[start:stop]
+        return [{"role": role, "content": json.loads(content)} for content, role, _ in rows]
+
+    def message_stats(self, session_id):
+        with self._lock:
+            rows = self._messages.get(session_id, [])
+            return len(rows), sum(len(content) for content, _, _ in rows)
+
+    def load_image(self, session_id, seq):
+        with self._lock:
+            rows = self._messages.get(session_id, [])
+            return rows[seq][2] if 0 <= seq < len(rows) else None
+
+    def set_value(self, session_id, key, value):
+        with self._lock:
+            self._values.setdefault(session_id, {})[key] = json.dumps(value, ensure_ascii=False)
+
+    def delete_value(self, session_id, key):
+        with self._lock:
+            self._values.get(session_id, {}).pop(key, None)
+
+    def load_values(self, session_id):
+        with self._lock:
+            return {key: json.loads(value) for key, value in self._values.get(session_id, {}).items()}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Stockage SQLite (mode WAL) partagé par toutes les sessions du processus.
+
+    Les écritures sont mises en attente puis regroupées dans une seule transaction, par un
+    thread d'arrière-plan (toutes les flush_interval secondes ou dès batch_size écritures).
+    Toute lecture commence par vider la file, pour toujours relire ses propres écritures.
+    """
+
+    def __init__(self, db_path: str, flush_interval: float = SESSION_FLUSH_INTERVAL_S, batch_size: int = SESSION_FLUSH_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "session_id TEXT, seq INTEGER, role TEXT, content TEXT, image_url TEXT, created_at REAL, "
+            "PRIMARY KEY (session_id, seq))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_values ("
+            "session_id TEXT, key TEXT, value TEXT, updated_at REAL, PRIMARY KEY (session_id, key))"
+        )
+        self._db.commit()
+
+        self._pending_messages = []
+        self._pending_values: dict[tuple, str | None] = {}  # None : valeur supprimée
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._flush_loop, args=(flush_interval,), daemon=True, name="session-store").start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self, flush_interval: float):
+        while True:
+            self._wake.wait(flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _pending_count(self) -> int:
+        return len(self._pending_messages) + len(self._pending_values)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending_count():
+                return
+            messages, self._pending_messages = self._pending_messages, []
+            values, self._pending_values = self._pending_values, {}
+            now = time.time()
+            try:
+                with self._db:
+                    for row in messages:
+                        # Réécrire une position efface la suite, comme MemorySessionStore
+                        self._db.execute(
+                            "DELETE FROM session_messages WHERE session_id = ? AND seq >= ?", (row[0], row[1])
+                        )
+                        self._db.execute(
+                            "INSERT INTO session_messages (session_id, seq, role, content, image_url, created_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            row + (now,)
+                        )
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO session_values (session_id, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                        [(session_id, key, value, now) for (session_id, key), value in values.items() if value is not None]
+                    )
+                    self._db.executemany(
+                        "DELETE FROM session_values WHERE session_id = ? AND key = ?",
+                        [key for key, value in values.items() if value is None]
+                    )
+            except sqlite3.Error as e:
+                print(f"[LOG CONSOLE - SESSION STORE ERROR] {e}")
+
+    def _enqueue(self):
+        if self._pending_count() >= self.batch_size:
+            self._wake.set()
+
+    def append_message(self, session_id, seq, message, image_url=None):
+        row = (session_id, seq, message["role"], json.dumps(message["content"], ensure_ascii=False), image_url)
+        with self._lock:
+            self._pending_messages.append(row)
+            self._enqueue()
+
+    def load_messages(self, session_id, start, stop):
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content FROM session_messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, stop)
+            ).fetchall()
+        return [{"role": role, "content": json.loads(content)} for role, content in rows]
+
+    def message_stats(self, session_id):
+        self.flush()
+        with self._lock:
+            count, chars = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM session_messages WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        return count, chars
+
+    def load_image(self, session_id, seq):
+        self.flush()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT image_url FROM session_messages WHERE session_id = ? AND seq = ?", (session_id, seq)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_value(self, session_id, key, value):
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            # Plusieurs affectations de la même clé entre deux vidages n'en font qu'une écriture
+            self._pending_values[(session_id, key)] = serialized
+            self._enqueue()
+
+    def delete_value(self, session_id, key):
+        with self._lock:
+            self._pending_values[(session_id, key)] = None
+            self._enqueue()
+
+    def load_values(self, session_id):
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM session_values WHERE session_id = ?", (session_id,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+
+class SessionHistory:
+    """Historique d'une conversation adossé au stockage, utilisable comme une liste de messages.
+
+    Seuls le prompt système et les derniers messages restent en mémoire ; les plus anciens
+    sont relus par pages à la demande. Les images ne sont jamais gardées dans les messages :
+    le stockage n'en conserve que la référence (voir blob_store.py), résolue par image_url(index).
+    """
+
+    def __init__(
+            self,
+            store: SessionStore,
+            session_id: str,
+            memory_messages: int = SESSION_MEMORY_MESSAGES,
+            page_size: int = SESSION_PAGE_SIZE,
+            cached_pages: int = SESSION_CACHED_PAGES
+        ):
+        self.store = store
+        self.session_id = session_id
+        self.memory_messages = memory_messages
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+
+        count, chars = store.message_stats(session_id)
+        self._length = count
+        # Sans modèle précisé : ratio par défaut de l'estimateur, le plus prudent
+        self.estimated_tokens = token_estimator.tokens_for_chars(chars) + TOKEN_MESSAGE_OVERHEAD * count
+        self._recent: OrderedDict[int, dict] = OrderedDict()
+        self._pages: OrderedDict[int, list] = OrderedDict()
+        self._system = store.load_messages(session_id, 0, 1)[0] if count else None
+
+        first_recent = max(1, count - memory_messages)
+        for seq, message in enumerate(store.load_messages(session_id, first_recent, count), start=first_recent):
+            self._recent[seq] = message
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _load(self, index: int) -> dict:
+        if index == 0 and self._system is not None:
+            return self._system
+        if index in self._recent:
+            return self._recent[index]
+
+        page_number = index // self.page_size
+        page = self._pages.get(page_number)
+        if page is None:
+            start = page_number * self.page_size
+            page = self.store.load_messages(self.session_id, start, start + self.page_size)
+            self._pages[page_number] = page
+            while len(self._pages) > self.cached_pages:
+                self._pages.popitem(last=False)
+        self._pages.move_to_end(page_number)
+        return page[index - page_number * self.page_size]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(position) for position in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Index d'historique hors limites.")
+        return self._load(index)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self._load(index)
+
+    def append(self, message: dict, image_url: str | None = None):
+        seq = self._length
+        self.store.append_message(self.session_id, seq, message, image_url)
+        self._length += 1
+        self.estimated_tokens += token_estimator.message_tokens(message)
+
+        if seq == 0:
+            self._system = message
+            return
+        self._recent[seq] = message
+        while len(self._recent) > self.memory_messages:
+            self._recent.popitem(last=False)
+        # Une page lue avant cet ajout serait incomplète
+        self._pages.pop(seq // self.page_size, None)
+
+    def image_ref(self, index: int) -> str | None:
+        return self.store.load_image(self.session_id, index)
+
+    def image_url(self, index: int) -> str | None:
+        return get_blob_store().resolve(self.image_ref(index))
+
+
+class SessionState(MutableMapping):
+    """Valeurs d'une session (état du quiz...), utilisable à la place de st.session_state.
+
+    Chaque affectation est recopiée dans le stockage ; une liste modifiée en place doit donc
+    être réaffectée pour être enregistrée. Les clés de transient_keys (objets non sérialisables,
+    comme un flux de génération en cours) ne quittent pas la mémoire.
+    """
+
+    def __init__(self, store: SessionStore, session_id: str, transient_keys=()):
+        self.store = store
+        self.session_id = session_id
+        self.transient_keys = frozenset(transient_keys)
+        self._values = store.load_values(session_id)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        if key not in self.transient_keys:
+            self.store.set_value(self.session_id, key, value)
+
+    def __delitem__(self, key):
+        del self._values[key]
+        if key not in self.transient_keys:
+            self.store.delete_value(self.session_id, key)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+def create_session_store(backend: str = SESSION_STORE_BACKEND, db_path: str = SESSION_DB_PATH) -> SessionStore:
+    if backend == "sqlite":
+        return SQLiteSessionStore(data_path(db_path))
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Stockage de session inconnu : {backend}")
+
+
+_session_store: SessionStore | None = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Stockage de session partagé par le processus, créé au premier usage (et non à l'import)."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = create_session_store()
+        return _session_store
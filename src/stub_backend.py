@@ -0,0 +1,145 @@
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from types import SimpleNamespace
+from scheduler import TokenBucket
+from token_budget import token_estimator
+
+QUIZ_REQUEST_PATTERN = re.compile(r"EXACTEMENT (\d+) questions")
+BATCH_ITEM_ID_PATTERN = re.compile(r'"id":\s*(\d+)')
+CHAT_WORDS = (
+    "le", "cours", "montre", "que", "la", "notion", "repose", "sur", "une", "définition", "précise",
+    "et", "des", "exemples", "concrets", "permettent", "de", "vérifier", "chaque", "étape", "du", "raisonnement",
+)
+
+
+class StubAPIError(Exception):
+    """Erreur injectée : même forme que les erreurs du SDK (status_code, response.headers)."""
+
+    def __init__(self, status_code: int, retry_after: float | None = None):
+        super().__init__(f"{status_code} (erreur simulée)")
+        self.status_code = status_code
+        headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class StubCompletions:
+    """Remplaçant local de client.chat.completions, sans réseau ni clé Groq.
+
+    - latency : délai avant le premier token (secondes) ;
+    - tokens_per_s : vitesse de génération ;
+    - error_rate / error_status : part des requêtes qui échouent, et avec quel code ;
+    - rpm / period : quota de requêtes du serveur (429 avec retry-after au-delà).
+
+    La réponse dépend du prompt : quiz JSON, correction, correction groupée, résumé ou réponse de chat.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.3,
+            tokens_per_s: float = 300,
+            error_rate: float = 0.0,
+            error_status: int = 503,
+            rpm: int | None = None,
+            period: float = 60,
+            chat_tokens: int = 150,
+            seed: int | None = None
+        ):
+        self.latency = latency
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.quota = TokenBucket(rpm, time.monotonic, period) if rpm else None
+        self.chat_tokens = chat_tokens
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def check_admission(self):
+        with self._lock:
+            self.calls += 1
+            if self.quota is not None:
+                wait_s = self.quota.time_until(1)
+                if wait_s > 0:
+                    self.errors += 1
+                    raise StubAPIError(429, retry_after=wait_s)
+                self.quota.consume(1)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                raise StubAPIError(self.error_status)
+
+    def respond(self, messages) -> str:
+        prompt = messages[-1]["content"] if isinstance(messages[-1]["content"], str) else ""
+
+        quiz_request = QUIZ_REQUEST_PATTERN.search(prompt)
+        if quiz_request:
+            return json.dumps([self.make_question(index) for index in range(int(quiz_request.group(1)))], ensure_ascii=False)
+
+        if "reponse_etudiant" in prompt:
+            return json.dumps([
+                {"id": int(item_id), "score": self.random.randint(0, 1), "feedback": "Correct, la notion est comprise."}
+                for item_id in BATCH_ITEM_ID_PATTERN.findall(prompt)
+            ], ensure_ascii=False)
+
+        if "Réponse de l'étudiant" in prompt:
+            score = self.random.randint(0, 1)
+            feedback = "Correct, la notion est comprise." if score else "Incorrect, relisez la définition."
+            return json.dumps({"score": score, "feedback": feedback}, ensure_ascii=False)
+
+        words = [self.random.choice(CHAT_WORDS) for _ in range(self.chat_tokens)]
+        return " ".join(words).capitalize() + "."
+
+    def make_question(self, index: int) -> dict:
+        # Énoncés uniques : la déduplication des lots ne doit pas retirer de questions
+        question = {
+            "question": f"Que désigne la notion {uuid.uuid4().hex[:12]} dans le cours ?",
+            "explanation": "Elle est définie dans la deuxième partie du cours.",
+        }
+        if index % 2:
+            return question | {"type": "open", "correct_identifier": "Une définition précise avec un exemple."}
+        return question | {
+            "type": "qcm",
+            "correct_identifier": "A",
+            "choices": ["A. Réponse juste", "B. Distracteur", "C. Distracteur", "D. Distracteur"],
+        }
+
+    def usage_for(self, messages, content: str, model: str):
+        # Même estimation que le contrôle avant envoi et l'ordonnanceur : les chiffres du benchmark restent cohérents
+        prompt_tokens = token_estimator.messages_tokens(messages, model)
+        completion_tokens = token_estimator.text_tokens(content, model)
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+
+    def create(self, messages, model, stream: bool = False, **kwargs):
+        self.check_admission()
+        content = self.respond(messages)
+        usage = self.usage_for(messages, content, model)
+
+        if stream:
+            return self.stream_chunks(content, usage, model)
+
+        time.sleep(self.latency + usage.completion_tokens / self.tokens_per_s)
+        message = SimpleNamespace(content=content, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+    def stream_chunks(self, content: str, usage, model: str, chunk_chars: int = 16):
+        time.sleep(self.latency)
+        for start in range(0, len(content), chunk_chars):
+            piece = content[start:start + chunk_chars]
+            time.sleep(token_estimator.text_tokens(piece, model) / self.tokens_per_s)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], x_groq=None)
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage))
+
+
+class StubClient:
+    """Même forme qu'un client Groq : client.chat.completions.create(...)."""
+
+    def __init__(self, **options):
+        self.chat = SimpleNamespace(completions=StubCompletions(**options))
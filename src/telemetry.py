@@ -0,0 +1,289 @@
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from resources.config import (
+    TELEMETRY_ENABLED,
+    TELEMETRY_RING_SIZE,
+    TELEMETRY_JSONL_PATH,
+    TELEMETRY_METRICS_PORT,
+    TELEMETRY_LATENCY_BUCKETS_S,
+)
+
+RECORD_FIELDS = (
+    "timestamp", "kind", "operation", "model", "priority", "session_id", "attempt",
+    "queue_s", "ttft_s", "latency_s", "estimated_prompt_tokens", "prompt_tokens", "completion_tokens",
+    "trimmed_tokens", "cache_hit", "error",
+)
+
+
+class RingBufferSink:
+    """Garde les derniers enregistrements en mémoire (panneau d'administration)."""
+
+    def __init__(self, maxlen: int = TELEMETRY_RING_SIZE):
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self) -> list[dict]:
+        with self._lock:
+            return list(self._records)
+
+
+class JsonlSink:
+    """Ajoute chaque enregistrement comme une ligne JSON dans un fichier."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+
+def _labels(**labels) -> str:
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class PrometheusSink:
+    """Agrège les enregistrements en compteurs et histogrammes, exposés au format texte de Prometheus."""
+
+    HISTOGRAMS = (
+        ("queue_s", "tutor_queue_seconds", "Temps passé dans la file de l'ordonnanceur."),
+        ("ttft_s", "tutor_time_to_first_token_seconds", "Délai avant le premier token."),
+        ("latency_s", "tutor_latency_seconds", "Durée totale de l'opération."),
+    )
+
+    def __init__(self, buckets=TELEMETRY_LATENCY_BUCKETS_S):
+        self.buckets = tuple(buckets)
+        self._calls: dict[tuple, int] = {}
+        self._tokens: dict[tuple, int] = {}
+        self._cache: dict[tuple, int] = {}
+        self._histograms: dict[str, dict[tuple, list]] = {field: {} for field, _, _ in self.HISTOGRAMS}
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        labels = (record.get("kind") or "", record.get("operation") or "", record.get("model") or "")
+        with self._lock:
+            outcome = record.get("error") or "ok"
+            self._calls[labels + (outcome,)] = self._calls.get(labels + (outcome,), 0) + 1
+
+            for token_type in ("estimated_prompt", "trimmed", "prompt", "completion"):
+                count = record.get(f"{token_type}_tokens")
+                if count:
+                    key = (labels[2], token_type)
+                    self._tokens[key] = self._tokens.get(key, 0) + count
+
+            if record.get("cache_hit") is not None:
+                key = labels[:2] + ("hit" if record["cache_hit"] else "miss",)
+                self._cache[key] = self._cache.get(key, 0) + 1
+
+            for field, _, _ in self.HISTOGRAMS:
+                value = record.get(field)
+                if value is None:
+                    continue
+                # [compte par seuil..., somme, nombre]
+                histogram = self._histograms[field].setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+                for index, bound in enumerate(self.buckets):
+                    if value <= bound:
+                        histogram[index] += 1
+                histogram[-2] += value
+                histogram[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += ["# HELP tutor_calls_total Opérations instrumentées, par issue.", "# TYPE tutor_calls_total counter"]
+            for (kind, operation, model, outcome), count in sorted(self._calls.items()):
+                lines.append(f"tutor_calls_total{_labels(kind=kind, operation=operation, model=model, outcome=outcome)} {count}")
+
+            lines += ["# HELP tutor_tokens_total Tokens consommés selon la réponse de l'API (estimated_prompt : estimation locale, trimmed : retirés avant l'envoi).", "# TYPE tutor_tokens_total counter"]
+            for (model, token_type), count in sorted(self._tokens.items()):
+                lines.append(f"tutor_tokens_total{_labels(model=model, type=token_type)} {count}")
+
+            lines += ["# HELP tutor_cache_lookups_total Consultations des caches.", "# TYPE tutor_cache_lookups_total counter"]
+            for (kind, operation, result), count in sorted(self._cache.items()):
+                lines.append(f"tutor_cache_lookups_total{_labels(kind=kind, operation=operation, result=result)} {count}")
+
+            for field, name, description in self.HISTOGRAMS:
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for (kind, operation, model), histogram in sorted(self._histograms[field].items()):
+                    labels = dict(kind=kind, operation=operation, model=model)
+                    for bound, count in zip(self.buckets, histogram):
+                        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+                    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram[-1]}")
+                    lines.append(f"{name}_sum{_labels(**labels)} {histogram[-2]:.6f}")
+                    lines.append(f"{name}_count{_labels(**labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+class Measurement:
+    """Mesure d'une opération en cours ; finish() l'envoie aux sinks (une seule fois)."""
+
+    def __init__(self, telemetry, kind: str, operation: str, **fields):
+        self.telemetry = telemetry
+        self.started_at = time.perf_counter()
+        self.record = {"timestamp": time.time(), "kind": kind, "operation": operation, **fields}
+        self.finished = False
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def first_token(self):
+        if self.record.get("ttft_s") is None:
+            self.record["ttft_s"] = time.perf_counter() - self.started_at
+
+    def set_usage(self, usage):
+        if usage is None:
+            return
+        self.record["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+        self.record["completion_tokens"] = getattr(usage, "completion_tokens", None)
+
+    def finish(self, error: BaseException | None = None):
+        if self.finished:
+            return
+        self.finished = True
+        self.record["latency_s"] = time.perf_counter() - self.started_at
+        if error is not None:
+            self.record["error"] = type(error).__name__
+        self.telemetry.emit(self.record)
+
+
+class Telemetry:
+    """Point d'entrée unique de l'instrumentation : appels au LLM, traitements de documents, caches."""
+
+    def __init__(self, sinks: list | None = None, enabled: bool = TELEMETRY_ENABLED):
+        self.sinks = list(sinks or [])
+        self.enabled = enabled
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def sink_of_type(self, sink_type):
+        return next((sink for sink in self.sinks if isinstance(sink, sink_type)), None)
+
+    def emit(self, record: dict):
+        if not self.enabled:
+            return
+        record = {field: record.get(field) for field in RECORD_FIELDS} | record
+        for sink in self.sinks:
+            try:
+                sink.write(record)
+            except Exception as e:
+                print(f"[LOG CONSOLE - TELEMETRY ERROR] {type(sink).__name__} : {e}")
+
+    def start(self, kind: str, operation: str, **fields) -> Measurement:
+        return Measurement(self, kind, operation, **fields)
+
+    @contextmanager
+    def measure(self, kind: str, operation: str, **fields):
+        measurement = self.start(kind, operation, **fields)
+        try:
+            yield measurement
+        except BaseException as e:
+            measurement.finish(error=e)
+            raise
+        # Une erreur rattrapée par l'appelant peut être signalée avec measurement.set(error=...)
+        measurement.finish()
+
+    def record_cache_lookup(self, operation: str, hit: bool, **fields):
+        self.emit({"timestamp": time.time(), "kind": "cache", "operation": operation, "cache_hit": hit, **fields})
+
+    def record_prompt_trim(self, operation: str, trimmed_tokens: int, **fields):
+        """Prompt raccourci avant l'envoi (voir token_budget.py) : compté dans tutor_calls_total{kind="preflight"}."""
+        self.emit({"timestamp": time.time(), "kind": "preflight", "operation": operation, "trimmed_tokens": trimmed_tokens, **fields})
+
+    def recent(self) -> list[dict]:
+        ring_buffer = self.sink_of_type(RingBufferSink)
+        return ring_buffer.records() if ring_buffer else []
+
+
+class InstrumentedStream:
+    """Enveloppe un flux de l'API : premier token, usage final (x_groq.usage) et fin du flux."""
+
+    def __init__(self, stream, measurement: Measurement):
+        self.stream = stream
+        self.measurement = measurement
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                choices = getattr(chunk, "choices", None)
+                if choices and getattr(choices[0].delta, "content", None):
+                    self.measurement.first_token()
+                usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+                self.measurement.set_usage(usage)
+                yield chunk
+        except BaseException as e:
+            # GeneratorExit : le lecteur a abandonné le flux, ce n'est pas une erreur de l'API
+            self.measurement.finish(error=None if isinstance(e, GeneratorExit) else e)
+            raise
+        self.measurement.finish()
+
+    def close(self):
+        self.measurement.finish()
+        close_stream = getattr(self.stream, "close", None)
+        if close_stream:
+            close_stream()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int | None = TELEMETRY_METRICS_PORT, host: str = "127.0.0.1"):
+    """Expose GET /metrics (format texte Prometheus) sur un thread d'arrière-plan, une fois par processus."""
+    global _metrics_server
+    prometheus = telemetry.sink_of_type(PrometheusSink)
+    if port is None or prometheus is None:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                print(f"[LOG CONSOLE - TELEMETRY ERROR] Port {port} indisponible : {e}")
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True, name="metrics-server").start()
+        return _metrics_server
+
+
+def build_default_sinks() -> list:
+    sinks = [RingBufferSink(), PrometheusSink()]
+    if TELEMETRY_JSONL_PATH:
+        sinks.append(JsonlSink(TELEMETRY_JSONL_PATH))
+    return sinks
+
+
+telemetry = Telemetry(build_default_sinks())
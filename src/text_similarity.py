@@ -0,0 +1,51 @@
+import re
+from retrieval import strip_accents, FRENCH_STOP_WORDS
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+SPACES_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str, remove_stop_words: bool = True) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces réduits et (par défaut) sans mots vides."""
+    text = PUNCTUATION_PATTERN.sub(" ", strip_accents(str(text).lower()))
+    words = SPACES_PATTERN.split(text.strip())
+    if remove_stop_words:
+        words = [word for word in words if word not in FRENCH_STOP_WORDS]
+    return " ".join(word for word in words if word)
+
+
+def char_ngrams(text: str, n: int = 3) -> set[str]:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def ngram_similarity(text_a: str, text_b: str, n: int = 3) -> float:
+    """Coefficient de Dice sur les n-grammes de caractères de deux textes déjà normalisés."""
+    if not text_a or not text_b:
+        return 1.0 if text_a == text_b else 0.0
+    grams_a = char_ngrams(text_a, n)
+    grams_b = char_ngrams(text_b, n)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def token_overlap(text_a: str, text_b: str) -> float:
+    """Part des mots de text_a que l'on retrouve dans text_b."""
+    tokens_a = set(text_a.split())
+    if not tokens_a:
+        return 0.0
+    return len(tokens_a & set(text_b.split())) / len(tokens_a)
+
+
+def dedupe_questions(questions: list, threshold: float, known_questions: list | None = None) -> list:
+    """Retire les questions dont l'énoncé est quasi identique à une question déjà retenue (ou connue)."""
+    kept = []
+    kept_texts = [normalize_text(q.get('question', '')) for q in (known_questions or [])]
+    for question in questions:
+        text = normalize_text(question.get('question', ''))
+        if any(ngram_similarity(text, other) >= threshold for other in kept_texts):
+            continue
+        kept.append(question)
+        kept_texts.append(text)
+    return kept
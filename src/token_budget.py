@@ -0,0 +1,190 @@
+import math
+import threading
+from resources.config import (
+    TOKEN_MODEL_FAMILIES,
+    TOKEN_CHARS_PER_TOKEN,
+    TOKEN_DEFAULT_CHARS_PER_TOKEN,
+    TOKEN_MESSAGE_OVERHEAD,
+    TOKEN_IMAGE_COST,
+    TOKEN_CALIBRATION_WEIGHT,
+    MODEL_CONTEXT_WINDOWS,
+    DEFAULT_CONTEXT_WINDOW,
+    MODEL_RATE_LIMITS,
+    DEFAULT_RATE_LIMITS,
+    PREFLIGHT_SAFETY_MARGIN,
+    SCHEDULER_DEFAULT_COMPLETION_TOKENS,
+)
+
+TRIM_MARKER = "\n[…]\n"
+
+
+class PromptTooLargeError(ValueError):
+    """La requête ne tient pas dans le budget du modèle (fenêtre de contexte, tokens par minute), même raccourcie."""
+
+
+class TokenEstimator:
+    """Estimation locale du nombre de tokens, sans tokenizer : caractères par token selon la famille du modèle.
+
+    Chaque réponse de l'API (usage.prompt_tokens) recale un peu le ratio de la famille ; sans
+    modèle précisé, le ratio par défaut (prudent) est utilisé.
+    """
+
+    def __init__(
+            self,
+            families: dict = TOKEN_MODEL_FAMILIES,
+            chars_per_token: dict = TOKEN_CHARS_PER_TOKEN,
+            default_chars_per_token: float = TOKEN_DEFAULT_CHARS_PER_TOKEN,
+            calibration_weight: float = TOKEN_CALIBRATION_WEIGHT
+        ):
+        self.families = families
+        self.chars_per_token = dict(chars_per_token)
+        self.default_chars_per_token = default_chars_per_token
+        self.calibration_weight = calibration_weight
+        self._lock = threading.Lock()
+
+    def ratio(self, model: str | None = None) -> float:
+        return self.chars_per_token.get(self.families.get(model), self.default_chars_per_token)
+
+    def tokens_for_chars(self, chars: int, model: str | None = None) -> int:
+        return math.ceil(chars / self.ratio(model))
+
+    def chars_for_tokens(self, tokens: int, model: str | None = None) -> int:
+        return int(tokens * self.ratio(model))
+
+    def text_tokens(self, text: str, model: str | None = None) -> int:
+        return self.tokens_for_chars(len(text or ""), model)
+
+    def message_tokens(self, message: dict, model: str | None = None) -> int:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            tokens = 0
+            for item in content:
+                if item.get("type") == "text":
+                    tokens += self.text_tokens(item.get("text", ""), model)
+                else:
+                    tokens += TOKEN_IMAGE_COST
+            return tokens + TOKEN_MESSAGE_OVERHEAD
+        return self.text_tokens(content, model) + TOKEN_MESSAGE_OVERHEAD
+
+    def messages_tokens(self, messages, model: str | None = None) -> int:
+        return sum(self.message_tokens(message, model) for message in messages or [])
+
+    def observe(self, model: str, messages, prompt_tokens: int):
+        """Recale le ratio de la famille du modèle sur le nombre de tokens compté par l'API."""
+        family = self.families.get(model)
+        if family is None or not self.calibration_weight or not prompt_tokens:
+            return
+        chars, overhead = 0, 0
+        for message in messages or []:
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                return  # Le coût d'une image est une convention : il fausserait le ratio
+            chars += len(content)
+            overhead += TOKEN_MESSAGE_OVERHEAD
+        text_tokens = prompt_tokens - overhead
+        if chars < 200 or text_tokens <= 0:
+            return
+        with self._lock:
+            current = self.chars_per_token.get(family, self.default_chars_per_token)
+            observed = min(max(chars / text_tokens, 1.5), 6.0)
+            self.chars_per_token[family] = current + self.calibration_weight * (observed - current)
+
+    def calibration(self) -> dict:
+        with self._lock:
+            return dict(self.chars_per_token)
+
+
+class PromptBudgeter:
+    """Vérifie avant l'envoi qu'une requête tient dans la fenêtre de contexte, réponse comprise.
+
+    Le budget est aussi plafonné à la limite de tokens par minute du modèle : au-delà, Groq
+    refuse la requête quelle que soit l'attente.
+
+    Seules les requêtes en texte libre (conversation : historique et contexte de cours) sont
+    raccourcies, avec trim=True : les messages les plus anciens (hors prompts système et dernier
+    message) sont retirés, puis le milieu du plus long message est coupé, ce qui garde les
+    consignes placées au début et à la fin des prompts. Une requête structurée (JSON à corriger,
+    génération de quiz) serait corrompue par cette coupe : PromptTooLargeError est levée pour que
+    l'appelant la découpe. L'erreur est aussi levée si la coupe ne suffit pas (images, réserve
+    trop grande).
+    """
+
+    def __init__(
+            self,
+            estimator: TokenEstimator,
+            context_windows: dict = MODEL_CONTEXT_WINDOWS,
+            default_context_window: int = DEFAULT_CONTEXT_WINDOW,
+            rate_limits: dict = MODEL_RATE_LIMITS,
+            default_rate_limits: dict = DEFAULT_RATE_LIMITS,
+            safety_margin: float = PREFLIGHT_SAFETY_MARGIN
+        ):
+        self.estimator = estimator
+        self.context_windows = context_windows
+        self.default_context_window = default_context_window
+        self.rate_limits = rate_limits
+        self.default_rate_limits = default_rate_limits
+        self.safety_margin = safety_margin
+
+    def prompt_limit(self, model: str, reserve_tokens: int) -> int:
+        context_window = self.context_windows.get(model, self.default_context_window)
+        tokens_per_minute = self.rate_limits.get(model, self.default_rate_limits)["tpm"]
+        return int(min(context_window, tokens_per_minute) * (1 - self.safety_margin)) - reserve_tokens
+
+    def preflight(self, messages, model: str, reserve_tokens: int | None = None, trim: bool = False) -> tuple:
+        """Retourne (messages à envoyer, tokens estimés du prompt, tokens retirés).
+
+        reserve_tokens : place gardée pour la réponse (SCHEDULER_DEFAULT_COMPLETION_TOKENS par défaut).
+        trim : la requête peut être raccourcie ; sinon, une requête trop longue est refusée telle quelle.
+        Les messages ne sont copiés que s'il faut les raccourcir.
+        """
+        if reserve_tokens is None:
+            reserve_tokens = SCHEDULER_DEFAULT_COMPLETION_TOKENS
+        limit = self.prompt_limit(model, reserve_tokens)
+        token_counts = [self.estimator.message_tokens(message, model) for message in messages]
+        prompt_tokens = sum(token_counts)
+        if prompt_tokens <= limit:
+            return messages, prompt_tokens, 0
+        if not trim:
+            raise PromptTooLargeError(
+                f"La demande (environ {prompt_tokens} tokens, plus {reserve_tokens} réservés pour la réponse) "
+                f"dépasse ce que le modèle {model} accepte en une requête ; elle doit être découpée."
+            )
+
+        messages = list(messages)
+        initial_tokens = prompt_tokens
+        index = 0
+        while prompt_tokens > limit and index < len(messages) - 1:
+            if messages[index].get("role") == "system":
+                index += 1
+                continue
+            prompt_tokens -= token_counts.pop(index)
+            messages.pop(index)
+
+        if prompt_tokens > limit:
+            longest = max(
+                (position for position, message in enumerate(messages) if isinstance(message.get("content"), str)),
+                key=lambda position: len(messages[position]["content"]),
+                default=None
+            )
+            if longest is not None:
+                content = messages[longest]["content"]
+                excess_chars = self.estimator.chars_for_tokens(prompt_tokens - limit, model) + len(TRIM_MARKER) + 1
+                kept_chars = len(content) - excess_chars
+                if kept_chars > 0:
+                    head = kept_chars // 2
+                    content = content[:head] + TRIM_MARKER + content[len(content) - (kept_chars - head):]
+                    messages[longest] = {**messages[longest], "content": content}
+                    new_count = self.estimator.message_tokens(messages[longest], model)
+                    prompt_tokens += new_count - token_counts[longest]
+                    token_counts[longest] = new_count
+
+        if prompt_tokens > limit:
+            raise PromptTooLargeError(
+                f"La demande (environ {prompt_tokens} tokens, plus {reserve_tokens} réservés pour la réponse) "
+                f"dépasse ce que le modèle {model} accepte en une requête."
+            )
+        return messages, prompt_tokens, initial_tokens - prompt_tokens
+
+
+token_estimator = TokenEstimator()
+prompt_budgeter = PromptBudgeter(token_estimator)
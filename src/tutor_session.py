@@ -0,0 +1,272 @@
+import io
+import uuid
+import threading
+from PIL import Image
+from app import ConversationAgent
+from quiz_agent import QuizAgent
+from utils import DocumentProcessor
+from retrieval import get_course_index
+from image_pipeline import image_pipeline
+from scheduler import request_scheduler
+from telemetry import telemetry
+from quiz_cache import shuffle_quiz
+from text_similarity import dedupe_questions
+from question_bank import get_question_bank, document_hash
+from session_store import get_session_store, SessionState, SessionStore
+from resources.config import (
+    ROUTER_AUTO_OPTION,
+    VISION_MODEL,
+    RETRIEVAL_TOP_K,
+    RETRIEVAL_QUIZ_TOP_K,
+    QUIZ_STREAMING,
+    QUIZ_SHARDING,
+    QUIZ_SHARD_SIZE,
+    MAX_COURSE_DOCUMENTS,
+    MAX_CHAT_IMAGES,
+    QUIZ_DEDUP_SIMILARITY,
+)
+
+# Champs d'une question visibles par l'élève avant la correction
+PUBLIC_QUESTION_FIELDS = ("question", "type", "choices")
+
+
+class TutorSession:
+    """Session d'un élève, sans Streamlit : conversation, quiz, documents du cours et images en attente.
+
+    Tout l'état est rangé dans le stockage de session : une session se reprend à partir de
+    son identifiant, dans n'importe quel processus qui partage ce stockage. Les appels sont
+    bloquants ; `lock` sérialise les opérations d'une même session (voir service.py).
+    """
+
+    course_documents_key = 'course_documents'
+    pending_images_key = 'pending_images'
+    quiz_scope_key = 'quiz_scope'  # Sujet, difficulté et documents du quiz en cours, pour la banque de questions
+
+    def __init__(self, session_id: str | None = None, client=None, store: SessionStore | None = None):
+        store = store if store is not None else get_session_store()
+        self.session_id = session_id or uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.state = SessionState(store, self.session_id, transient_keys=[QuizAgent.quiz_stream_key])
+        self.quiz_agent = QuizAgent(state=self.state)
+        self.conversation_agent = ConversationAgent(
+            self.quiz_agent,
+            client=client,
+            session_id=self.session_id,
+            store=store
+        )
+
+    # --- Documents du cours et images ---
+
+    @property
+    def course_documents(self) -> list[dict]:
+        return self.state.get(self.course_documents_key, [])
+
+    @property
+    def document_hashes(self) -> list[str]:
+        # Les documents chargés avant la banque de questions n'ont pas d'empreinte enregistrée
+        return [document.get('hash') or document_hash(document['text']) for document in self.course_documents]
+
+    @property
+    def course_text(self) -> str:
+        return "\n".join(
+            f"\n--- Fichier : {document['name']} ---\n{document['text']}" for document in self.course_documents
+        )
+
+    def set_course_documents(self, pdf_files, progress_callback=None) -> list[dict]:
+        """Remplace les documents du cours ; progress_callback(nom, pages lues, pages totales)."""
+        documents = []
+        for pdf_file in list(pdf_files)[:MAX_COURSE_DOCUMENTS]:
+            name = getattr(pdf_file, "name", "document.pdf")
+            text = DocumentProcessor.extract_text_from_pdf_cached(
+                pdf_file,
+                progress_callback=(lambda done, total, name=name: progress_callback(name, done, total)) if progress_callback else None
+            )
+            documents.append({"name": name, "text": text, "hash": document_hash(text)})
+        self.state[self.course_documents_key] = documents
+        return documents
+
+    def add_document(self, name: str, data: bytes, mime: str | None = None) -> dict:
+        """Ajoute un PDF au cours, ou une image jointe au prochain message.
+
+        Lève ValueError si le fichier est illisible (ou si la limite de documents ou d'images est atteinte).
+        """
+        if (mime or "").startswith("image/") or name.lower().endswith((".png", ".jpg", ".jpeg")):
+            pending_images = self.state.get(self.pending_images_key, [])
+            if len(pending_images) >= MAX_CHAT_IMAGES:
+                raise ValueError(f"Au plus {MAX_CHAT_IMAGES} images par message.")
+            try:
+                prepared_image = image_pipeline.process_bytes(data, mime)
+            except (OSError, Image.DecompressionBombError) as e:
+                # UnidentifiedImageError (contenu qui n'est pas une image) est une OSError
+                raise ValueError(f"Image illisible : {name}.") from e
+            self.state[self.pending_images_key] = pending_images + [prepared_image["ref"]]
+            return {"type": "image", "name": name, "ref": prepared_image["ref"]}
+
+        documents = self.course_documents
+        if len(documents) >= MAX_COURSE_DOCUMENTS:
+            raise ValueError(f"Au plus {MAX_COURSE_DOCUMENTS} documents par cours.")
+        pdf_file = io.BytesIO(data)
+        pdf_file.name = name
+        text = DocumentProcessor.extract_text_from_pdf_cached(pdf_file)
+        if not text.strip():
+            raise ValueError(f"PDF illisible ou sans texte : {name}.")
+        self.state[self.course_documents_key] = documents + [{"name": name, "text": text, "hash": document_hash(text)}]
+        return {"type": "pdf", "name": name, "chars": len(text)}
+
+    def clear_course(self):
+        self.state[self.course_documents_key] = []
+
+    def course_context(self, query: str, k: int) -> str:
+        """Seuls les extraits du cours pertinents pour la requête sont envoyés au modèle."""
+        course_text = self.course_text
+        return get_course_index(course_text).build_context(query, k=k) if course_text else ""
+
+    def pop_pending_images(self) -> list[str]:
+        image_refs = self.state.get(self.pending_images_key, [])
+        if image_refs:
+            self.state[self.pending_images_key] = []
+        return image_refs
+
+    # --- Conversation ---
+
+    def chat(self, message: str, model: str = ROUTER_AUTO_OPTION, image_refs: list[str] | None = None, stream: bool = False):
+        """Réponse du tuteur : texte complet, ou générateur de fragments si stream.
+
+        Sans image_refs, les images envoyées avec add_document partent avec ce message.
+        """
+        if image_refs is None:
+            image_refs = self.pop_pending_images()
+        agent = self.conversation_agent
+
+        if image_refs:
+            images_data = [{"ref": ref} for ref in image_refs[:MAX_CHAT_IMAGES]]
+            if stream:
+                return agent.stream_vision_model(user_interaction=message, images_data=images_data, model=VISION_MODEL)
+            return agent.ask_vision_model(user_interaction=message, images_data=images_data, model=VISION_MODEL)
+
+        context_text = self.course_context(message, RETRIEVAL_TOP_K)
+        if stream:
+            return agent.stream_llm(user_interaction=message, model=model, context_text=context_text)
+        return agent.ask_llm(user_interaction=message, model=model, context_text=context_text)
+
+    def messages(self, limit: int | None = None) -> list[dict]:
+        history = self.conversation_agent.history
+        start = 1 if limit is None else max(1, len(history) - limit)
+        return [{"role": message["role"], "content": message["content"]} for message in history[start:]]
+
+    # --- Quiz ---
+
+    def start_quiz(
+            self,
+            topic: str,
+            n_questions: int = 3,
+            difficulty: str = "Moyen",
+            model: str = ROUTER_AUTO_OPTION,
+            from_bank: bool = False
+        ) -> bool:
+        """Génère le quiz ; en mode streaming, rend la main dès que la génération est lancée.
+
+        from_bank : assemble le quiz depuis la banque de questions, le LLM ne complétant que les manques.
+        """
+        self.quiz_agent.set_state('generating')
+        self.state[self.quiz_scope_key] = {"topic": topic, "difficulty": difficulty, "document_hashes": self.document_hashes}
+        if from_bank:
+            return self.assemble_quiz(topic, n_questions, difficulty, model)
+
+        agent = self.conversation_agent
+        if QUIZ_SHARDING and n_questions > QUIZ_SHARD_SIZE:
+            generate = agent.generate_quiz_sharded
+        elif QUIZ_STREAMING:
+            generate = agent.generate_quiz_streamed
+        else:
+            generate = agent.generate_quiz
+
+        success = generate(
+            topic=topic,
+            n_questions=n_questions,
+            model=model,
+            context_instruction=self.course_context(topic, RETRIEVAL_QUIZ_TOP_K),
+            difficulty=difficulty
+        )
+        # generate_quiz retourne True, ou un message d'erreur
+        if success is not True:
+            self.quiz_agent.set_state('start')
+            return False
+        if generate is not agent.generate_quiz_streamed:
+            self.bank_quiz()
+        return True
+
+    def assemble_quiz(self, topic: str, n_questions: int, difficulty: str, model: str = ROUTER_AUTO_OPTION) -> bool:
+        banked = shuffle_quiz(get_question_bank().assemble(topic, n_questions, difficulty, self.document_hashes))
+        missing = n_questions - len(banked)
+        telemetry.record_cache_lookup("question_bank", missing <= 0, session_id=self.session_id, banked=len(banked))
+
+        generated = []
+        if missing > 0:
+            agent = self.conversation_agent
+            context_text = self.course_context(topic, RETRIEVAL_QUIZ_TOP_K)
+            routed_model = agent.route_model(model, "quiz_generation", topic, context_text)
+            generated = dedupe_questions(
+                agent.collect_sharded_questions(topic, missing, routed_model, difficulty, context_text),
+                QUIZ_DEDUP_SIMILARITY,
+                known_questions=banked
+            )[:missing]
+
+        questions = banked + generated
+        if not questions:
+            self.quiz_agent.set_state('start')
+            return False
+        self.quiz_agent.create_quiz(questions)
+        if generated:
+            self.bank_quiz()
+        return True
+
+    def bank_quiz(self) -> int:
+        """Range les questions du quiz en cours dans la banque (les doublons sont ignorés)."""
+        scope = self.state.get(self.quiz_scope_key)
+        questions = self.state.get(QuizAgent.quiz_data_key) or []
+        if not scope or not questions:
+            return 0
+        return get_question_bank().add(list(questions), scope["topic"], scope["difficulty"], scope["document_hashes"])
+
+    def answer(self, user_answer: str):
+        if self.quiz_agent.read_state() != 'questioning':
+            raise ValueError("Aucune question n'attend de réponse.")
+        if not user_answer:
+            raise ValueError("La réponse est vide.")
+        self.quiz_agent.record_answer_and_advance(user_answer)
+
+    def finalize(self, model: str = ROUTER_AUTO_OPTION):
+        if self.quiz_agent.read_state() != 'final_review':
+            raise ValueError("Le quiz n'est pas prêt à être corrigé.")
+        # Un quiz reçu en flux n'est complet qu'ici
+        self.bank_quiz()
+        self.quiz_agent.finalize_quiz_results(self.conversation_agent, model=model)
+
+    def reset_quiz(self):
+        self.bank_quiz()
+        self.quiz_agent.delete_quiz()
+
+    def quiz_snapshot(self) -> dict:
+        """État du quiz pour un client : question en cours (sans la réponse attendue), attente, ou résultats."""
+        quiz = self.quiz_agent
+        error = quiz.refresh_waiting_state() if quiz.read_state() == 'waiting_question' else None
+        state = quiz.read_state()
+        snapshot = {
+            "state": state,
+            "question_index": quiz.read_current_question_index(),
+            "expected_length": quiz.read_expected_quiz_length(),
+        }
+        if error:
+            snapshot["error"] = error
+        if state == 'questioning':
+            question = quiz.read_current_question()
+            snapshot["question"] = {field: question[field] for field in PUBLIC_QUESTION_FIELDS if field in question}
+        elif state == 'waiting_question':
+            snapshot["queue_position"] = request_scheduler.queue_position(self.session_id)
+            snapshot["estimated_wait_s"] = request_scheduler.estimated_wait(self.session_id)
+        elif state == 'finished':
+            snapshot["score"] = quiz.read_score()
+            snapshot["total"] = quiz.read_quiz_length()
+            snapshot["results"] = quiz.read_results()
+        return snapshot
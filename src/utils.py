@@ -1,34 +1,177 @@
-import streamlit as st
 import PyPDF2
-import base64
+import io
+import os
+import tempfile
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from extraction_cache import extraction_cache
+from image_pipeline import image_pipeline
+from telemetry import telemetry
+from resources.config import (
+    PDF_EXTRACTION_WORKERS,
+    PDF_PAGES_PER_TASK,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_MAX_PAGES,
+    PDF_TIME_BUDGET_S,
+)
+
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(max_workers=PDF_EXTRACTION_WORKERS)
+        return _pdf_executor
+
+
+def _reset_pdf_executor():
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is not None:
+            _pdf_executor.shutdown(wait=False, cancel_futures=True)
+        _pdf_executor = None
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> list[str]:
+    """Exécuté dans un processus de travail : extrait le texte des pages [start, stop) du PDF écrit dans pdf_path."""
+    pdf_reader = PyPDF2.PdfReader(pdf_path)
+    return [pdf_reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+class ConsoleNotifier:
+    """Messages destinés à l'utilisateur, affichés dans la console hors de Streamlit (service HTTP, benchmarks)."""
+
+    @staticmethod
+    def warning(message):
+        print(f"[LOG CONSOLE - DOCUMENT WARNING] {message}")
+
+    @staticmethod
+    def error(message):
+        print(f"[LOG CONSOLE - DOCUMENT ERROR] {message}")
+
 
 class DocumentProcessor:
     """Gère l'extraction de texte et l'encodage d'images."""
 
+    # Tout objet ayant warning() et error() ; l'interface Streamlit y place le module streamlit
+    notifier = ConsoleNotifier
+
+    @staticmethod
+    def _open_pdf(pdf_file, max_pages=PDF_MAX_PAGES):
+        pdf_file.seek(0)
+        pdf_bytes = pdf_file.read()
+        pdf_file.seek(0)
+
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        page_count = len(pdf_reader.pages)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+        return pdf_bytes, pdf_reader, page_count
+
     @staticmethod
-    def extract_text_from_pdf(pdf_file) -> str:
-        """Lit un fichier PDF et retourne son contenu textuel."""
+    def _iter_page_texts(pdf_bytes, pdf_reader, page_count, time_budget):
+        deadline = time.monotonic() + time_budget if time_budget else None
+
+        if page_count < PDF_PARALLEL_MIN_PAGES:
+            for index in range(page_count):
+                if deadline and time.monotonic() > deadline:
+                    return
+                yield pdf_reader.pages[index].extract_text() or ""
+            return
+
+        # Le PDF est écrit une seule fois sur disque : les tâches ne transportent que son chemin
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(pdf_bytes)
+
+        # Chaque tâche relit le PDF : au plus un lot de pages par processus
+        workers = PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+        pages_per_task = max(PDF_PAGES_PER_TASK, -(-page_count // workers))
+        executor = _get_pdf_executor()
+        futures = [
+            executor.submit(_extract_page_range, pdf_path, start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        ]
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text_content = ""
-            for page in pdf_reader.pages:
-                extracted_text = page.extract_text()
-                if extracted_text:
-                    text_content += extracted_text + "\n"
-            return text_content
-        except Exception as e:
-            st.error(f"Erreur lors de la lecture du PDF : {e}")
-            return ""
-
-    @staticmethod
-    def convert_image_to_base64(image_file) -> str | None:
-        """Convertit une image uploadée en chaîne Base64 pour l'API."""
+            for future in futures:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+                yield from future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return
+        except BrokenProcessPool:
+            _reset_pdf_executor()
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+            os.remove(pdf_path)
+
+    @staticmethod
+    def _extract_pdf(pdf_file, max_pages=PDF_MAX_PAGES, time_budget=PDF_TIME_BUDGET_S, progress_callback=None) -> tuple[str, bool]:
+        """Retourne (texte, complet). complet vaut False si le budget de temps a interrompu la lecture."""
+        pdf_bytes, pdf_reader, page_count = DocumentProcessor._open_pdf(pdf_file, max_pages)
+        page_texts = []
+        pages_read = 0
+        for text in DocumentProcessor._iter_page_texts(pdf_bytes, pdf_reader, page_count, time_budget):
+            pages_read += 1
+            if text:
+                page_texts.append(text)
+            if progress_callback:
+                progress_callback(pages_read, page_count)
+
+        text_content = "\n".join(page_texts) + "\n" if page_texts else ""
+        return text_content, pages_read == page_count
+
+    @staticmethod
+    def extract_text_from_pdf_cached(pdf_file, max_pages=PDF_MAX_PAGES, time_budget=PDF_TIME_BUDGET_S, progress_callback=None) -> str:
+        """Lit un fichier PDF et retourne son contenu textuel, sans relire un fichier dont le contenu est déjà en cache."""
+        pdf_file.seek(0)
+        data = pdf_file.read()
+        pdf_file.seek(0)
+
+        with telemetry.measure("document", "extract_text_from_pdf_cached") as measurement:
+            key = extraction_cache.hash_content(data) + (f"-p{max_pages}" if max_pages is not None else "")
+            text_content = extraction_cache.get(key)
+            measurement.set(cache_hit=text_content is not None)
+            if text_content is not None:
+                return text_content
+
+            try:
+                text_content, complete = DocumentProcessor._extract_pdf(pdf_file, max_pages, time_budget, progress_callback)
+                measurement.set(chars=len(text_content), complete=complete)
+            except Exception as e:
+                measurement.set(error=type(e).__name__)
+                DocumentProcessor.notifier.error(f"Erreur lors de la lecture du PDF : {e}")
+                return ""
+
+        # Un texte tronqué par le budget de temps ne doit pas être figé dans le cache
+        if complete and text_content:
+            extraction_cache.put(key, text_content)
+        elif not complete:
+            DocumentProcessor.notifier.warning(f"Lecture du PDF interrompue après {time_budget} s : le texte est partiel.")
+        return text_content
+
+    @staticmethod
+    def get_extraction_cache_stats() -> dict:
+        return extraction_cache.stats()
+
+    @staticmethod
+    def prepare_image(image_file) -> dict | None:
+        """Redimensionne, recompresse et encode une image uploadée, une seule fois par contenu."""
         if image_file is None:
             return None
-        try:
-            image_file.seek(0)
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            return f"data:{image_file.type};base64,{encoded_string}"
-        except Exception as e:
-            st.error(f"Erreur d'encodage de l'image : {e}")
-            return None
\ No newline at end of file
+        with telemetry.measure("document", "prepare_image") as measurement:
+            try:
+                hits_before = image_pipeline.hits
+                prepared_image = image_pipeline.process(image_file)
+                measurement.set(cache_hit=image_pipeline.hits > hits_before)
+                return prepared_image
+            except Exception as e:
+                measurement.set(error=type(e).__name__)
+                DocumentProcessor.notifier.error(f"Erreur d'encodage de l'image : {e}")
+                return None
\ No newline at end of file
@@ -0,0 +1,83 @@
+import json
+from app import ConversationAgent
+from quiz_agent import QuizAgent
+from session_store import MemorySessionStore
+from groq_pool import ResilientClient
+from stub_backend import StubClient, BATCH_ITEM_ID_PATTERN
+from prompt_registry import prompt_registry
+from token_budget import token_estimator, prompt_budgeter, TRIM_MARKER
+from resources.config import GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM
+
+MODEL = "openai/gpt-oss-120b"
+
+
+class RecordingStubClient(StubClient):
+    """Faux serveur qui garde les messages reçus."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.received = []
+        create = self.chat.completions.create
+
+        def record(messages, model, **kwargs):
+            self.received.append(messages)
+            return create(messages, model, **kwargs)
+
+        self.chat.completions.create = record
+
+
+def make_agent(raw_client):
+    return ConversationAgent(QuizAgent(state={}), client=ResilientClient(raw_client, scheduler=None), store=MemorySessionStore())
+
+
+def open_answers(count):
+    question = {
+        "type": "open",
+        "question": "Expliquez le rôle de la mitochondrie dans la respiration cellulaire.",
+        "correct_identifier": "La mitochondrie produit l'ATP par phosphorylation oxydative, grâce à la chaîne respiratoire.",
+        "explanation": "La chaîne respiratoire de la membrane interne crée un gradient de protons utilisé par l'ATP synthase. " * 3,
+    }
+    return [(dict(question), f"Réponse {index} : elle sert à fabriquer de l'énergie pour la cellule.") for index in range(count)]
+
+
+def batch_prompt_tokens(batch):
+    messages = [
+        {"role": "system", "content": prompt_registry.read("teacher_context")},
+        {"role": "user", "content": prompt_registry.render("batch_correction", items_json=json.dumps(batch, ensure_ascii=False, indent=1))},
+    ]
+    return token_estimator.messages_tokens(messages, MODEL)
+
+
+def test_batches_fit_the_tpm_capped_limit():
+    agent = make_agent(StubClient(latency=0, tokens_per_s=10 ** 6, seed=1))
+    items = [
+        {"id": index, "question": question["question"], "reponse_attendue": question["correct_identifier"],
+         "reponse_etudiant": answer, "explication": question["explanation"]}
+        for index, (question, answer) in enumerate(open_answers(20))
+    ]
+    # Les 20 éléments dépassent à eux seuls le budget plafonné par la limite de tokens par minute
+    assert batch_prompt_tokens(items) > prompt_budgeter.prompt_limit(MODEL, 20 * GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM)
+
+    batches = agent.split_correction_batches(items, MODEL)
+
+    assert len(batches) > 1
+    assert [item["id"] for batch in batches for item in batch] == list(range(20))
+    for batch in batches:
+        reserve_tokens = len(batch) * GRADING_BATCH_COMPLETION_TOKENS_PER_ITEM
+        assert batch_prompt_tokens(batch) <= prompt_budgeter.prompt_limit(MODEL, reserve_tokens)
+
+
+def test_batch_corrections_are_sent_without_trimming():
+    raw_client = RecordingStubClient(latency=0, tokens_per_s=10 ** 6, seed=1)
+    agent = make_agent(raw_client)
+
+    corrections = agent.get_batch_corrections(open_answers(20), model=MODEL)
+
+    assert len(corrections) == 20 and all(corrections)
+    sent_ids = []
+    for messages in raw_client.received:
+        prompt = messages[-1]["content"]
+        assert TRIM_MARKER not in prompt
+        sent_ids += [int(item_id) for item_id in BATCH_ITEM_ID_PATTERN.findall(prompt)]
+    # Chaque élément part une seule fois, en entier, dans un lot : aucun n'a dû être recorrigé individuellement
+    assert sorted(sent_ids) == list(range(20))
@@ -0,0 +1,12 @@
+import pytest
+from benchmark import bench_load
+
+
+@pytest.mark.parametrize("scheduler", [False, True])
+def test_load_sessions_complete_without_errors(scheduler):
+    results = bench_load(students=3, chat_turns=2, n_questions=4, latency=0.0, tokens_per_s=10 ** 6, scheduler=scheduler)
+
+    assert results["errors"] == {"ask_llm": 0, "generate_quiz": 0, "finalize_quiz_results": 0, "session": 0}
+    assert len(results["latencies"]["session"]) == 3
+    assert len(results["latencies"]["ask_llm"]) == 6
+    assert results["calls"] >= 3 * (2 + 1)
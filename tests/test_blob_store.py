@@ -0,0 +1,26 @@
+from blob_store import BlobStore
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path))
+    first = store.put(b"image", "image/png")
+    assert store.put(b"image", "image/png") == first
+    assert BlobStore.is_ref(first)
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_refs_resolve_from_disk_after_restart(tmp_path):
+    ref = BlobStore(str(tmp_path)).put_data_url("data:image/jpeg;base64,aW1hZ2U=")
+    store = BlobStore(str(tmp_path))
+    assert store.get(ref) == (b"image", "image/jpeg")
+    assert store.resolve(ref) == "data:image/jpeg;base64,aW1hZ2U="
+    assert store.resolve("https://exemple.fr/image.png") == "https://exemple.fr/image.png"
+    assert store.stats()["disk_reads"] == 1
+
+
+def test_memory_only_store_is_bounded():
+    store = BlobStore(None, memory_max_bytes=10)
+    old_ref = store.put(b"123456", "image/png")
+    new_ref = store.put(b"abcdef", "image/png")
+    assert store.get(old_ref) is None
+    assert store.get(new_ref) == (b"abcdef", "image/png")
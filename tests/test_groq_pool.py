@@ -0,0 +1,35 @@
+from groq_pool import ResilientClient
+from scheduler import RequestScheduler
+from stub_backend import StubClient
+
+MODEL = "openai/gpt-oss-120b"
+MESSAGES = [{"role": "user", "content": "Bonjour"}]
+
+
+def ask(client):
+    return client.chat.completions.create(messages=MESSAGES, model=MODEL, hedge=True)
+
+
+def test_slow_request_is_hedged_when_budget_is_free():
+    raw_client = StubClient(latency=0.3, tokens_per_s=10 ** 6)
+    client = ResilientClient(raw_client, scheduler=None, hedge_delay=0.05)
+    ask(client)
+    assert raw_client.chat.completions.calls == 2
+
+
+def test_no_hedge_without_spare_scheduler_budget():
+    # Une seule requête par minute : la copie retarderait les autres sessions
+    scheduler = RequestScheduler(limits={MODEL: {"rpm": 1, "tpm": 10 ** 6}})
+    raw_client = StubClient(latency=0.3, tokens_per_s=10 ** 6)
+    client = ResilientClient(raw_client, scheduler=scheduler, hedge_delay=0.05)
+    ask(client)
+    assert raw_client.chat.completions.calls == 1
+
+
+def test_hedge_delay_follows_observed_latencies():
+    completions = ResilientClient(StubClient(), scheduler=None, hedge_delay=4, hedge_min_samples=20).chat.completions
+    assert completions.hedge_delay_for(MODEL) == 4
+    for index in range(1, 101):
+        completions.record_latency(MODEL, index / 100)
+    assert completions.hedge_delay_for(MODEL) == 0.96
+    assert completions.hedge_delay_for("autre-modele") == 4
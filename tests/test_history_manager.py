@@ -0,0 +1,47 @@
+from history_manager import HistoryWindow, SUMMARY_PREFIX
+
+MODEL = "modele-test"
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "Consignes"}]
+    for index in range(turns):
+        messages.append({"role": "user", "content": f"question {index} " + "mot " * 100})
+        messages.append({"role": "assistant", "content": f"réponse {index} " + "mot " * 100})
+    return messages
+
+
+def test_short_conversation_is_sent_unchanged():
+    window = HistoryWindow(summarize=lambda summary, messages: "inutile", budgets={MODEL: 10000})
+    messages = conversation(2)
+    assert window.apply(messages, MODEL) == messages
+    assert window.summary == ""
+
+
+def test_old_turns_are_folded_into_a_summary_once():
+    calls = []
+
+    def summarize(previous_summary, messages):
+        calls.append(len(messages))
+        return f"{len(messages)} messages repliés"
+
+    window = HistoryWindow(summarize=summarize, budgets={MODEL: 1500})
+    messages = conversation(20)
+    sent = window.apply(messages, MODEL)
+
+    assert len(calls) == 1
+    assert sent[0] == messages[0]
+    assert sent[1] == {"role": "system", "content": SUMMARY_PREFIX + window.summary}
+    assert sent[2]["role"] == "user" and sent[-1] == messages[-1]
+    assert sent[2:] == messages[window.folded_until:]
+
+    # Un tour de plus qui tient encore dans le budget ne recalcule pas le résumé
+    messages += [{"role": "user", "content": "question courte"}]
+    window.apply(messages, MODEL)
+    assert len(calls) == 1
+
+
+def test_reset_history_clears_the_summary():
+    window = HistoryWindow(summarize=lambda summary, messages: "résumé", budgets={MODEL: 1500})
+    window.apply(conversation(20), MODEL)
+    assert window.apply(conversation(1), MODEL) == conversation(1)
@@ -0,0 +1,31 @@
+from json_stream import JsonArrayStreamParser
+
+RESPONSE = '```json\n[{"question": "Que vaut {x} ?", "choices": ["A. [1]", "B. \\"2\\""]}, {"question": "Suite"}]\n```'
+
+
+def test_objects_are_emitted_as_soon_as_they_are_complete():
+    parser = JsonArrayStreamParser()
+    emitted = []
+    for char in RESPONSE:
+        emitted.append(parser.feed(char))
+
+    objects = [obj for chunk in emitted for obj in chunk]
+    assert objects == [
+        {"question": "Que vaut {x} ?", "choices": ["A. [1]", 'B. "2"']},
+        {"question": "Suite"},
+    ]
+    # Le premier objet sort dès son accolade fermante, avant la fin du tableau
+    first_index = next(index for index, chunk in enumerate(emitted) if chunk)
+    assert RESPONSE[first_index] == "}" and first_index < RESPONSE.index("Suite")
+    assert parser.finished
+
+
+def test_text_after_the_array_is_ignored():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('Voici : [{"a": 1}] puis [{"b": 2}]') == [{"a": 1}]
+    assert parser.feed('{"c": 3}') == []
+
+
+def test_invalid_object_is_skipped():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"a": }, {"b": 2}]') == [{"b": 2}]
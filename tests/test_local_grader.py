@@ -0,0 +1,31 @@
+from local_grader import LocalGrader
+
+QUESTION = {
+    "type": "open",
+    "question": "La photosynthèse a-t-elle besoin de lumière ?",
+    "correct_identifier": "La photosynthèse a besoin de lumière pour produire du glucose.",
+    "explanation": "L'énergie lumineuse est captée par la chlorophylle.",
+}
+
+
+def grade(answer, expected=None):
+    question = dict(QUESTION, correct_identifier=expected) if expected else QUESTION
+    return LocalGrader().grade(question, answer)
+
+
+def test_near_exact_answer_is_accepted_locally():
+    correction = grade("la photosynthese a besoin de lumiere pour produire du glucose")
+    assert correction["score"] == 1 and correction["graded_locally"]
+
+
+def test_added_negation_is_left_to_the_llm():
+    assert grade("La photosynthèse n'a pas besoin de lumière pour produire du glucose.") is None
+
+
+def test_no_answer_is_rejected_locally():
+    correction = grade("je sais pas")
+    assert correction["score"] == 0 and correction["graded_locally"]
+
+
+def test_short_expected_answer_matching_a_no_answer_pattern():
+    assert grade("Non", expected="non")["score"] == 1
@@ -0,0 +1,57 @@
+import random
+from model_router import ModelRouter, ModelStats
+from token_budget import PromptBudgeter, TokenEstimator
+
+POLICY = {"chat": {"candidates": ["grand", "rapide"]}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_router(exploration_rate=0.0, stats=None, tpm=None):
+    budgeter = PromptBudgeter(
+        TokenEstimator(calibration_weight=0),
+        context_windows={"grand": 100000, "rapide": 100000},
+        rate_limits={"grand": {"rpm": 30, "tpm": tpm or 100000}, "rapide": {"rpm": 30, "tpm": 100000}},
+        safety_margin=0.0
+    )
+    return ModelRouter(
+        policy=POLICY, stats=stats or ModelStats(clock=FakeClock()), available_models=["grand", "rapide"],
+        budgeter=budgeter, exploration_rate=exploration_rate, rng=random.Random(0)
+    )
+
+
+def record(stats, model, latency, count=5):
+    for _ in range(count):
+        stats.write({"kind": "llm", "model": model, "operation": "ask_llm", "ttft_s": latency, "queue_s": 0})
+
+
+def test_preferred_model_without_exploration():
+    assert make_router().choose("chat", 100) == ("grand", "préféré")
+
+
+def test_tokens_per_minute_cap_excludes_a_model():
+    # 8 000 tokens/minute : un prompt de 7 000 tokens plus la réserve de réponse n'y tient pas
+    assert make_router(tpm=8000).choose("chat", 7000)[0] == "rapide"
+
+
+def test_exploration_probes_unmeasured_models():
+    stats = ModelStats(clock=FakeClock())
+    record(stats, "grand", 1.0)
+    router = make_router(exploration_rate=0.2, stats=stats)
+    choices = [router.choose("chat", 100) for _ in range(500)]
+    explored = [model for model, reason in choices if reason == "exploration"]
+    assert explored and set(explored) == {"rapide"}
+    assert 50 <= len(explored) <= 150
+
+
+def test_faster_model_is_chosen_once_measured():
+    stats = ModelStats(clock=FakeClock())
+    record(stats, "grand", 3.0)
+    record(stats, "rapide", 1.0)
+    assert make_router(stats=stats).choose("chat", 100) == ("rapide", "plus rapide")
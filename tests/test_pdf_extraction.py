@@ -0,0 +1,26 @@
+import io
+import os
+import tempfile
+from benchmark import make_sample_pdf
+from utils import DocumentProcessor
+from resources.config import PDF_PARALLEL_MIN_PAGES
+
+
+def test_parallel_extraction_keeps_page_order_and_cleans_up():
+    page_count = PDF_PARALLEL_MIN_PAGES + 8
+    pdf_file = io.BytesIO(make_sample_pdf(page_count, lines_per_page=2))
+    temp_files_before = set(os.listdir(tempfile.gettempdir()))
+    progress = []
+
+    text, complete = DocumentProcessor._extract_pdf(pdf_file, progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert complete
+    positions = [text.index(f"Page {page}, ligne 1 ") for page in range(1, page_count + 1)]
+    assert positions == sorted(positions)
+    assert progress[-1] == (page_count, page_count)
+    assert set(os.listdir(tempfile.gettempdir())) - temp_files_before == set()
+
+
+def test_small_pdf_is_read_in_the_current_thread():
+    text, complete = DocumentProcessor._extract_pdf(io.BytesIO(make_sample_pdf(2, lines_per_page=1)))
+    assert complete and "Page 2, ligne 1" in text
@@ -0,0 +1,50 @@
+import time
+import pytest
+import question_bank
+from question_bank import QuestionBank
+from session_store import MemorySessionStore
+from stub_backend import StubClient
+from tutor_session import TutorSession
+
+
+def make_question(text, question_type="open"):
+    question = {"type": question_type, "question": text, "correct_identifier": "A", "explanation": "Parce que."}
+    if question_type == "qcm":
+        question["choices"] = ["A. oui", "B. non"]
+    return question
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    bank = QuestionBank(str(tmp_path / "questions.sqlite3"))
+    monkeypatch.setattr(question_bank, "_question_bank", bank)
+    return bank
+
+
+def test_questions_are_scoped_to_course_and_difficulty(bank):
+    questions = [make_question("Qu'est-ce qu'une cellule ?"), make_question("Quel est le rôle du noyau ?", "qcm")]
+    assert bank.add(questions, "biologie", "Moyen", ["cours-1"]) == 2
+    # Une question quasi identique n'est pas ajoutée une seconde fois
+    assert bank.add([make_question("Qu'est-ce qu'une cellule ?")], "biologie", "Moyen", ["cours-1"]) == 0
+
+    assert bank.count("biologie", "Moyen", ["cours-1"]) == 2
+    assert bank.count("biologie", "Expert", ["cours-1"]) == 0
+    assert bank.count("biologie", "Moyen", ["cours-2"]) == 0
+    assert {question["question"] for question in bank.assemble("biologie", 5, "Moyen", ["cours-1"])} == {
+        question["question"] for question in questions
+    }
+
+
+def test_abandoned_streamed_quiz_is_banked(bank):
+    tutor = TutorSession(client=StubClient(latency=0, tokens_per_s=10 ** 6, seed=1), store=MemorySessionStore())
+    assert tutor.start_quiz("histoire", n_questions=3, difficulty="Moyen", model="openai/gpt-oss-120b")
+
+    deadline = time.monotonic() + 5
+    while tutor.quiz_agent.read_state() == "waiting_question" or not tutor.quiz_agent.is_quiz_complete():
+        assert time.monotonic() < deadline
+        tutor.quiz_agent.refresh_waiting_state()
+        time.sleep(0.01)
+
+    tutor.reset_quiz()
+    assert tutor.quiz_agent.read_state() == "start"
+    assert bank.count("histoire", "Moyen", []) == 3
@@ -0,0 +1,53 @@
+import time
+from quiz_cache import QuizCache, shuffle_quiz
+
+QUIZ = [
+    {"type": "qcm", "question": "Q1", "correct_identifier": "B", "explanation": "",
+     "choices": ["A. faux", "B. juste", "C. faux", "D. faux"]},
+    {"type": "open", "question": "Q2", "correct_identifier": "Une définition.", "explanation": ""},
+]
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    cache = QuizCache(ttl_s=10, db_path=None)
+    cache.put("cle", QUIZ)
+    assert cache.get("cle") == QUIZ
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("cle") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QuizCache(max_entries=2, db_path=None)
+    cache.put("a", QUIZ)
+    cache.put("b", QUIZ)
+    cache.get("a")
+    cache.put("c", QUIZ)
+    assert cache.get("b") is None
+    assert cache.get("a") == QUIZ and cache.get("c") == QUIZ
+
+
+def test_cached_copy_can_be_modified():
+    cache = QuizCache(db_path=None)
+    cache.put("cle", QUIZ)
+    cache.get("cle")[0]["question"] = "modifiée"
+    assert cache.get("cle") == QUIZ
+
+
+def test_disk_cache_is_shared_between_instances(tmp_path):
+    db_path = str(tmp_path / "quiz_cache.sqlite3")
+    QuizCache(db_path=db_path).put("cle", QUIZ)
+    assert QuizCache(db_path=db_path).get("cle") == QUIZ
+
+
+def test_shuffle_keeps_the_correct_choice():
+    import random
+    for seed in range(20):
+        shuffled = shuffle_quiz(QUIZ, random.Random(seed))
+        qcm = next(question for question in shuffled if question["type"] == "qcm")
+        letter = qcm["correct_identifier"]
+        assert next(choice for choice in qcm["choices"] if choice.startswith(letter + ".")).endswith("juste")
+        assert [choice[0] for choice in qcm["choices"]] == ["A", "B", "C", "D"]
+    assert QUIZ[0]["correct_identifier"] == "B"
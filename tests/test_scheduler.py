@@ -0,0 +1,62 @@
+import time
+import threading
+import pytest
+from scheduler import RequestScheduler, SchedulerRequestTooLarge
+
+MODEL = "modele-test"
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_request_above_tokens_per_minute_is_rejected():
+    scheduler = RequestScheduler(limits={MODEL: {"rpm": 30, "tpm": 1000}})
+    with pytest.raises(SchedulerRequestTooLarge):
+        scheduler.acquire(MODEL, 1001)
+    assert scheduler.acquire(MODEL, 1000) >= 0
+    assert scheduler.queue_lengths() == {}
+
+
+def test_sessions_alternate_and_interactive_goes_first():
+    # Une requête par période : les requêtes en file partent une à une, dans l'ordre de l'ordonnanceur
+    scheduler = RequestScheduler(limits={MODEL: {"rpm": 1, "tpm": 10 ** 6}}, period=0.3)
+    scheduler.acquire(MODEL, 10, session_id="amorce")
+
+    dispatched = []
+    threads = []
+
+    def send(name, priority, session_id):
+        scheduler.acquire(MODEL, 10, priority=priority, session_id=session_id, timeout=10)
+        dispatched.append(name)
+
+    requests = [
+        ("a1", "grading", "a"), ("a2", "grading", "a"), ("a3", "grading", "a"),
+        ("b1", "grading", "b"),
+        ("chat", "interactive", "c"),
+    ]
+    for queued, request in enumerate(requests, start=1):
+        thread = threading.Thread(target=send, args=request)
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: scheduler.queue_lengths().get(MODEL, 0) == queued)
+
+    assert scheduler.queue_position("c") == 0
+    assert scheduler.queue_position("b") == 2
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert dispatched == ["chat", "a1", "b1", "a2", "a3"]
+    # Les tours des sessions servies sont oubliés
+    assert scheduler._session_rounds == {}
+
+
+def test_timeout_leaves_the_queue():
+    scheduler = RequestScheduler(limits={MODEL: {"rpm": 1, "tpm": 10 ** 6}}, period=60)
+    scheduler.acquire(MODEL, 10)
+    with pytest.raises(Exception):
+        scheduler.acquire(MODEL, 10, timeout=0.05)
+    assert scheduler.queue_lengths() == {}
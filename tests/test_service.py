@@ -0,0 +1,61 @@
+import asyncio
+import aiohttp
+from aiohttp.test_utils import TestClient, TestServer
+from benchmark import make_sample_pdf
+from service import create_app
+from session_store import MemorySessionStore
+from stub_backend import StubClient
+
+
+def with_session(scenario, **stub_options):
+    """Exécute scenario(client, session_id) contre le service branché sur le faux serveur."""
+    async def run():
+        stub_options.setdefault("latency", 0)
+        stub_options.setdefault("tokens_per_s", 10 ** 6)
+        app = create_app(client=StubClient(seed=1, **stub_options), store=MemorySessionStore())
+        async with TestClient(TestServer(app)) as client:
+            session_id = (await (await client.post("/sessions")).json())["session_id"]
+            return await scenario(client, session_id)
+    return asyncio.run(run())
+
+
+def upload(filename, data, content_type):
+    async def scenario(client, session_id):
+        form = aiohttp.FormData()
+        form.add_field("file", data, filename=filename, content_type=content_type)
+        response = await client.post(f"/sessions/{session_id}/documents", data=form)
+        return response.status
+    return with_session(scenario)
+
+
+def test_pdf_upload_is_accepted():
+    assert upload("cours.pdf", make_sample_pdf(2), "application/pdf") == 201
+
+
+def test_unreadable_pdf_is_rejected():
+    assert upload("cours.pdf", b"ceci n'est pas un PDF", "application/pdf") == 400
+
+
+def test_non_image_with_image_name_is_rejected():
+    assert upload("photo.png", b"ceci n'est pas une image", "image/png") == 400
+
+
+def test_chat_stream_sends_deltas_then_done():
+    async def scenario(client, session_id):
+        response = await client.post(f"/sessions/{session_id}/chat/stream", json={"message": "Explique"})
+        return response.status, (await response.text()).strip().splitlines()
+
+    status, lines = with_session(scenario)
+    assert status == 200
+    assert lines[0].startswith('data: {"delta"') and lines[-1] == "data: [DONE]"
+
+
+def test_session_is_usable_after_a_client_disconnect():
+    async def scenario(client, session_id):
+        response = await client.post(f"/sessions/{session_id}/chat/stream", json={"message": "Explique longuement"})
+        await response.content.readline()
+        response.close()
+        response = await client.post(f"/sessions/{session_id}/chat", json={"message": "Encore"})
+        return response.status
+
+    assert with_session(scenario, tokens_per_s=200) == 200
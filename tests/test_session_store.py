@@ -0,0 +1,43 @@
+import pytest
+from session_store import SessionStore, MemorySessionStore, SQLiteSessionStore, SessionHistory, SessionState
+
+
+def fill(store):
+    history = SessionHistory(store, "session", memory_messages=2, page_size=2)
+    history.append({"role": "system", "content": "Consignes"})
+    for index in range(5):
+        history.append({"role": "user", "content": f"question {index}"})
+        history.append({"role": "assistant", "content": f"réponse {index}"}, image_url="blob:abc" if index == 2 else None)
+    # Réécrire une position efface la suite
+    store.append_message("session", 3, {"role": "user", "content": "question réécrite"})
+    state = SessionState(store, "session")
+    state["quiz"] = {"score": 2}
+    state["temporaire"] = 1
+    del state["temporaire"]
+
+
+def read_back(store):
+    history = SessionHistory(store, "session", memory_messages=2, page_size=2)
+    return list(history), history.image_ref(6), dict(SessionState(store, "session"))
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_sqlite_round_trip_matches_memory_store(tmp_path):
+    memory_store = MemorySessionStore()
+    fill(memory_store)
+
+    db_path = str(tmp_path / "sessions.sqlite3")
+    sqlite_store = SQLiteSessionStore(db_path, flush_interval=3600, batch_size=10 ** 6)
+    fill(sqlite_store)
+    sqlite_store.flush()
+
+    messages, image_ref, values = read_back(SQLiteSessionStore(db_path, flush_interval=3600))
+    assert (messages, image_ref, values) == read_back(memory_store)
+    assert [message["content"] for message in messages] == [
+        "Consignes", "question 0", "réponse 0", "question réécrite",
+    ]
+    assert values == {"quiz": {"score": 2}}
@@ -0,0 +1,69 @@
+import pytest
+from app import ConversationAgent
+from quiz_agent import QuizAgent
+from session_store import MemorySessionStore
+from groq_pool import ResilientClient
+from stub_backend import StubClient
+from token_budget import TokenEstimator, PromptBudgeter, PromptTooLargeError, TRIM_MARKER
+
+MODEL = "openai/gpt-oss-120b"
+
+
+def make_budgeter():
+    estimator = TokenEstimator(calibration_weight=0)
+    return PromptBudgeter(
+        estimator,
+        context_windows={MODEL: 100000},
+        rate_limits={MODEL: {"rpm": 30, "tpm": 1000}},
+        safety_margin=0.0
+    )
+
+
+def test_prompt_limit_is_capped_by_tokens_per_minute():
+    assert make_budgeter().prompt_limit(MODEL, 200) == 800
+
+
+def test_preflight_keeps_messages_within_budget():
+    messages = [{"role": "system", "content": "Consignes."}, {"role": "user", "content": "Bonjour"}]
+    sent, prompt_tokens, trimmed_tokens = make_budgeter().preflight(messages, MODEL, reserve_tokens=100)
+    assert sent is messages
+    assert trimmed_tokens == 0 and prompt_tokens > 0
+
+
+def test_preflight_refuses_structured_prompt_instead_of_cutting_it():
+    messages = [{"role": "user", "content": '[{"id": 1, "reponse_etudiant": "' + "x" * 10000 + '"}]'}]
+    with pytest.raises(PromptTooLargeError):
+        make_budgeter().preflight(messages, MODEL, reserve_tokens=100)
+
+
+def test_preflight_trims_history_then_free_text():
+    budgeter = make_budgeter()
+    messages = [
+        {"role": "system", "content": "Consignes du tuteur. " + "contexte de cours " * 300},
+        {"role": "user", "content": "ancienne question " * 200},
+        {"role": "assistant", "content": "ancienne réponse " * 200},
+        {"role": "user", "content": "Nouvelle question ?"},
+    ]
+    sent, prompt_tokens, trimmed_tokens = budgeter.preflight(messages, MODEL, reserve_tokens=100, trim=True)
+
+    assert prompt_tokens <= budgeter.prompt_limit(MODEL, 100)
+    assert trimmed_tokens > 0
+    # L'historique part d'abord, le dernier message est gardé, le contexte est coupé en son milieu
+    assert [message["role"] for message in sent] == ["system", "user"]
+    assert sent[-1] == messages[-1]
+    assert sent[0]["content"].startswith("Consignes du tuteur.") and TRIM_MARKER in sent[0]["content"]
+    assert TRIM_MARKER not in messages[0]["content"]
+
+
+def test_oversized_quiz_falls_back_to_shards():
+    raw_client = StubClient(latency=0, tokens_per_s=10 ** 6, seed=1)
+    quiz_agent = QuizAgent(state={})
+    agent = ConversationAgent(quiz_agent, client=ResilientClient(raw_client, scheduler=None), store=MemorySessionStore())
+
+    # 20 questions réservent 5 000 tokens de réponse : avec ce contexte, une seule requête dépasse la limite par minute
+    context_instruction = "Extrait du cours : " + "la cellule produit de l'énergie. " * 250
+    result = agent.generate_quiz("biologie", 20, MODEL, "Moyen", context_instruction, use_cache=False)
+
+    assert result is True
+    assert quiz_agent.read_quiz_length() == 20
+    assert raw_client.chat.completions.calls > 1